@@ -0,0 +1,80 @@
+"""采集到编码路径的内存分配测试：对比原实现与预分配缓冲区实现每帧的临时内存和耗时"""
+import time
+import tracemalloc
+import numpy as np
+import opuslib
+from xiaozhi_client import AudioConfig
+from xiaozhi_client.utils.pcm import FramePool, PcmFrameEncoder, frame_rms
+
+FRAMES = 300
+
+
+def legacy_frame(indata, encoder, frame_size):
+    """原实现：回调中reshape/astype，send_audio中再次求RMS、转换、补零和tobytes"""
+    audio_data = indata.reshape(-1).astype(np.float32)
+    rms = np.sqrt(np.mean(np.square(audio_data)))
+    if audio_data.dtype != np.float32:
+        audio_data = audio_data.astype(np.float32)
+    rms = np.sqrt(np.mean(np.square(audio_data)))
+    pcm_data = (audio_data * 32767).astype(np.int16)
+    for i in range(0, len(pcm_data), frame_size):
+        frame = pcm_data[i:i + frame_size]
+        if len(frame) < frame_size:
+            frame = np.pad(frame, (0, frame_size - len(frame)))
+        encoder.encode(frame.tobytes(), frame_size)
+    return rms
+
+
+def make_pooled_frame(config):
+    pool = FramePool(8, config.frame_size, config.channels)
+    frame_encoder = PcmFrameEncoder(config.frame_size, config.channels)
+
+    def pooled_frame(indata, encoder, frame_size):
+        """新实现：拷入预分配槽位，RMS只算一次，原地转换后以零拷贝视图编码"""
+        audio_data = pool.write(indata)
+        rms = frame_rms(audio_data)
+        frame_encoder.load(audio_data)
+        frame_encoder.encode(encoder)
+        return rms
+
+    return pooled_frame
+
+
+def measure(fn, config, encoder, blocks):
+    """返回(每帧临时内存峰值字节数, 每帧耗时微秒)"""
+    for block in blocks[:10]:
+        fn(block, encoder, config.frame_size)
+
+    tracemalloc.start()
+    peaks = []
+    for block in blocks:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn(block, encoder, config.frame_size)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for block in blocks:
+        fn(block, encoder, config.frame_size)
+    elapsed = time.perf_counter() - start
+    return float(np.mean(peaks)), elapsed / len(blocks) * 1e6
+
+
+def main():
+    config = AudioConfig()
+    encoder = opuslib.Encoder(config.sample_rate, config.channels, 'voip')
+    rng = np.random.default_rng(0)
+    blocks = [
+        (rng.standard_normal((config.frame_size, config.channels)) * 0.1).astype(np.float32)
+        for _ in range(FRAMES)
+    ]
+
+    print(f"{'实现':<10} {'临时内存(字节/帧)':>18} {'耗时(us/帧)':>12}")
+    for name, fn in (("原实现", legacy_frame), ("预分配", make_pooled_frame(config))):
+        peak, cost = measure(fn, config, encoder, blocks)
+        print(f"{name:<10} {peak:>18.0f} {cost:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
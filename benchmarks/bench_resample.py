@@ -0,0 +1,42 @@
+"""重采样器性能测试：统计每个60ms音频块的处理耗时"""
+import time
+import numpy as np
+from xiaozhi_client.utils.resample import PolyphaseResampler
+
+FRAME_DURATION_MS = 60
+CASES = [
+    (48000, 16000),  # 采集: 48k设备 -> 协议16k
+    (44100, 16000),
+    (16000, 48000),  # 播放: 协议16k -> 48k设备
+    (16000, 44100),
+]
+
+
+def bench_case(in_rate: int, out_rate: int, blocks: int = 500) -> float:
+    """返回处理单个块的平均耗时（微秒）"""
+    resampler = PolyphaseResampler(in_rate, out_rate)
+    block_size = in_rate * FRAME_DURATION_MS // 1000
+    rng = np.random.default_rng(0)
+    block = (rng.standard_normal(block_size) * 0.1).astype(np.float32)
+
+    # 预热，让滤波计划进入缓存
+    for _ in range(10):
+        resampler.process(block)
+
+    start = time.perf_counter()
+    for _ in range(blocks):
+        resampler.process(block)
+    elapsed = time.perf_counter() - start
+    return elapsed / blocks * 1e6
+
+
+def main():
+    print(f"{'输入':>8} {'输出':>8} {'每块耗时(us)':>14} {'实时占比':>10}")
+    for in_rate, out_rate in CASES:
+        cost_us = bench_case(in_rate, out_rate)
+        ratio = cost_us / (FRAME_DURATION_MS * 1000)
+        print(f"{in_rate:>8} {out_rate:>8} {cost_us:>14.1f} {ratio:>10.2%}")
+
+
+if __name__ == "__main__":
+    main()
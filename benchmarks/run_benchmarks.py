@@ -0,0 +1,325 @@
+"""编解码与管线热路径的基准测试套件
+
+离线运行，不需要服务器和音频设备（XiaozhiClient使用内存中的替身websocket）。
+结果以JSON保存，可作为基线；与基线对比时任一项变慢超过阈值则以非零状态退出。
+
+用法:
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --threshold 15
+    python benchmarks/run_benchmarks.py --filter opus --rounds 9
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import opuslib
+from loguru import logger
+
+from xiaozhi_client import AudioConfig, ClientConfig, XiaozhiClient
+from xiaozhi_client.utils.wav import save_wav
+from xiaozhi_client.utils.outbound import SendPriority
+from xiaozhi_client.utils.conditioning import InputConditioner
+
+# 各音频配置：名称 -> AudioConfig
+PROFILES = {
+    "16k-mono-60ms": AudioConfig(sample_rate=16000, channels=1, frame_size=960, frame_duration=60),
+    "16k-mono-20ms": AudioConfig(sample_rate=16000, channels=1, frame_size=320, frame_duration=20),
+    "24k-mono-60ms": AudioConfig(sample_rate=24000, channels=1, frame_size=1440, frame_duration=60),
+    "48k-mono-20ms": AudioConfig(sample_rate=48000, channels=1, frame_size=960, frame_duration=20),
+    "48k-stereo-20ms": AudioConfig(sample_rate=48000, channels=2, frame_size=960, frame_duration=20),
+}
+
+FRAMES = 200  # 每轮处理的帧数/消息数
+
+
+class FakeWebSocket:
+    """只计数的内存websocket"""
+
+    closed = False
+
+    def __init__(self):
+        self.frames = 0
+
+    async def send(self, data):
+        self.frames += 1
+
+    async def close(self):
+        self.closed = True
+
+
+def make_frames(config: AudioConfig, count: int = FRAMES) -> List[np.ndarray]:
+    rng = np.random.default_rng(0)
+    return [
+        (rng.standard_normal(config.frame_size * config.channels) * 0.1).astype(np.float32)
+        for _ in range(count)
+    ]
+
+
+def make_packets(config: AudioConfig, count: int = FRAMES) -> List[bytes]:
+    encoder = opuslib.Encoder(config.sample_rate, config.channels, 'voip')
+    packets = []
+    for frame in make_frames(config, count):
+        pcm = (frame * 32767).astype(np.int16).tobytes()
+        packets.append(encoder.encode(pcm, config.frame_size))
+    return packets
+
+
+def make_client(config: AudioConfig, workdir: str) -> XiaozhiClient:
+    """在临时目录中创建客户端，避免在当前目录生成received_audio"""
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        client = XiaozhiClient(ClientConfig(ws_url="ws://localhost:0"), config)
+    finally:
+        os.chdir(cwd)
+    client.audio_dir = workdir
+    client.websocket = FakeWebSocket()
+    return client
+
+
+# ---- 各项测试：返回一个执行一轮的函数和每轮的操作数 ----
+
+def bench_opus_encode(config: AudioConfig) -> Tuple[Callable[[], None], int]:
+    encoder = opuslib.Encoder(config.sample_rate, config.channels, 'voip')
+    pcm = [(frame * 32767).astype(np.int16).tobytes() for frame in make_frames(config)]
+
+    def run():
+        for data in pcm:
+            encoder.encode(data, config.frame_size)
+
+    return run, len(pcm)
+
+
+def bench_opus_decode(config: AudioConfig) -> Tuple[Callable[[], None], int]:
+    decoder = opuslib.Decoder(config.sample_rate, config.channels)
+    packets = make_packets(config)
+
+    def run():
+        for packet in packets:
+            decoder.decode(packet, config.frame_size)
+
+    return run, len(packets)
+
+
+def bench_send_audio(config: AudioConfig, loop, workdir) -> Tuple[Callable[[], None], int]:
+    client = make_client(config, workdir)
+    frames = make_frames(config)
+
+    async def send_all():
+        for frame in frames:
+            await client.send_audio(frame, rms=0.1)
+        # 音频帧入队即返回，等待发送调度器全部写出
+        while client._outbound.queued(SendPriority.AUDIO):
+            await asyncio.sleep(0)
+
+    return lambda: loop.run_until_complete(send_all()), len(frames)
+
+
+def bench_process_audio_queue(config: AudioConfig, loop, workdir) -> Tuple[Callable[[], None], int]:
+    """解码并放入播放队列，直到全部帧都进入audio_queue"""
+    client = make_client(config, workdir)
+    packets = make_packets(config)
+
+    async def decode_all():
+        for packet in packets:
+            client.audio_data_queue.put_nowait((packet, time.perf_counter_ns()))
+        task = asyncio.create_task(client._process_audio_queue())
+        while client.audio_queue.qsize() < len(packets):
+            await asyncio.sleep(0)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        while not client.audio_queue.empty():
+            client.audio_queue.get_nowait()
+            client.audio_queue.task_done()
+        client.pcm_buffer = bytearray()
+
+    return lambda: loop.run_until_complete(decode_all()), len(packets)
+
+
+def bench_json_dispatch(loop, workdir) -> Tuple[Callable[[], None], int]:
+    """文本帧从_dispatch_incoming解析入队，到_process_messages处理完成并回调on_message"""
+    client = make_client(AudioConfig(), workdir)
+    templates = [
+        {"type": "stt", "text": "今天天气怎么样"},
+        {"type": "llm", "text": "😊", "emotion": "happy"},
+        {"type": "tts", "state": "sentence_start", "text": "今天是晴天，气温二十度。"},
+        {"type": "listen", "state": "detect"},
+    ]
+    messages = [json.dumps(templates[i % len(templates)], ensure_ascii=False) for i in range(FRAMES)]
+    state = {"handled": 0}
+
+    async def on_message(msg_data):
+        state["handled"] += 1
+        if state["handled"] == len(messages):
+            state["done"].set()
+
+    client.on_message = on_message
+
+    async def dispatch_all():
+        state["handled"] = 0
+        state["done"] = asyncio.Event()
+        task = asyncio.create_task(client._process_messages())
+        for message in messages:
+            await client._dispatch_incoming(message)
+        await state["done"].wait()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    return lambda: loop.run_until_complete(dispatch_all()), len(messages)
+
+
+def bench_input_conditioning(config: AudioConfig) -> Tuple[Callable[[], None], int]:
+    """高通、谱减降噪和自动增益整条预处理链，单位为每帧"""
+    conditioner = InputConditioner(config.sample_rate, block_size=config.frame_size)
+    frames = make_frames(config)
+    work = np.empty_like(frames[0])
+
+    def run():
+        for frame in frames:
+            work[:] = frame
+            conditioner.process(work)
+
+    return run, len(frames)
+
+
+def bench_save_wav(workdir: str, seconds: int = 10) -> Tuple[Callable[[], None], int]:
+    """保存一段TTS长度的PCM，单位为每个文件"""
+    config = AudioConfig()
+    pcm = bytearray(np.zeros(config.sample_rate * seconds, dtype=np.int16).tobytes())
+
+    def run():
+        save_wav(workdir, pcm, sample_rate=config.sample_rate, channels=config.channels)
+
+    return run, 1
+
+
+def build_suite(loop, workdir) -> Dict[str, Callable[[], Tuple[Callable[[], None], int]]]:
+    """测试名称 -> 构造函数（延迟构造，方便按名称过滤）"""
+    suite = {}
+    for name, config in PROFILES.items():
+        suite[f"opus_encode[{name}]"] = lambda config=config: bench_opus_encode(config)
+        suite[f"opus_decode[{name}]"] = lambda config=config: bench_opus_decode(config)
+    default = PROFILES["16k-mono-60ms"]
+    suite["send_audio"] = lambda: bench_send_audio(default, loop, workdir)
+    suite["process_audio_queue"] = lambda: bench_process_audio_queue(default, loop, workdir)
+    suite["input_conditioning"] = lambda: bench_input_conditioning(default)
+    suite["json_dispatch"] = lambda: bench_json_dispatch(loop, workdir)
+    suite["save_wav[10s]"] = lambda: bench_save_wav(workdir)
+    return suite
+
+
+def measure(run: Callable[[], None], ops: int, rounds: int) -> Dict[str, float]:
+    """预热一轮后执行rounds轮，取每次操作耗时的中位数"""
+    run()
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        run()
+        samples.append((time.perf_counter_ns() - start) / ops)
+    median = statistics.median(samples)
+    return {
+        "ns_per_op": median,
+        "ops_per_sec": 1e9 / median if median else 0.0,
+        "min_ns_per_op": min(samples),
+        "rounds": rounds,
+    }
+
+
+def run_suite(name_filter: Optional[str], rounds: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for name, factory in build_suite(loop, workdir).items():
+                if name_filter and name_filter not in name:
+                    continue
+                run, ops = factory()
+                results[name] = measure(run, ops, rounds)
+                print(f"{name:<28} {results[name]['ns_per_op'] / 1000:>10.2f} us/op")
+    finally:
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.close()
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[str]:
+    """与基线对比，返回变慢超过threshold百分比的测试名称"""
+    regressions = []
+    print(f"\n{'测试':<28} {'基线us':>10} {'当前us':>10} {'变化':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<28} {'-':>10} {result['ns_per_op'] / 1000:>10.2f} {'新增':>8}")
+            continue
+        change = (result["ns_per_op"] / base["ns_per_op"] - 1.0) * 100
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  <-- 退化"
+        print(f"{name:<28} {base['ns_per_op'] / 1000:>10.2f} {result['ns_per_op'] / 1000:>10.2f} {change:>+7.1f}%{flag}")
+    return regressions
+
+
+def environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "numpy": np.__version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="xiaozhi_client 热路径基准测试")
+    parser.add_argument("--baseline", help="与之对比的基线JSON文件")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线JSON文件")
+    parser.add_argument("--output", help="把本次结果写入JSON文件")
+    parser.add_argument("--threshold", type=float, default=10.0, help="允许的变慢百分比，默认10")
+    parser.add_argument("--rounds", type=int, default=7, help="每项测试的轮数，默认7")
+    parser.add_argument("--filter", help="只运行名称包含该字符串的测试")
+    args = parser.parse_args(argv)
+
+    # 基准测试只关心代码本身的耗时，不输出日志
+    logger.remove()
+
+    results = run_suite(args.filter, args.rounds)
+    report = {"environment": environment(), "results": results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"结果已保存: {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 项变慢超过 {args.threshold:.1f}%: {', '.join(regressions)}")
+            return 1
+        print(f"\n全部测试均未超过 {args.threshold:.1f}% 的退化阈值")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,22 +16,19 @@ async def start_voice_chat(
 
     # 配置静音检测
     client.enable_silence_detection(enabled=True, threshold=0.01, max_frames=150)
+    # 启用回声消除：AI说话时保持聆听，用户插话会自动中止播放
+    client.enable_echo_cancellation(enabled=True, barge_in=True)
     
     # 设置回调
     async def on_tts_start(msg):
-        print("\n[系统] AI开始说话...")
-        client.pause_voice_input()
+        print("\n[系统] AI开始说话...（可直接插话打断）")
         
     async def on_tts_end(msg):
         print("\n[系统] AI说话结束")
         print("\n[系统] 继续聆听中... (q:退出 r:重置对话)")
-        # 添加延迟，确保系统有时间处理状态转换
-        await asyncio.sleep(0.5)  # 增加延迟时间
-        client.resume_voice_input()
-        # 重置静音检测计数器
-        client._consecutive_silence_frames = 0
-        client._last_audio_sent_time = asyncio.get_event_loop().time()
-        logger.debug("已恢复语音输入，重置静音检测")
+
+    async def on_barge_in():
+        print("\n[系统] 检测到插话，已打断AI")
         
     # 添加连接断开回调
     async def on_connection_lost(reason):
@@ -46,6 +43,7 @@ async def start_voice_chat(
     
     client.on_tts_start = on_tts_start
     client.on_tts_end = on_tts_end
+    client.on_barge_in = on_barge_in
     client.on_connection_lost = on_connection_lost
     
     try:
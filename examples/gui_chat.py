@@ -95,6 +95,8 @@ class VoiceChatGUI:
         config = ClientConfig(ws_url = "ws://localhost:8000") #不要改此行，现在是开发环境
         audio_config = AudioConfig(sample_rate=16000, channels=1)
         self.client = XiaozhiClient(config, audio_config)
+        # 界面重绘会占用GIL，把音频采集和播放放到独立子进程，避免断音
+        self.client.enable_audio_worker()
         
         # 配置静音检测 - 降低阈值以提高灵敏度，适当减少帧数以加快响应
         self.client.enable_silence_detection(
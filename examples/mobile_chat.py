@@ -258,6 +258,8 @@ class VoiceAssistantGUI:
         config = ClientConfig(ws_url="ws://localhost:8000")
         audio_config = AudioConfig(sample_rate=16000, channels=1)
         self.client = XiaozhiClient(config, audio_config)
+        # 界面重绘会占用GIL，把音频采集和播放放到独立子进程，避免断音
+        self.client.enable_audio_worker()
         
         self.client.enable_silence_detection(
             enabled=True,
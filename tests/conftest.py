@@ -0,0 +1,24 @@
+import pytest
+
+from xiaozhi_client import XiaozhiClient, ClientConfig
+from xiaozhi_client.utils.simulation import Simulation, SimulatedServer
+
+
+@pytest.fixture
+def sim():
+    """单向延迟20ms的仿真环境，替身服务器思考0.3秒"""
+    return Simulation(SimulatedServer(), latency=0.02)
+
+
+@pytest.fixture
+def make_client(sim, tmp_path, monkeypatch):
+    """在仿真中创建客户端的工厂，须在sim.run运行的协程中调用"""
+    # 客户端构造时会在当前目录创建received_audio
+    monkeypatch.chdir(tmp_path)
+
+    def factory(**config) -> XiaozhiClient:
+        client = XiaozhiClient(ClientConfig(ws_url="ws://simulated", **config))
+        client.enable_simulation(sim)
+        return client
+
+    return factory
@@ -0,0 +1,36 @@
+import asyncio
+
+
+def _long_replies(text):
+    return ["这是一段很长的回复。" * 10]
+
+
+def test_abort_flushes_local_playback_immediately(make_client, sim):
+    sim.server.replies = _long_replies
+    sim.server.lead_frames = 20  # 服务端大量预发，本地积压多帧
+
+    async def main():
+        client = make_client()
+        await client.connect()
+        ask = asyncio.create_task(client.ask("讲个故事", timeout=30))
+        while not client.is_playing.is_set():
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.5)
+        assert client.audio_queue.qsize() + client.audio_data_queue.qsize() > 0
+
+        played = sim.audio.frames_played
+        await client.abort()
+        # 中止是同步完成的，返回时各级队列已经清空
+        assert client.audio_queue.empty() and client.audio_data_queue.empty()
+        await asyncio.sleep(1.0)
+        result = await ask
+        await client.close()
+        return played, result, client.last_abort_latency, client.is_playing.is_set()
+
+    played, result, abort_latency, playing = sim.run(main())
+    # 中止后迟到的TTS包全部被丢弃，设备上没有再写入任何音频
+    assert sim.audio.frames_played == played
+    assert not playing
+    assert abort_latency is not None and abort_latency < 0.1
+    assert sim.server.turns[-1].aborted
+    assert result.latency is not None
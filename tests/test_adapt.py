@@ -0,0 +1,73 @@
+import asyncio
+
+import numpy as np
+
+from xiaozhi_client.utils.adapt import EncoderSettings, LadderPolicy, LinkSample, default_ladder
+
+BASE = EncoderSettings(32000)
+
+
+def _slow_link(client, seconds_per_packet):
+    """让上行音频包的写出变慢，模拟带宽不足的链路（控制消息不受影响）"""
+    send = client.websocket.send
+
+    async def slow_send(data):
+        if not isinstance(data, str):
+            await asyncio.sleep(seconds_per_packet)
+        await send(data)
+
+    client.websocket.send = slow_send
+
+
+def test_ladder_steps_down_on_queue_backlog_and_recovers():
+    ladder = default_ladder(BASE)
+    policy = LadderPolicy(ladder, recover_samples=2)
+    congested = LinkSample(0.0, rtt=0.05, buffered=0, backlog=2.0)
+    settings, _ = policy(congested, BASE)
+    assert settings == ladder[1]
+    healthy = LinkSample(0.0, rtt=0.05, buffered=0, backlog=0.06)
+    assert policy(healthy, settings) is None
+    assert policy(healthy, settings)[0] == BASE
+
+
+def test_adapter_sees_audio_queued_in_outbound_scheduler(sim, make_client):
+    async def main():
+        client = make_client()
+        await client.connect()
+        _slow_link(client, 0.12)  # 每包写出耗时是包时长的两倍
+        adapter = client.enable_adaptation(interval=0.5)
+        frame = np.full(client.audio_config.frame_size, 0.1, dtype=np.float32)
+        for _ in range(40):
+            await client.send_audio(frame, paced=False)
+            await asyncio.sleep(0.06)
+        await client.close()
+        return adapter
+
+    adapter = sim.run(main())
+    # ping往返正常、传输层也没有积压，只有发送队列中的音频在堆积
+    decision = adapter.decisions[0]
+    assert decision.sample.rtt is not None and decision.sample.rtt < 0.15
+    assert decision.sample.buffered == 0
+    assert decision.sample.backlog > 0.5
+    assert decision.settings.bitrate < BASE.bitrate
+
+
+def test_lowest_step_keeps_one_packet_per_negotiated_frame(sim, make_client):
+    async def main():
+        client = make_client()
+        await client.connect()
+        adapter = client.enable_adaptation()
+        lowest = adapter.policy.ladder[-1]
+        await client._apply_encoder_settings(lowest)
+        frame = np.full(client.audio_config.frame_size, 0.1, dtype=np.float32)
+        for _ in range(5):
+            await client.send_audio(frame, paced=False)
+        await asyncio.sleep(1.0)
+        bitrate = client.encoder.bitrate
+        await client.close()
+        return lowest, bitrate
+
+    lowest, bitrate = sim.run(main())
+    assert lowest.fec and bitrate == lowest.bitrate
+    # 只调整比特率和FEC，每个采集帧仍按hello中协商的包时长单独发出
+    assert sim.server.received_audio == 5
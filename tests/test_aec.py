@@ -0,0 +1,75 @@
+import numpy as np
+
+from xiaozhi_client.utils.aec import EchoCanceller, EchoReference, BargeInDetector
+
+RATE = 16000
+BLOCK = 400
+
+
+def _echo_path(far: np.ndarray, delay: int = 40, gain: float = 0.3) -> np.ndarray:
+    echo = np.zeros_like(far)
+    echo[delay:] = gain * far[:-delay]
+    return echo
+
+
+def _run(canceller, mic, far):
+    out = np.empty_like(mic)
+    for start in range(0, len(mic), BLOCK):
+        canceller.process(mic[start:start + BLOCK], far[start:start + BLOCK], out[start:start + BLOCK])
+    return out
+
+
+def _rms(x):
+    return float(np.sqrt(np.mean(x ** 2)))
+
+
+def test_echo_is_cancelled_after_convergence():
+    rng = np.random.default_rng(0)
+    far = (rng.standard_normal(RATE * 4) * 0.2).astype(np.float32)
+    mic = _echo_path(far)
+    canceller = EchoCanceller(block_size=BLOCK, filter_length=1600)
+    out = _run(canceller, mic, far)
+    tail = slice(-RATE, None)
+    erle_db = 20 * np.log10(_rms(mic[tail]) / _rms(out[tail]))
+    assert erle_db > 20
+
+
+def test_near_end_speech_under_loud_playback_freezes_adaptation():
+    rng = np.random.default_rng(1)
+    far = np.clip(rng.standard_normal(RATE * 3) * 0.25, -0.8, 0.8).astype(np.float32)
+    echo = _echo_path(far)
+    canceller = EchoCanceller(block_size=BLOCK, filter_length=1600)
+    _run(canceller, echo[:RATE * 2], far[:RATE * 2])
+    converged = canceller._weights.copy()
+
+    # 近端语音比扬声器播放的峰值低，但明显高于衰减后的回声
+    t = np.arange(RATE) / RATE
+    near = (0.5 * np.sin(2 * np.pi * 300 * t)).astype(np.float32)
+    mic = echo[RATE * 2:] + near
+    flagged = 0
+    out = np.empty_like(mic)
+    for start in range(0, len(mic), BLOCK):
+        canceller.process(mic[start:start + BLOCK], far[RATE * 2 + start:RATE * 2 + start + BLOCK],
+                          out[start:start + BLOCK])
+        flagged += canceller.double_talk
+    assert flagged == len(mic) // BLOCK
+    np.testing.assert_array_equal(canceller._weights, converged)
+    # 滤波器没有发散：输出仍是近端语音
+    assert _rms(out - near) < 0.1 * _rms(near)
+
+
+def test_echo_reference_fifo_pads_with_zeros():
+    reference = EchoReference(8)
+    reference.push(np.array([1000, 2000, 3000], dtype=np.int16))
+    out = np.ones(5, dtype=np.float32)
+    reference.pull(out)
+    np.testing.assert_allclose(out[:3], np.array([1000, 2000, 3000]) / 32768.0)
+    assert not out[3:].any()
+
+
+def test_barge_in_needs_consecutive_frames_above_echo():
+    detector = BargeInDetector(threshold=0.03, min_frames=3)
+    assert not detector.update(0.1, echo_rms=0.08)  # 未明显高于回声
+    assert [detector.update(0.1, echo_rms=0.01) for _ in range(4)] == [False, False, True, False]
+    detector.update(0.01)
+    assert not detector.update(0.1)
@@ -0,0 +1,111 @@
+import os
+import time
+
+from xiaozhi_client.archive import ConversationArchive, PendingTurn
+
+DAY = 86400.0
+
+
+def make_turn(tmp_path, started, size, name=None):
+    """started时刻开始、带一个size字节下行WAV的轮次"""
+    turn = PendingTurn(wall_clock=lambda: started)
+    turn.stt = f"第{started:.0f}轮"
+    path = tmp_path / (name or f"{started:.0f}.wav")
+    path.write_bytes(bytes(size))
+    turn.add_audio("downlink", str(path), 16000, 1)
+    return turn, str(path)
+
+
+def test_quota_evicts_oldest_turns_and_files(tmp_path):
+    archive = ConversationArchive(str(tmp_path / "archive.db"), max_bytes=3000)
+    paths = []
+    # 乱序写入，淘汰按开始时间而不是写入顺序
+    for started in (5, 1, 3, 2, 4):
+        turn, path = make_turn(tmp_path, started, 1000)
+        paths.append((started, path))
+        archive.add_turn(turn)
+
+    assert archive.total_bytes == 3000
+    assert sorted(t.started for t in archive.search(limit=10)) == [3, 4, 5]
+    for started, path in paths:
+        assert os.path.exists(path) == (started >= 3)
+    assert archive.evicted_turns == 2
+    assert archive.evicted_files == 2
+    archive.close()
+
+
+def test_quota_eviction_spans_batches(tmp_path):
+    archive = ConversationArchive(str(tmp_path / "archive.db"))
+    count = ConversationArchive._EVICT_BATCH * 2 + 10
+    for started in range(count):
+        archive.add_turn(make_turn(tmp_path, started, 100)[0])
+    archive.max_bytes = 500
+
+    assert archive.enforce() == count - 5
+    assert [t.started for t in archive.search(newest_first=False)] == list(range(count - 5, count))
+    assert archive.total_bytes == 500
+    archive.close()
+
+
+def test_shared_audio_file_is_kept_until_unreferenced(tmp_path):
+    archive = ConversationArchive(str(tmp_path / "archive.db"))
+    first, path = make_turn(tmp_path, 1, 100, name="shared.wav")
+    second, _ = make_turn(tmp_path, 2, 100, name="shared.wav")
+    archive.add_turn(first)
+    archive.add_turn(second)
+
+    archive.delete([t.id for t in archive.search(until=1.5)])
+    assert os.path.exists(path)
+    archive.delete([t.id for t in archive.search()])
+    assert not os.path.exists(path)
+    archive.close()
+
+
+def test_retention_evicts_expired_turns(tmp_path):
+    archive = ConversationArchive(str(tmp_path / "archive.db"), retention_days=7)
+    now = time.time()
+    paths = {}
+    for age in (10, 8, 6, 1):
+        turn, paths[age] = make_turn(tmp_path, now - age * DAY, 100)
+        archive.add_turn(turn)
+    # 写入时已按间隔检查过一次保留期，这里补上其余过期的轮次
+    archive.enforce(now)
+
+    assert sorted(round((now - t.started) / DAY) for t in archive.search()) == [1, 6]
+    assert [age for age, path in paths.items() if os.path.exists(path)] == [6, 1]
+    assert archive.total_bytes == 200
+    archive.close()
+
+
+def test_submitted_turns_are_written_in_background(tmp_path):
+    archive = ConversationArchive(str(tmp_path / "archive.db"), max_bytes=1000)
+    futures = [archive.submit_turn(make_turn(tmp_path, started, 400)[0], device_id="dev")
+               for started in range(4)]
+    archive.flush()
+
+    assert [f.result() for f in futures] == [1, 2, 3, 4]
+    assert [t.started for t in archive.search(device_id="dev", newest_first=False)] == [2, 3]
+    archive.close()
+
+
+def test_client_archives_text_turn(sim, make_client):
+    async def main():
+        client = make_client()
+        client.enable_archive()
+        await client.connect()
+        await client.ask("你好", timeout=10)
+        await client.close()
+        client.archive.flush()
+        turns = client.archive.search()
+        archive = client.archive
+        closing = client.enable_archive(False)
+        # 关闭在线程池中等待后台写入结束，事件循环不被阻塞
+        await closing
+        return turns, archive
+
+    turns, archive = sim.run(main())
+    assert archive._writer._shutdown
+    assert len(turns) == 1
+    assert turns[0].stt == "你好"
+    assert turns[0].reply
+    assert turns[0].audio_for("downlink").bytes > 0
@@ -0,0 +1,138 @@
+import threading
+from multiprocessing import get_context
+
+import numpy as np
+import pytest
+
+from xiaozhi_client.utils.audio_worker import AudioWorker, RemoteOutputStream, ShmRing
+
+
+class FakeWorker:
+    """只提供共享内存缓冲区和门铃的子进程替身，running置为False即模拟子进程退出"""
+
+    def __init__(self, ring_bytes=4096):
+        self.running = True
+        self._playback = ShmRing(ring_bytes)
+        self._playback_bell = threading.Semaphore(0)
+
+    discard_playback = AudioWorker.discard_playback
+
+    def _call(self, cmd, kind=None, params=None):
+        return 0.0 if cmd == "latency" else None
+
+    def _attach(self, kind, stream):
+        pass
+
+    def _detach(self, kind, stream):
+        pass
+
+    def stop(self):
+        self._playback.close()
+
+
+@pytest.fixture
+def worker():
+    worker = FakeWorker()
+    yield worker
+    worker.stop()
+
+
+def full_stream(worker):
+    """缓冲区已写满的播放流，再写入会阻塞"""
+    stream = RemoteOutputStream(worker, buffer_ms=10, samplerate=16000, channels=1, dtype=np.int16)
+    stream.start()
+    stream.write(np.ones(160, dtype=np.int16))
+    return stream
+
+
+def write_in_thread(stream, data):
+    errors = []
+
+    def run():
+        try:
+            stream.write(data)
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, errors
+
+
+def test_request_discard_skips_only_earlier_data(worker):
+    ring = worker._playback
+    ring.write(np.full(100, 1, dtype=np.uint8))
+    ring.request_discard()
+    ring.write(np.full(50, 2, dtype=np.uint8))
+    out = np.zeros(200, dtype=np.uint8)
+    assert ring.read_into(out) == 50
+    assert ring.skipped
+    assert (out[:50] == 2).all()
+    assert ring.read_into(out) == 0
+    assert not ring.skipped
+
+
+def test_ring_attached_by_name_shares_lock_and_counters():
+    lock = get_context("spawn").Lock()
+    writer = ShmRing(1024, lock=lock)
+    reader = ShmRing(name=writer.name, lock=lock)
+    try:
+        assert writer.push(np.arange(10, dtype=np.uint8))
+        out = np.zeros(16, dtype=np.uint8)
+        assert reader.read_into(out) == 10
+        assert (out[:10] == np.arange(10)).all()
+        assert writer.available() == 0
+        assert not writer.push(np.zeros(2048, dtype=np.uint8))
+        assert reader.stats()["dropped"] == 1
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_discard_playback_is_noop_when_worker_not_running(worker):
+    worker._playback.write(np.ones(100, dtype=np.uint8))
+    worker.running = False
+    worker.discard_playback()
+    worker.running = True
+    assert worker._playback.read_into(np.zeros(200, dtype=np.uint8)) == 100
+    assert AudioWorker().discard_playback() is None
+
+
+def test_blocked_write_returns_when_stream_stops(worker):
+    stream = full_stream(worker)
+    thread, errors = write_in_thread(stream, np.ones(1600, dtype=np.int16))
+    thread.join(0.3)
+    assert thread.is_alive()
+
+    stream.stop()
+    thread.join(1.0)
+    assert not thread.is_alive()
+    assert errors == []
+
+
+def test_blocked_write_raises_when_worker_exits(worker):
+    stream = full_stream(worker)
+    thread, errors = write_in_thread(stream, np.ones(1600, dtype=np.int16))
+    thread.join(0.3)
+    assert thread.is_alive()
+
+    worker.running = False
+    thread.join(1.0)
+    assert not thread.is_alive()
+    assert len(errors) == 1
+    # 子进程已退出时停止和关闭流不再发送控制命令
+    stream.stop()
+    stream.close()
+
+
+def test_flush_playback_discards_worker_ring(sim, make_client, worker):
+    async def scenario():
+        client = make_client()
+        client._audio_worker = worker
+        worker._playback.write(np.ones(320, dtype=np.uint8))
+        client._flush_playback()
+        client._audio_worker = None
+        out = np.zeros(320, dtype=np.uint8)
+        return worker._playback.read_into(out)
+
+    assert sim.run(scenario()) == 0
@@ -0,0 +1,54 @@
+import importlib.util
+import json
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def bench(monkeypatch):
+    """加载benchmarks/run_benchmarks.py，并保留测试进程的日志输出"""
+    spec = importlib.util.spec_from_file_location(
+        "run_benchmarks", os.path.join(ROOT, "benchmarks", "run_benchmarks.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module.logger, "remove", lambda *args: None)
+    return module
+
+
+def result(ns):
+    return {"ns_per_op": ns, "ops_per_sec": 1e9 / ns, "min_ns_per_op": ns, "rounds": 1}
+
+
+def test_compare_flags_only_regressions_over_threshold(bench):
+    baseline = {"a": result(100.0), "b": result(100.0)}
+    current = {"a": result(109.0), "b": result(120.0), "c": result(50.0)}
+    assert bench.compare(current, baseline, threshold=10.0) == ["b"]
+
+
+def test_measure_reports_per_op_median(bench):
+    calls = []
+    stats = bench.measure(lambda: calls.append(1), ops=10, rounds=3)
+    # 预热一轮加3轮
+    assert len(calls) == 4
+    assert stats["rounds"] == 3
+    assert stats["min_ns_per_op"] <= stats["ns_per_op"]
+
+
+def test_baseline_round_trip_and_regression_exit(bench, tmp_path):
+    path = str(tmp_path / "baseline.json")
+    args = ["--filter", "save_wav", "--rounds", "1"]
+    assert bench.main(args + ["--save-baseline", path]) == 0
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert list(saved["results"]) == ["save_wav[10s]"]
+    assert "python" in saved["environment"]
+
+    # 把基线改成快得多，本次结果必然超过阈值
+    saved["results"]["save_wav[10s]"]["ns_per_op"] /= 1000
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(saved, f)
+    assert bench.main(args + ["--baseline", path]) == 1
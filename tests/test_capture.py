@@ -0,0 +1,151 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from xiaozhi_client.utils.capture import CaptureEngine, LevelMeter, LoopChannel
+
+FRAME = 960
+
+
+class FakeStream:
+    """由测试直接调用回调的输入流"""
+
+    def __init__(self, callback=None, **kwargs):
+        self.callback = callback
+        self.active = False
+        self.closed = False
+
+    def start(self):
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+    def close(self):
+        self.closed = True
+
+    def push(self, level):
+        block = np.full((FRAME, 1), level, dtype=np.float32)
+        self.callback(block, FRAME, None, None)
+
+
+def make_engine(**kwargs):
+    streams = []
+
+    def open_stream(**stream_kwargs):
+        stream = FakeStream(**stream_kwargs)
+        streams.append(stream)
+        return stream
+
+    return CaptureEngine(open_stream, FRAME, **kwargs), streams
+
+
+def test_one_stream_shared_by_all_subscribers():
+    engine, streams = make_engine()
+    first, second = [], []
+    engine.subscribe(lambda frame, rms, ts: first.append(rms))
+    meter = engine.subscribe(LevelMeter())
+    engine.subscribe(lambda frame, rms, ts: second.append(frame))
+    assert len(streams) == 1 and engine.subscribers == 3
+
+    streams[0].push(0.5)
+    assert first == [pytest.approx(0.5)]
+    assert meter.rms == pytest.approx(0.5) and meter.db == pytest.approx(20 * np.log10(0.5))
+    assert second[0].size == FRAME
+
+    engine.unsubscribe(meter)
+    assert engine.running
+    engine.close()
+    assert not engine.running and streams[0].closed
+    assert engine.stats()["frames"] == 1
+
+
+def test_preprocess_runs_once_per_frame_and_errors_are_isolated():
+    calls = []
+
+    def preprocess(frame):
+        calls.append(1)
+        frame *= 0.5
+
+    engine, streams = make_engine(preprocess=preprocess)
+    seen = []
+
+    def broken(frame, rms, ts):
+        raise ValueError("订阅者错误")
+
+    engine.subscribe(broken)
+    engine.subscribe(lambda frame, rms, ts: seen.append(rms))
+    streams[0].push(0.4)
+    assert calls == [1]
+    # 预处理后的强度交给所有订阅者，前一个订阅者出错不影响后面的
+    assert seen == [pytest.approx(0.2)]
+    assert engine.stats()["errors"] == 1
+
+
+def test_failed_open_reverts_subscription():
+    def open_stream(**kwargs):
+        raise OSError("没有输入设备")
+
+    engine = CaptureEngine(open_stream, FRAME)
+    with pytest.raises(OSError):
+        engine.subscribe(LevelMeter())
+    assert engine.subscribers == 0 and not engine.running
+
+
+def test_level_meter_peak_decays():
+    meter = LevelMeter(decay=0.5)
+    meter(None, 0.8, 1)
+    meter(None, 0.1, 2)
+    assert meter.rms == 0.1 and meter.peak == pytest.approx(0.4)
+    meter.reset()
+    assert meter.db == -120.0
+
+
+def test_loop_channel_is_bounded_and_wakes_consumer():
+    async def main():
+        channel = LoopChannel(asyncio.get_running_loop(), maxsize=3)
+        results = [channel.put(i) for i in range(5)]
+        drained = [await channel.get() for _ in range(3)]
+
+        # 消费者等待时由采集线程放入，事件循环被唤醒
+        getter = asyncio.ensure_future(channel.get())
+        await asyncio.sleep(0)
+        thread = threading.Thread(target=channel.put, args=("frame",))
+        thread.start()
+        received = await asyncio.wait_for(getter, 1.0)
+        thread.join()
+        return results, drained, received, channel.dropped
+
+    results, drained, received, dropped = asyncio.run(main())
+    assert results == [True, True, True, False, False]
+    assert drained == [0, 1, 2] and dropped == 2
+    assert received == "frame"
+
+
+def test_level_meter_and_voice_input_share_microphone(sim, make_client):
+    async def main():
+        client = make_client()
+        await client.connect()
+        client.enable_level_meter()
+        engine = client.capture_engine
+        await client.start_voice_input()
+        both = engine.subscribers
+        sim.audio.say(1.0, level=0.2, pause=1.0)
+        await asyncio.sleep(0.5)
+        speaking = client.level_meter.rms
+        await client.stop_voice_input()
+        after_input = (engine.running, engine.subscribers)
+        client.enable_level_meter(False)
+        stopped = engine.running
+        await client.close()
+        return both, speaking, after_input, stopped
+
+    both, speaking, after_input, stopped = sim.run(main())
+    assert both == 2
+    assert speaking > 0.05
+    # 语音输入停止后电平表仍在采集，最后一个订阅者退出才关闭麦克风
+    assert after_input == (True, 1)
+    assert not stopped
+    assert sim.server.received_audio > 0
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from xiaozhi_client.utils.conditioning import (
+    AutomaticGainControl, HighPassFilter, InputConditioner, SpectralNoiseSuppressor,
+)
+
+RATE = 16000
+BLOCK = 960
+
+
+def tone(freq, seconds, amplitude=0.3):
+    t = np.arange(int(RATE * seconds)) / RATE
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def blockwise(processor, signal, block=BLOCK):
+    out = signal.copy()
+    for start in range(0, len(out), block):
+        processor.process(out[start:start + block])
+    return out
+
+
+def rms(x):
+    return float(np.sqrt(np.mean(np.square(x, dtype=np.float64))))
+
+
+def test_highpass_matches_recursive_reference():
+    signal = np.random.default_rng(1).standard_normal(3000).astype(np.float32) * 0.1 + 0.2
+    hp = HighPassFilter(RATE, cutoff=80.0, order=2)
+    out = blockwise(hp, signal, block=700)
+
+    reference = signal.astype(np.float64)
+    for _ in range(2):
+        low, filtered = 0.0, np.empty_like(reference)
+        for i, x in enumerate(reference):
+            low = hp.a * low + (1 - hp.a) * x
+            filtered[i] = x - low
+        reference = filtered
+    assert np.allclose(out, reference, atol=1e-4)
+
+
+def test_highpass_removes_dc_and_keeps_voice_band():
+    hp = HighPassFilter(RATE, cutoff=80.0)
+    out = blockwise(hp, tone(1000, 1.0) + 0.2)
+    tail = out[RATE // 2:]
+    assert abs(float(np.mean(tail))) < 1e-3
+    assert rms(tail) == pytest.approx(0.3 / np.sqrt(2), rel=0.05)
+
+
+def test_suppressor_without_subtraction_is_a_pure_delay():
+    ns = SpectralNoiseSuppressor(RATE, block_size=BLOCK, over_subtraction=0.0, smoothing=0.0)
+    signal = np.random.default_rng(2).standard_normal(BLOCK * 16).astype(np.float32) * 0.1
+    out = blockwise(ns, signal)
+    delay = ns.latency_samples
+    assert delay == ns.hop
+    assert np.allclose(out[delay:], signal[:-delay], atol=1e-5)
+
+
+def test_suppressor_attenuates_stationary_noise_more_than_tone():
+    rng = np.random.default_rng(3)
+    noise = rng.standard_normal(RATE * 3).astype(np.float32) * 0.02
+    ns = SpectralNoiseSuppressor(RATE, block_size=BLOCK)
+    out_noise = blockwise(ns, noise)
+    # 噪声估计收敛后背景噪声明显衰减，叠加在噪声上的音调基本不受影响
+    assert 20 * np.log10(rms(out_noise[RATE:]) / rms(noise[RATE:])) < -3
+
+    signal = np.concatenate([noise, tone(500, 1.0) + noise[:RATE]])
+    ns.reset()
+    out = blockwise(ns, signal)
+    speech = slice(len(noise) + RATE // 4, None)
+    assert 20 * np.log10(rms(out[speech]) / rms(signal[speech])) > -1
+
+
+def test_agc_moves_towards_target_and_holds_in_silence():
+    agc = AutomaticGainControl(target_rms=0.1, max_gain=10.0, release=0.5)
+    quiet = tone(300, 2.0, amplitude=0.02)
+    out = blockwise(agc, quiet)
+    assert rms(out[-BLOCK:]) == pytest.approx(0.1, rel=0.1)
+    gain = agc.gain
+    blockwise(agc, np.full(BLOCK * 5, 1e-4, dtype=np.float32))
+    assert agc.gain == gain
+
+    loud = blockwise(AutomaticGainControl(max_gain=10.0, min_gain=10.0), tone(300, 0.2))
+    assert np.abs(loud).max() <= 1.0
+
+
+def test_conditioner_runs_chain_and_reports_stats():
+    conditioner = InputConditioner(RATE, block_size=BLOCK)
+    assert [name for name, _ in conditioner.stages] == ["highpass", "noise_suppression", "agc"]
+    for _ in range(10):
+        block = tone(440, BLOCK / RATE)
+        assert conditioner.process(block) is block
+
+    stats = conditioner.stats()
+    assert stats["blocks"] == 10
+    assert set(stats["stages_ms"]) == {"highpass", "noise_suppression", "agc"}
+    assert stats["latency_ms"] == pytest.approx(1000 * conditioner.stage("noise_suppression").hop / RATE)
+    assert stats["load"] > 0
+    conditioner.reset_stats()
+    assert conditioner.stats()["blocks"] == 0
+    assert InputConditioner(RATE, highpass_cutoff=None, agc=False).stage("agc") is None
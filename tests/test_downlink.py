@@ -0,0 +1,78 @@
+import asyncio
+
+import numpy as np
+import opuslib
+import pytest
+
+from xiaozhi_client import TtsStream, TtsBoundary
+from xiaozhi_client.types import AudioConfig
+from xiaozhi_client.utils.simulation import Simulation, SimulatedServer
+
+
+class LongPacketServer(SimulatedServer):
+    """hello中声明60ms帧，实际下发120ms的包"""
+
+    @staticmethod
+    def _tts_packet(params: dict) -> bytes:
+        return SimulatedServer._tts_packet(dict(params, frame_duration=120))
+
+
+def _packet(sample_rate, duration_ms, channels=1):
+    frame_size = sample_rate * duration_ms // 1000
+    pcm = np.zeros(frame_size * channels, dtype=np.int16).tobytes()
+    return opuslib.Encoder(sample_rate, channels, "voip").encode(pcm, frame_size)
+
+
+def test_hello_negotiates_separate_downlink_parameters(sim, make_client):
+    sim.server = SimulatedServer(audio_params={"format": "opus", "sample_rate": 24000,
+                                               "channels": 1, "frame_duration": 20})
+
+    async def main():
+        client = make_client()
+        await client.connect()
+        result = await client.ask("你好", timeout=10)
+        await client.close()
+        return client, result
+
+    client, result = sim.run(main())
+    assert (client.downlink_config.sample_rate, client.downlink_config.frame_duration) == (24000, 20)
+    assert client.downlink_config.frame_size == 480
+    # 上行参数不受影响
+    assert client.audio_config.sample_rate == 16000 and client.audio_config.frame_duration == 60
+    assert not result.aborted and sim.audio.seconds_played > 0
+
+
+def test_packets_longer_than_negotiated_frame_are_played(sim, make_client):
+    sim.server = LongPacketServer()
+
+    async def main():
+        client = make_client()
+        await client.connect()
+        await client.ask("你好", timeout=10)
+        # 服务端按60ms的节奏下发120ms的包，本地播放时长是下发时长的两倍
+        while client.is_playing.is_set() or not client.audio_queue.empty():
+            await asyncio.sleep(0.1)
+        await client.close()
+
+    sim.run(main())
+    turn = sim.server.turns[0]
+    packets = sum(max(1, round(len(s) * sim.server.seconds_per_char / 0.06))
+                  for s in sim.server.replies(turn.stt))
+    # 每个包完整解码为120ms，没有因解码缓冲区不足被丢弃
+    assert sim.audio.seconds_played == pytest.approx(packets * 0.12)
+
+
+def test_tts_stream_decodes_packets_up_to_120ms():
+    config = AudioConfig(sample_rate=16000, frame_size=320, frame_duration=20)
+    stream = TtsStream(config, format="pcm")
+    stream.feed_audio(_packet(16000, 20))
+    stream.feed_audio(_packet(16000, 120))
+    stream.feed_boundary(TtsBoundary("stop"))
+    stream.close()
+
+    async def main():
+        return [chunk async for chunk in stream]
+
+    chunks = Simulation().run(main())
+    assert [len(c) for c in chunks[:2]] == [320, 1920]
+    assert stream.dropped == 0
@@ -0,0 +1,144 @@
+import asyncio
+import functools
+import json
+import threading
+
+import pytest
+
+from xiaozhi_client.iot import IoTError, IoTRegistry
+from xiaozhi_client.types import IoTProperty
+
+
+class Lamp:
+    def __init__(self):
+        self.on = False
+        self.brightness = 50
+
+    def turn_on(self):
+        self.on = True
+
+    async def set_brightness(self, brightness):
+        self.brightness = brightness
+
+
+def lamp_registry(lamp):
+    registry = IoTRegistry()
+    registry.add_device("Lamp", "台灯")
+    registry.add_property("Lamp", "power", "是否打开", "boolean", getter=lambda: lamp.on)
+    registry.add_property("Lamp", "brightness", "亮度", "number", getter=lambda: lamp.brightness)
+    registry.add_method("Lamp", "TurnOn", "打开", {}, lamp.turn_on)
+    registry.add_method("Lamp", "SetBrightness", "设置亮度",
+                        {"brightness": IoTProperty("0到100", "number")}, lamp.set_brightness)
+    return registry
+
+
+def test_descriptor_and_state_messages():
+    lamp = Lamp()
+    registry = lamp_registry(lamp)
+    descriptors = registry.descriptor_message("s1")["descriptors"]
+
+    assert descriptors[0]["name"] == "Lamp"
+    assert set(descriptors[0]["methods"]) == {"TurnOn", "SetBrightness"}
+    assert descriptors[0]["methods"]["SetBrightness"]["parameters"]["brightness"]["type"] == "number"
+    assert registry.state_message("s1")["states"] == [{"name": "Lamp", "state": {"power": False, "brightness": 50}}]
+    with pytest.raises(ValueError):
+        registry.add_property("Lamp", "color", "颜色", "rgb")
+
+
+def test_resolve_validates_commands():
+    registry = lamp_registry(Lamp())
+    entry, kwargs = registry.resolve({"name": "Lamp", "method": "SetBrightness", "parameters": {"brightness": 80}})
+    assert kwargs == {"brightness": 80}
+    for command in (
+        {"name": "Lamp", "method": "Blink"},
+        {"name": "Fan", "method": "TurnOn"},
+        {"name": "Lamp", "method": "SetBrightness", "parameters": {}},
+        {"name": "Lamp", "method": "SetBrightness", "parameters": {"brightness": True}},
+        {"name": "Lamp", "method": "SetBrightness", "parameters": {"brightness": "80"}},
+    ):
+        with pytest.raises(IoTError):
+            registry.resolve(command)
+
+
+def test_dispatch_runs_sync_and_async_handlers():
+    lamp = Lamp()
+    registry = lamp_registry(lamp)
+
+    async def main():
+        registry.dispatch({"name": "Lamp", "method": "TurnOn"})
+        registry.dispatch({"name": "Lamp", "method": "SetBrightness", "parameters": {"brightness": 10}})
+        await registry.wait_idle()
+
+    asyncio.run(main())
+    assert lamp.on and lamp.brightness == 10
+
+
+def test_wrapped_async_handlers_are_awaited():
+    calls = []
+
+    async def record(name, value):
+        calls.append((name, value, threading.current_thread() is threading.main_thread()))
+
+    class Handler:
+        async def __call__(self, value):
+            await record("call", value)
+
+    registry = IoTRegistry()
+    registry.add_device("Fan", "风扇")
+    speed = {"value": IoTProperty("档位", "number")}
+    registry.add_method("Fan", "Partial", "", speed, functools.partial(record, "partial"))
+    registry.add_method("Fan", "Callable", "", speed, Handler())
+    # 返回协程的普通函数在注册时无法识别，执行后再await返回值
+    registry.add_method("Fan", "Lambda", "", speed, lambda value: record("lambda", value))
+
+    async def main():
+        for method in ("Partial", "Callable", "Lambda"):
+            registry.dispatch({"name": "Fan", "method": method, "parameters": {"value": 1}})
+        await registry.wait_idle()
+
+    asyncio.run(main())
+    assert sorted(calls) == [("call", 1, True), ("lambda", 1, True), ("partial", 1, True)]
+
+
+class CommandServer:
+    """hello之后下发一条IoT命令消息，记录客户端发来的文本消息"""
+
+    def __init__(self, commands):
+        self.commands = commands
+        self.received = []
+
+    async def handle(self, websocket):
+        await websocket.recv()
+        await websocket.send(json.dumps({
+            "type": "hello", "session_id": "s1",
+            "audio_params": {"format": "opus", "sample_rate": 16000, "channels": 1, "frame_duration": 60},
+        }))
+        await websocket.send(json.dumps({"type": "iot", "commands": self.commands}))
+        async for message in websocket:
+            if isinstance(message, str):
+                self.received.append(json.loads(message))
+
+
+def test_client_reports_devices_and_executes_commands(sim, make_client):
+    lamp = Lamp()
+    sim.server = CommandServer([
+        {"name": "Lamp", "method": "Unknown"},
+        {"name": "Lamp", "method": "SetBrightness", "parameters": {"brightness": 90}},
+    ])
+
+    async def main():
+        client = make_client()
+        client.iot = lamp_registry(lamp)
+        client.iot_state.registry = client.iot
+        await client.connect()
+        await asyncio.sleep(1.0)
+        await client.iot.wait_idle()
+        await client.close()
+
+    sim.run(main())
+    iot = [m for m in sim.server.received if m.get("type") == "iot"]
+    assert iot[0]["descriptors"][0]["name"] == "Lamp"
+    assert iot[1]["states"] == [{"name": "Lamp", "state": {"power": False, "brightness": 50}}]
+    assert iot[1]["session_id"] == "s1"
+    # 未注册的方法被忽略，同一消息中的合法命令照常执行
+    assert lamp.brightness == 90
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from xiaozhi_client.iot import IoTRegistry, IoTStateSync
+
+
+class Recorder:
+    """记录每条states消息的发送时刻，fail为True时发送失败"""
+
+    def __init__(self):
+        self.messages = []
+        self.fail = False
+
+    async def send(self, message):
+        if self.fail:
+            raise ConnectionError("断开")
+        self.messages.append((asyncio.get_running_loop().time(), message["states"]))
+
+
+def make_sync(**kwargs):
+    recorder = Recorder()
+    return IoTStateSync(IoTRegistry(), recorder.send, **kwargs), recorder
+
+
+def test_changes_in_window_coalesce(sim):
+    async def main():
+        sync, recorder = make_sync(window=0.1, max_rate=5.0)
+        start = asyncio.get_running_loop().time()
+        for volume in (10, 20, 30):
+            sync.update("Speaker", "volume", volume)
+            await asyncio.sleep(0.02)
+        sync.update("Lamp", "power", True)
+        await asyncio.sleep(0.5)
+        return start, recorder.messages, sync
+
+    start, messages, sync = sim.run(main())
+    assert len(messages) == 2
+    when, states = messages[0]
+    assert when - start == pytest.approx(0.1)
+    assert states == [{"name": "Speaker", "state": {"volume": 30}}]
+    assert messages[1][1] == [{"name": "Lamp", "state": {"power": True}}]
+    assert (sync.updates, sync.messages) == (4, 2)
+
+
+def test_revert_to_reported_value_is_not_sent(sim):
+    async def main():
+        sync, recorder = make_sync(window=0.1)
+        sync.update("Speaker", "volume", 10)
+        await asyncio.sleep(0.5)
+        sync.update("Speaker", "volume", 50)
+        sync.update("Speaker", "volume", 10)
+        await asyncio.sleep(0.5)
+        return recorder.messages
+
+    messages = sim.run(main())
+    assert [states for _, states in messages] == [[{"name": "Speaker", "state": {"volume": 10}}]]
+
+
+def test_rate_limit_and_priority(sim):
+    async def main():
+        sync, recorder = make_sync(window=0.0, max_rate=2.0)
+        start = asyncio.get_running_loop().time()
+        sync.update("Speaker", "volume", 1)
+        await asyncio.sleep(0.05)
+        sync.update("Speaker", "volume", 2)
+        await asyncio.sleep(1.0)
+        sync.update("Lamp", "power", True)
+        await asyncio.sleep(0.01)
+        sync.update("Lamp", "power", False, priority=True)
+        await asyncio.sleep(0.01)
+        return [(round(when - start, 3), states) for when, states in recorder.messages]
+
+    messages = sim.run(main())
+    # 每设备每秒最多两次：第二次变化推迟到上次上报后0.5秒
+    assert messages[0] == (0.0, [{"name": "Speaker", "state": {"volume": 1}}])
+    assert messages[1] == (0.5, [{"name": "Speaker", "state": {"volume": 2}}])
+    # 优先变化不等频率上限，立即上报最新值
+    assert messages[2][1] == [{"name": "Lamp", "state": {"power": True}}]
+    assert messages[3] == (1.06, [{"name": "Lamp", "state": {"power": False}}])
+
+
+def test_failed_send_is_retried_with_newer_values(sim):
+    async def main():
+        sync, recorder = make_sync(window=0.1, max_rate=0)
+        recorder.fail = True
+        sync.update("Speaker", "volume", 10)
+        sync.update("Speaker", "muted", False)
+        await asyncio.sleep(0.15)
+        recorder.fail = False
+        sync.update("Speaker", "volume", 20)
+        await asyncio.sleep(0.5)
+        return recorder.messages
+
+    messages = sim.run(main())
+    assert [states for _, states in messages] == [[{"name": "Speaker", "state": {"volume": 20, "muted": False}}]]
@@ -0,0 +1,159 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from xiaozhi_client.utils.outbound import OutboundScheduler, SendPriority
+from xiaozhi_client.utils.simulation import Simulation
+
+
+class SlowWire:
+    """每帧写出耗时固定的传输，记录写出顺序"""
+
+    def __init__(self, seconds: float = 0.06):
+        self.seconds = seconds
+        self.written = []
+
+    async def send(self, data):
+        await asyncio.sleep(self.seconds)
+        self.written.append(data)
+
+
+def test_control_message_overtakes_queued_audio():
+    wire = SlowWire()
+
+    async def main():
+        scheduler = OutboundScheduler(wire.send, audio_capacity=64)
+        for i in range(20):
+            await scheduler.send(f"audio{i}".encode(), SendPriority.AUDIO)
+        await asyncio.sleep(0.1)  # 已经开始写出音频
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await scheduler.send('{"type": "abort"}', SendPriority.CONTROL)
+        waited = loop.time() - started
+        await scheduler.close()
+        return waited
+
+    waited = Simulation().run(main())
+    # 控制消息只等正在写出的那一帧，然后排在所有积压音频之前
+    assert waited <= 2 * wire.seconds
+    position = wire.written.index('{"type": "abort"}')
+    assert position <= 2
+    assert wire.written[:position] == [b"audio0", b"audio1"][:position]
+
+
+def test_audio_order_is_preserved_and_backpressure_bounds_queue():
+    wire = SlowWire(0.01)
+
+    async def main():
+        scheduler = OutboundScheduler(wire.send, audio_capacity=4)
+        peak = 0
+        for i in range(30):
+            await scheduler.send(i.to_bytes(1, "little"), SendPriority.AUDIO)
+            peak = max(peak, scheduler.queued(SendPriority.AUDIO))
+        await asyncio.sleep(1.0)
+        stats = scheduler.stats()
+        await scheduler.close()
+        return peak, stats
+
+    peak, stats = Simulation().run(main())
+    assert peak <= 4
+    assert wire.written == [i.to_bytes(1, "little") for i in range(30)]
+    assert stats["audio"]["count"] == 30 and stats["audio"]["queued"] == 0
+
+
+def test_audio_write_error_goes_to_its_own_callback():
+    wire = SlowWire(0.01)
+    broken = {b"b"}
+
+    async def send(data):
+        if data in broken:
+            raise ConnectionError("broken")
+        await wire.send(data)
+
+    async def main():
+        scheduler = OutboundScheduler(send)
+        errors = []
+        await scheduler.send(b"a", SendPriority.AUDIO, errors.append)
+        await scheduler.send(b"b", SendPriority.AUDIO, lambda e: errors.append(("b", e)))
+        await scheduler.send(b"c", SendPriority.AUDIO)
+        await asyncio.sleep(0.1)
+        # 音频帧的错误不会从之后无关的控制消息发送中抛出
+        await scheduler.send("{}", SendPriority.CONTROL)
+        await scheduler.close()
+        return errors
+
+    errors = Simulation().run(main())
+    assert len(errors) == 1 and errors[0][0] == "b" and isinstance(errors[0][1], ConnectionError)
+    assert wire.written == [b"a", b"c", "{}"]
+
+
+def test_control_send_raises_write_error():
+    async def failing(data):
+        raise ConnectionError("broken")
+
+    async def main():
+        scheduler = OutboundScheduler(failing)
+        with pytest.raises(ConnectionError):
+            await scheduler.send("{}", SendPriority.CONTROL)
+        await scheduler.close()
+
+    Simulation().run(main())
+
+
+def test_client_audio_write_error_reaches_caller_not_next_control_message(sim, make_client):
+    async def main():
+        client = make_client()
+        await client.connect()
+        wire_send = client.websocket.send
+
+        async def broken_audio(data):
+            if isinstance(data, bytes):
+                raise ConnectionError("broken")
+            await wire_send(data)
+
+        client.websocket.send = broken_audio
+        encoder = client.encoder
+        errors = []
+        frame = np.zeros(client.audio_config.frame_size, dtype=np.float32)
+        await client.send_audio(frame, paced=False, on_error=errors.append)
+        await asyncio.sleep(0.1)
+        await client.send_text({"type": "listen", "state": "stop"})
+        await asyncio.sleep(0.1)
+        kept = client.encoder is encoder
+        await client.close()
+        return errors, kept
+
+    errors, kept = sim.run(main())
+    assert len(errors) == 1 and isinstance(errors[0], ConnectionError)
+    # 发送错误不是编码器错误，编码器保持不变
+    assert kept
+    assert sim.server.received_text[-1]["state"] == "stop"
+
+
+def test_client_abort_is_written_before_pending_audio(sim, make_client):
+    written = []
+
+    async def main():
+        client = make_client()
+        await client.connect()
+        wire_send = client.websocket.send
+
+        async def slow_send(data):
+            await asyncio.sleep(0.05)
+            written.append("audio" if isinstance(data, bytes) else json.loads(data)["type"])
+            await wire_send(data)
+
+        client.websocket.send = slow_send
+        frame = np.zeros(client.audio_config.frame_size, dtype=np.float32)
+        for _ in range(30):
+            await client.send_audio(frame, paced=False)
+        await client.abort()
+        await asyncio.sleep(3.0)
+        await client.close()
+
+    sim.run(main())
+    assert written.count("audio") == 30
+    # abort只等正在写出的一帧，排在其余29帧积压音频之前
+    assert written.index("abort") <= 1
@@ -0,0 +1,92 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from xiaozhi_client.utils.pacer import FramePacer
+from xiaozhi_client.utils.simulation import Simulation
+
+FRAME = 0.06
+
+
+def _send(catch_up="burst", frames=15, stall_at=None, stall=0.5, **kwargs):
+    """在虚拟时钟上逐帧调用wait，返回[(放行时刻, 是否发送)]和统计"""
+    async def main():
+        loop = asyncio.get_running_loop()
+        pacer = FramePacer(FRAME, burst=3, catch_up=catch_up, clock=loop.time, **kwargs)
+        sent = []
+        for i in range(frames):
+            if i == stall_at:
+                await asyncio.sleep(stall)
+            ok = await pacer.wait()
+            sent.append((loop.time(), ok))
+        return sent, pacer
+
+    return Simulation().run(main())
+
+
+def test_steady_input_is_released_at_frame_rate_after_burst():
+    sent, pacer = _send(frames=10)
+    times = [t for t, _ in sent]
+    assert times == pytest.approx([max(0.0, (i - 3) * FRAME) for i in range(10)])
+    assert pacer.late_frames == 0 and pacer.dropped_frames == 0
+
+
+def test_speed_shortens_interval():
+    sent, _ = _send(frames=10, speed=2.0)
+    assert sent[-1][0] == pytest.approx(6 * FRAME / 2)
+
+
+def test_burst_policy_catches_up_on_original_schedule():
+    sent, pacer = _send("burst", stall_at=5)
+    times = [t for t, _ in sent]
+    # 停顿后落后的帧立即连续发出，之后回到原时间表
+    assert times[5:13] == pytest.approx([0.56] * 8)
+    assert times[-1] == pytest.approx((14 - 3) * FRAME)
+    assert all(ok for _, ok in sent)
+    assert pacer.late_frames > 0 and pacer.resets == 0
+
+
+def test_reset_policy_shifts_schedule_after_stall():
+    sent, pacer = _send("reset", stall_at=5)
+    times = [t for t, _ in sent]
+    assert pacer.resets == 1 and pacer.late_frames == 0
+    # 以停顿结束时刻重新对齐：之后只领先burst帧，其余帧按帧时长顺延
+    resumed = times[5]
+    assert times[5:9] == pytest.approx([resumed] * 4)
+    assert np.diff(times[8:]) == pytest.approx([FRAME] * 6)
+    assert times[-1] == pytest.approx(resumed + (14 - 5 - 3) * FRAME)
+
+
+def test_drop_policy_discards_late_frames_and_stays_in_sync():
+    sent, pacer = _send("drop", stall_at=5)
+    assert [ok for _, ok in sent[5:9]] == [False] * 4
+    assert pacer.dropped_frames == 4 and pacer.frames == 11
+    assert sent[-1][0] == pytest.approx((14 - 3) * FRAME)
+
+
+def test_idle_gap_restarts_schedule_without_lateness():
+    sent, pacer = _send(frames=8, stall_at=4, stall=2.0, idle_reset=1.0)
+    assert pacer.late_frames == 0 and pacer.max_lateness == 0.0
+    # 空闲后重新计时，又可以领先burst帧
+    assert [t for t, _ in sent[4:8]] == pytest.approx([sent[4][0]] * 4)
+
+
+def test_client_send_audio_is_paced_on_virtual_clock(sim, make_client):
+    async def main():
+        client = make_client()
+        await client.connect()
+        client.enable_pacing(burst_frames=3)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        frame = np.zeros(client.audio_config.frame_size, dtype=np.float32)
+        for _ in range(50):
+            await client.send_audio(frame)
+        elapsed = loop.time() - started
+        await asyncio.sleep(0.1)
+        await client.close()
+        return elapsed
+
+    elapsed = sim.run(main())
+    assert elapsed == pytest.approx((50 - 1 - 3) * FRAME, abs=0.01)
+    assert sim.server.received_audio == 50
@@ -0,0 +1,41 @@
+import numpy as np
+import opuslib
+import pytest
+
+from xiaozhi_client.utils.pcm import FramePool, PcmFrameEncoder, frame_rms
+
+
+def test_frame_rms_matches_numpy():
+    block = np.random.default_rng(0).standard_normal(960).astype(np.float32)
+    assert frame_rms(block) == pytest.approx(float(np.sqrt(np.mean(block ** 2))), rel=1e-6)
+    assert frame_rms(np.zeros(0, dtype=np.float32)) == 0.0
+
+
+def test_frame_pool_reuses_slots_in_order():
+    pool = FramePool(3, 4, channels=2)
+    frames = [pool.write(np.full((4, 2), i, dtype=np.float32)) for i in range(4)]
+
+    assert all(f.shape == (8,) for f in frames)
+    # 第四帧回到第一个槽位，覆盖最早的帧
+    assert frames[3] is frames[0]
+    assert frames[0].tolist() == [3.0] * 8
+    assert frames[1].tolist() == [1.0] * 8
+
+
+def test_load_converts_in_place_with_gain_clip_and_padding():
+    encoder = PcmFrameEncoder(4)
+    view = encoder.load(np.array([0.5, -2.0, 1.0], dtype=np.float32), gain=2.0)
+
+    assert view is encoder.pcm
+    assert view.tolist() == [32767, -32768, 32767, 0]
+    encoder.load(np.full(4, 0.25, dtype=np.float32))
+    assert encoder.pcm.tolist() == [8191] * 4
+
+
+def test_encode_uses_internal_buffers():
+    encoder = PcmFrameEncoder(320)
+    opus = opuslib.Encoder(16000, 1, 'voip')
+    encoder.load(np.zeros(320, dtype=np.float32))
+    packet = encoder.encode(opus)
+
+    assert isinstance(packet, bytes) and packet
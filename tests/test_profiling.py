@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from xiaozhi_client.utils.profiling import SamplingProfiler, Stage, StageProfiler, profile_window
+
+
+def test_summary_uses_recent_window_and_hooks():
+    profiler = StageProfiler(window=100)
+    seen = []
+    profiler.add_hook(lambda stage, ns: seen.append((stage, ns)))
+    for ms in range(1, 201):
+        profiler.record(Stage.ENCODE, ms * 1_000_000)
+
+    row = profiler.summary()["encode"]
+    assert row["count"] == 200
+    assert row["mean_ms"] == pytest.approx(100.5)
+    assert row["max_ms"] == 200
+    # 分位数只看最近100个样本（101~200ms）
+    assert row["p50_ms"] == 151
+    assert row["p99_ms"] == 200
+    assert len(seen) == 200 and seen[0] == (Stage.ENCODE, 1_000_000)
+    assert "decode" not in profiler.summary()
+
+    profiler.reset()
+    assert profiler.summary() == {}
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampling_profiler_sees_other_threads(tmp_path):
+    stop = threading.Event()
+    worker = threading.Thread(target=busy, args=(stop,), daemon=True)
+    worker.start()
+    sampler = SamplingProfiler(interval=0.002)
+    sampler.start()
+    time.sleep(0.2)
+    sampler.stop()
+    stop.set()
+    worker.join()
+
+    assert sampler.samples > 0
+    assert any(name.startswith("busy ") for stack in sampler.stacks for name in stack)
+    path = tmp_path / "stacks.txt"
+    sampler.write_collapsed(str(path))
+    assert path.read_text(encoding="utf-8").strip()
+
+
+def test_profile_window_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        asyncio.run(profile_window(0.0, mode="perf"))
+
+
+def test_client_records_receive_and_decode_stages(sim, make_client):
+    async def main():
+        client = make_client()
+        profiler = client.enable_profiling()
+        await client.connect()
+        await client.ask("你好", timeout=10)
+        await client.close()
+        return profiler.summary()
+
+    summary = sim.run(main())
+    for stage in (Stage.RECEIVE, Stage.DECODE_WAIT, Stage.DECODE):
+        assert summary[stage.value]["count"] > 0
@@ -0,0 +1,72 @@
+import os
+
+from xiaozhi_client import AudioReceiveMode
+from xiaozhi_client.utils.simulation import SimulatedServer
+
+
+def expected_packets(server: SimulatedServer, text: str, frame_seconds: float = 0.06) -> int:
+    return sum(max(1, round(len(s) * server.seconds_per_char / frame_seconds)) for s in server.replies(text))
+
+
+def saved_wavs(tmp_path):
+    directory = tmp_path / "received_audio"
+    return [name for name in os.listdir(directory) if name.endswith(".wav")] if directory.exists() else []
+
+
+def test_encoded_mode_forwards_packets_without_playing(sim, make_client, tmp_path):
+    packets = []
+
+    async def main():
+        client = make_client(audio_receive_mode=AudioReceiveMode.ENCODED)
+
+        async def on_tts_data(packet):
+            packets.append(packet)
+
+        client.on_tts_data = on_tts_data
+        await client.connect()
+        result = await client.ask("你好", timeout=10)
+        await client.close()
+        return result
+
+    result = sim.run(main())
+    assert result.reply
+    assert len(packets) == expected_packets(sim.server, "你好")
+    assert all(isinstance(packet, bytes) for packet in packets)
+    assert sim.audio.frames_played == 0
+    assert saved_wavs(tmp_path) == []
+
+
+def test_discard_mode_keeps_text_turns(sim, make_client, tmp_path):
+    packets = []
+
+    async def main():
+        client = make_client(audio_receive_mode=AudioReceiveMode.DISCARD)
+
+        async def on_tts_data(packet):
+            packets.append(packet)
+
+        client.on_tts_data = on_tts_data
+        await client.connect()
+        result = await client.ask("你好", timeout=10)
+        queued = client.audio_data_queue.qsize()
+        await client.close()
+        return result, queued
+
+    result, queued = sim.run(main())
+    assert result.stt == "你好" and len(result.sentences) == 2
+    assert queued == 0
+    assert packets == []
+    assert sim.audio.frames_played == 0
+    assert saved_wavs(tmp_path) == []
+
+
+def test_play_mode_decodes_and_saves(sim, make_client, tmp_path):
+    async def main():
+        client = make_client()
+        await client.connect()
+        await client.ask("你好", timeout=10)
+        await client.close()
+
+    sim.run(main())
+    assert sim.audio.frames_played > 0
+    assert len(saved_wavs(tmp_path)) == 1
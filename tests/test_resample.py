@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from xiaozhi_client.utils.resample import PolyphaseResampler, FrameAligner
+
+RATE_PAIRS = [(44100, 16000), (48000, 16000), (16000, 48000), (24000, 16000), (16000, 16000)]
+
+
+def _blocks(signal, sizes):
+    offset, i = 0, 0
+    while offset < len(signal):
+        size = sizes[i % len(sizes)]
+        yield signal[offset:offset + size]
+        offset += size
+        i += 1
+
+
+@pytest.mark.parametrize("in_rate,out_rate", RATE_PAIRS)
+def test_output_length_matches_rate_ratio_across_blocks(in_rate, out_rate):
+    resampler = PolyphaseResampler(in_rate, out_rate)
+    total_in = in_rate * 2
+    signal = np.zeros(total_in, dtype=np.float32)
+    total_out = 0
+    for block in _blocks(signal, [441, 512, 1, 997]):
+        expected = resampler.output_length(len(block))
+        out = resampler.process(block)
+        assert len(out) == expected
+        total_out += len(out)
+    # 各块输出长度之和与整段一次处理相同，不会逐块累积误差
+    assert total_out == -(-total_in * out_rate // in_rate)
+
+
+@pytest.mark.parametrize("in_rate,out_rate", RATE_PAIRS)
+def test_blockwise_output_is_continuous(in_rate, out_rate):
+    rng = np.random.default_rng(1)
+    signal = rng.standard_normal(in_rate // 2).astype(np.float32) * 0.1
+    whole = PolyphaseResampler(in_rate, out_rate).process(signal)
+
+    resampler = PolyphaseResampler(in_rate, out_rate)
+    pieces = [resampler.process(block) for block in _blocks(signal, [480, 7, 1024, 333])]
+    np.testing.assert_allclose(np.concatenate(pieces), whole, atol=1e-5)
+
+
+def test_sine_is_preserved_after_group_delay():
+    in_rate, out_rate, freq = 44100, 16000, 1000.0
+    resampler = PolyphaseResampler(in_rate, out_rate)
+    t_in = np.arange(in_rate) / in_rate
+    out = np.concatenate([resampler.process(block) for block in
+                          _blocks(np.sin(2 * np.pi * freq * t_in).astype(np.float32), [441])])
+
+    t_out = np.arange(len(out)) / out_rate - resampler.latency
+    expected = np.sin(2 * np.pi * freq * t_out)
+    settled = slice(int(0.05 * out_rate), None)
+    error = out[settled] - expected[settled]
+    assert np.sqrt(np.mean(error ** 2)) < 0.01
+
+
+def test_stereo_keeps_channels_independent():
+    resampler = PolyphaseResampler(48000, 16000, channels=2)
+    block = np.zeros((960, 2), dtype=np.float32)
+    block[:, 0] = 0.5
+    out = np.concatenate([resampler.process(block) for _ in range(5)])
+    assert out.shape == (1600, 2)
+    assert np.allclose(out[-100:, 0], 0.5, atol=1e-3)
+    assert np.allclose(out[:, 1], 0.0)
+
+
+def test_frame_aligner_rechunks_without_loss():
+    aligner = FrameAligner(960)
+    signal = np.arange(960 * 5 + 100, dtype=np.float32)
+    frames = []
+    for block in _blocks(signal, [319, 321, 320]):
+        frames.extend(aligner.push(block))
+    assert [len(f) for f in frames] == [960] * 5
+    np.testing.assert_array_equal(np.concatenate(frames), signal[:960 * 5])
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import struct
+
+import pytest
+
+from xiaozhi_client.utils.session_log import (
+    SessionFrame, SessionRecorder, SessionReplayServer, read_session, replay_frames, split_segments
+)
+from xiaozhi_client import ClientConfig, XiaozhiClient
+from xiaozhi_client.utils.simulation import Simulation, SimulatedServer
+
+
+def _record_segments(path, segments):
+    """用假时钟录制若干段，每段为[(秒, 数据), ...]"""
+    now = [0.0]
+    for frames in segments:
+        now[0] = 5.0  # 段开始时刻与上一段无关
+        recorder = SessionRecorder(str(path), clock=lambda: now[0])
+        for offset, data in frames:
+            now[0] = 5.0 + offset
+            recorder.record(data, outbound=False)
+        recorder.close()
+
+
+def _delivery_times(frames, speed=1.0):
+    async def main():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        times = []
+
+        async def deliver(data):
+            times.append(round(loop.time() - start, 6))
+
+        await replay_frames(frames, deliver, speed)
+        return times
+
+    return Simulation().run(main())
+
+
+def test_replay_frames_keeps_recorded_spacing():
+    frames = [SessionFrame(t, False, str(i)) for i, t in enumerate([1.0, 1.1, 1.4])]
+    assert _delivery_times(frames) == pytest.approx([0.0, 0.1, 0.4])
+    assert _delivery_times(frames, speed=2.0) == pytest.approx([0.0, 0.05, 0.2])
+    assert _delivery_times(frames, speed=0) == [0.0, 0.0, 0.0]
+
+
+def test_appended_segments_are_replayed_back_to_back(tmp_path):
+    path = tmp_path / "session.xzsl"
+    segment = [(0.0, "a"), (0.1, "b"), (0.2, "c")]
+    _record_segments(path, [segment, segment])
+
+    frames = list(read_session(str(path)))
+    assert [f.segment for f in frames] == [0, 0, 0, 1, 1, 1]
+    assert [len(s) for s in split_segments(frames)] == [3, 3]
+    # 第二段紧接第一段的最后一帧，段内仍保持0.1秒间隔，不会一次性涌出
+    assert _delivery_times(frames) == pytest.approx([0.0, 0.1, 0.2, 0.2, 0.3, 0.4])
+
+
+def test_log_without_segment_record_is_rejected(tmp_path):
+    path = tmp_path / "broken.xzsl"
+    payload = b"{}"
+    path.write_bytes(b"XZSL" + bytes([1]) + struct.pack("<BqI", 0, 0, len(payload)) + payload)
+    with pytest.raises(ValueError):
+        list(read_session(str(path)))
+    path.write_bytes(b"XZSL" + bytes([9]))
+    with pytest.raises(ValueError):
+        list(read_session(str(path)))
+
+
+def test_replay_server_selects_one_segment(tmp_path, sim, make_client):
+    path = tmp_path / "session.xzsl"
+    hello = json.dumps({"type": "hello", "transport": "websocket", "session_id": "s",
+                        "audio_params": {"format": "opus", "sample_rate": 16000,
+                                         "channels": 1, "frame_duration": 60}})
+
+    def turn(text):
+        return [(0.0, hello), (0.5, json.dumps({"type": "stt", "text": text}, ensure_ascii=False))]
+
+    _record_segments(path, [turn("第一段"), turn("第二段")])
+
+    server = SessionReplayServer(str(path), segment=-1)
+    assert server.segments == 2
+    sim.server = server
+    received = []
+
+    async def main():
+        client = make_client()
+
+        async def on_message(message):
+            received.append((message.get("type"), message.get("text")))
+
+        client.on_message = on_message
+        await client.connect()
+        await asyncio.sleep(1.0)
+        await client.close()
+
+    sim.run(main())
+    assert ("stt", "第二段") in received
+    assert ("stt", "第一段") not in received
+
+
+def _hello(session_id="s"):
+    return json.dumps({"type": "hello", "transport": "websocket", "session_id": session_id,
+                       "audio_params": {"format": "opus", "sample_rate": 16000,
+                                        "channels": 1, "frame_duration": 60}})
+
+
+def test_recording_under_simulation_is_deterministic(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def record(name):
+        path = tmp_path / name
+        sim = Simulation(SimulatedServer(), latency=0.02)
+
+        async def main():
+            client = XiaozhiClient(ClientConfig(ws_url="ws://simulated"))
+            client.enable_simulation(sim)
+            client.enable_session_recording(str(path))
+            await client.connect()
+            await client.ask("你好", timeout=10)
+            await client.close()
+            client.enable_session_recording(None)
+
+        sim.run(main())
+        return [(f.timestamp, f.outbound) for f in read_session(str(path))]
+
+    first = record("a.xzsl")
+    # 时间戳取自虚拟时钟，两次录制逐帧相同
+    assert first == record("b.xzsl")
+    assert len(first) > 10
+
+
+def test_offline_replay_survives_handlers_that_send(tmp_path, make_client, sim):
+    path = tmp_path / "session.xzsl"
+    _record_segments(path, [[(0.0, _hello()), (0.2, json.dumps({"type": "stt", "text": "你好"}, ensure_ascii=False))]])
+    received = []
+
+    async def main():
+        client = make_client()
+        # 注册了IoT设备时，hello后会上报设备描述和状态
+        client.iot.add_device("Lamp", "灯")
+
+        async def on_message(message):
+            received.append(message.get("type"))
+
+        client.on_message = on_message
+        await client.replay_session(str(path), speed=0)
+        await asyncio.sleep(0.5)
+        return client.session_id
+
+    session_id = sim.run(main())
+    assert session_id == "s"
+    assert received == ["hello", "stt"]
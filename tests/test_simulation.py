@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+import pytest
+
+from xiaozhi_client.utils.simulation import Simulation, VirtualClock, memory_pair
+
+
+def test_virtual_clock_skips_idle_time():
+    sim = Simulation()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(3600)
+        return loop.time()
+
+    started = time.perf_counter()
+    assert sim.run(main()) == pytest.approx(3600.0)
+    assert time.perf_counter() - started < 5.0
+    assert sim.clock.time() == pytest.approx(sim.clock.epoch + 3600.0)
+
+
+def test_memory_websocket_delivers_in_order_after_latency():
+    sim = Simulation(clock=VirtualClock())
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        client, server = memory_pair(latency=0.05)
+        for i in range(3):
+            await client.send(f"m{i}")
+        received = [(await server.recv(), loop.time()) for _ in range(3)]
+        await client.close()
+        return received
+
+    received = sim.run(main())
+    assert [text for text, _ in received] == ["m0", "m1", "m2"]
+    assert all(at == pytest.approx(0.05) for _, at in received)
+
+
+def test_endpointing_sends_listen_stop_after_max_silence_frames(sim, make_client):
+    frame_seconds = 0.06
+    max_frames = 10
+
+    async def main():
+        client = make_client()
+        client.enable_silence_detection(threshold=0.02, max_frames=max_frames)
+        await client.connect()
+        sim.audio.say(1.2, pause=3.0)
+        await client.start_voice_input()
+        await sim.server.wait_turns(1, timeout=30)
+        await client.stop_voice_input()
+        await client.close()
+
+    sim.run(main())
+    states = [m.get("state") for m in sim.server.received_text if m.get("type") == "listen"]
+    # 开始语音输入和检测到声音时各发一次listen start，语音结束后才发listen stop
+    assert states[0] == "start" and "stop" in states
+    turn = sim.server.turns[0]
+    # 语音结束后连续max_frames个静音帧触发listen stop，再经过一次单向延迟到达服务端
+    endpoint = turn.requested - sim.audio.speech_ends[0]
+    expected = max_frames * frame_seconds + sim.latency
+    assert expected - frame_seconds <= endpoint <= expected + frame_seconds
+    # 语音帧和结束判定前的静音帧都已上行
+    assert turn.audio_frames >= round(1.2 / frame_seconds) + max_frames - 1
+
+
+def test_text_turn_round_trip(sim, make_client):
+    async def main():
+        client = make_client()
+        await client.connect()
+        result = await client.ask("你好", timeout=10)
+        await client.close()
+        return result
+
+    result = sim.run(main())
+    assert result.stt == "你好"
+    assert not result.aborted
+    # 思考时间加一个往返
+    assert result.first_response == pytest.approx(sim.server.think_time + 2 * sim.latency, abs=0.01)
+    assert sim.audio.seconds_played > 0
+    assert sim.audio.underruns == 0
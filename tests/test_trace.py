@@ -0,0 +1,44 @@
+from xiaozhi_client.utils.trace import TraceBuffer, TraceEvent
+
+
+def test_ring_keeps_newest_events_in_order():
+    trace = TraceBuffer(capacity=4)
+    for i in range(6):
+        trace.record(TraceEvent.AUDIO_IN, value=i)
+
+    records = trace.snapshot()
+    assert len(trace) == 4
+    assert [r.value for r in records] == [2, 3, 4, 5]
+    assert all(a.timestamp_ns <= b.timestamp_ns for a, b in zip(records, records[1:]))
+
+
+def test_dump_formats_lazily_and_clear_resets():
+    trace = TraceBuffer(capacity=8)
+    trace.record(TraceEvent.STT, obj={"text": "你好"})
+    trace.record(TraceEvent.ABORT, value=3)
+    lines = []
+    dumped = trace.dump("测试", sink=lines.append)
+
+    assert lines[0].startswith("追踪记录 (2 条): 测试")
+    assert lines[1:] == dumped
+    assert "STT" in dumped[0] and "你好" in dumped[0]
+    assert "ABORT" in dumped[1] and "value=3" in dumped[1]
+    trace.clear()
+    assert len(trace) == 0 and trace.snapshot() == []
+
+
+def test_client_traces_a_turn(sim, make_client):
+    async def main():
+        client = make_client()
+        client.enable_trace()
+        await client.connect()
+        await client.ask("你好", timeout=10)
+        await client.close()
+        return [r.event for r in client._trace.snapshot()], client.dump_trace()
+
+    events, lines = sim.run(main())
+    for event in (TraceEvent.STT, TraceEvent.LLM, TraceEvent.TTS_START, TraceEvent.TTS_SENTENCE,
+                  TraceEvent.AUDIO_IN, TraceEvent.TTS_STOP):
+        assert event in events
+    assert events.index(TraceEvent.TTS_START) < events.index(TraceEvent.TTS_STOP)
+    assert len(lines) == len(events)
@@ -0,0 +1,73 @@
+from xiaozhi_client.utils.tts_cache import TtsCache, normalize_text
+from xiaozhi_client.utils.wav import write_wav
+
+
+def test_normalized_text_shares_entry():
+    assert normalize_text("  Hello，　World！ ") == normalize_text("hello, world")
+    cache = TtsCache()
+    cache.put("你好。", b"\x01\x00" * 10)
+
+    assert cache.get("你好") == b"\x01\x00" * 10
+    assert "你好！" in cache
+    assert cache.get("再见") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_memory_lru_evicts_least_recently_used():
+    cache = TtsCache(max_bytes=300)
+    for text in ("一", "二", "三"):
+        cache.put(text, bytes(100))
+    cache.get("一")
+    cache.put("四", bytes(100))
+
+    assert "二" not in cache
+    assert all(text in cache for text in ("一", "三", "四"))
+    assert cache.evictions == 1
+    # 超过内存容量的单条数据不缓存
+    cache.put("长句", bytes(400))
+    assert "长句" not in cache
+
+
+def test_spilled_entries_are_promoted_back(tmp_path):
+    cache = TtsCache(max_bytes=200, spill_dir=str(tmp_path), max_disk_bytes=200)
+    cache.put("一", b"a" * 100)
+    cache.put("二", b"b" * 100)
+    cache.put("三", b"c" * 100)
+    assert cache.stats()["disk_bytes"] == 100
+
+    assert cache.get("一") == b"a" * 100
+    assert cache.disk_hits == 1
+    # 提升回内存时挤出最旧的"二"落盘
+    assert cache.stats()["memory_bytes"] == 200
+    assert cache.stats()["disk_bytes"] == 100
+    assert len(list(tmp_path.iterdir())) == 1
+
+    cache.clear()
+    assert len(cache) == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_prefill_wav(tmp_path):
+    pcm = bytes(range(200))
+    path = write_wav(str(tmp_path / "prompt.wav"), pcm)
+    cache = TtsCache()
+    cache.prefill_wav("请稍等", path)
+    assert cache.get("请稍等") == pcm
+
+
+def test_repeated_sentence_plays_from_cache(sim, make_client):
+    async def main():
+        client = make_client()
+        client.enable_tts_cache()
+        await client.connect()
+        await client.ask("你好", timeout=10)
+        first = client.tts_cache.hits
+        await client.ask("天气", timeout=10)
+        await client.close()
+        return first, client.tts_cache
+
+    first, cache = sim.run(main())
+    # 两轮都以"还有什么可以帮你的吗？"结尾，第二轮该句命中
+    assert first == 0
+    assert cache.hits == 1
+    assert "还有什么可以帮你的吗" in cache
@@ -0,0 +1,59 @@
+import numpy as np
+import opuslib
+
+from xiaozhi_client import TtsStream, TtsBoundary
+from xiaozhi_client.types import AudioConfig
+from xiaozhi_client.utils.simulation import Simulation
+
+CONFIG = AudioConfig()
+CORRUPT = b"\xff\xff" + bytes(10)  # 声明63帧的code 3包，超出120ms上限
+
+
+def _packet():
+    pcm = np.zeros(CONFIG.frame_size, dtype=np.int16).tobytes()
+    return opuslib.Encoder(CONFIG.sample_rate, CONFIG.channels, "voip").encode(pcm, CONFIG.frame_size)
+
+
+def _collect(stream):
+    async def main():
+        return [chunk async for chunk in stream]
+
+    return Simulation().run(main())
+
+
+def test_pcm_stream_skips_corrupt_packet_and_keeps_iterating():
+    stream = TtsStream(CONFIG, format="pcm")
+    stream.feed_boundary(TtsBoundary("start"))
+    stream.feed_audio(_packet())
+    stream.feed_audio(CORRUPT)
+    stream.feed_audio(_packet())
+    stream.feed_boundary(TtsBoundary("stop"))
+    stream.close()
+
+    chunks = _collect(stream)
+    assert [c.state if isinstance(c, TtsBoundary) else len(c) for c in chunks] == [
+        "start", CONFIG.frame_size, CONFIG.frame_size, "stop"
+    ]
+    assert stream.dropped == 1
+
+
+def test_opus_stream_passes_packets_through_and_abort_drops_pending_audio():
+    stream = TtsStream(CONFIG, format="opus", max_chunks=2)
+    for i in range(3):
+        stream.feed_audio(bytes([i]) * 4)
+    assert stream.dropped == 1  # 缓冲区满时丢弃最旧的包
+    stream.feed_boundary(TtsBoundary("sentence_start", "你好"))
+    stream.feed_audio(b"late")
+    stream.feed_boundary(TtsBoundary("abort"))
+    stream.close()
+
+    chunks = _collect(stream)
+    assert chunks == [TtsBoundary("sentence_start", "你好"), TtsBoundary("abort")]
+
+
+def test_on_close_is_called_once():
+    closed = []
+    stream = TtsStream(CONFIG, format="opus", on_close=closed.append)
+    stream.close()
+    stream.close()
+    assert closed == [stream]
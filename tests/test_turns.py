@@ -0,0 +1,102 @@
+import asyncio
+import contextlib
+
+import pytest
+
+
+def test_concurrent_asks_run_in_order(sim, make_client):
+    async def main():
+        client = make_client()
+        await client.connect()
+        results = await asyncio.gather(client.ask("一", timeout=30), client.ask("二", timeout=30))
+        await client.close()
+        return results
+
+    first, second = sim.run(main())
+    assert (first.stt, second.stt) == ("一", "二")
+    assert first.reply == "你说的是：一。还有什么可以帮你的吗？"
+    assert not first.aborted and not second.aborted
+    turns = sim.server.turns
+    # 第二轮在第一轮结束之后才发出
+    assert turns[1].requested >= turns[0].finished
+    assert first.first_sentence <= first.latency
+
+
+def test_timeout_aborts_and_releases_next_turn(sim, make_client):
+    sim.server.seconds_per_char = 1.0
+
+    async def main():
+        client = make_client()
+        await client.connect()
+        with pytest.raises(asyncio.TimeoutError):
+            await client.ask("很长的回复", timeout=2.0)
+        timed_out = client.last_turn
+        sim.server.seconds_per_char = 0.05
+        result = await client.ask("短", timeout=30)
+        await client.close()
+        return timed_out, result
+
+    timed_out, result = sim.run(main())
+    assert timed_out.aborted
+    assert sim.server.turns[0].aborted
+    assert any(m.get("type") == "abort" for m in sim.server.received_text)
+    assert result.stt == "短" and not result.aborted
+
+
+def test_ask_stream_yields_turn_messages(sim, make_client):
+    async def main():
+        client = make_client()
+        await client.connect()
+        messages = [msg async for msg in client.ask_stream("你好", timeout=30)]
+        await client.close()
+        return messages, client.last_turn
+
+    messages, result = sim.run(main())
+    kinds = [(m["type"], m.get("state")) for m in messages]
+    assert kinds[0] == ("stt", None)
+    assert kinds[-1] == ("tts", "stop")
+    assert kinds.count(("tts", "sentence_start")) == 2
+    assert result.messages == messages
+
+
+def test_queued_ask_times_out_while_waiting_for_turn(sim, make_client):
+    sim.server.seconds_per_char = 1.0
+
+    async def main():
+        client = make_client()
+        await client.connect()
+        loop = asyncio.get_running_loop()
+        first = asyncio.ensure_future(client.ask("很长的回复", timeout=60))
+        await asyncio.sleep(0)
+        started = loop.time()
+        with pytest.raises(asyncio.TimeoutError):
+            await client.ask("排队", timeout=1.0)
+        waited = loop.time() - started
+        await first
+        await client.close()
+        return waited
+
+    waited = sim.run(main())
+    # 排队等待计入超时，超时的轮次从未发出
+    assert waited == pytest.approx(1.0)
+    assert [turn.stt for turn in sim.server.turns] == ["很长的回复"]
+
+
+def test_leaving_stream_early_aborts_turn(sim, make_client):
+    async def main():
+        client = make_client()
+        await client.connect()
+        async with contextlib.aclosing(client.ask_stream("你好", timeout=30)) as stream:
+            async for msg in stream:
+                if msg.get("state") == "sentence_start":
+                    break
+        # aclose()后立即中止，不依赖垃圾回收
+        aborted = client.last_turn.aborted
+        result = await client.ask("再来", timeout=30)
+        await client.close()
+        return aborted, result
+
+    aborted, result = sim.run(main())
+    assert aborted
+    assert sim.server.turns[0].aborted
+    assert result.stt == "再来" and not result.aborted
@@ -0,0 +1,122 @@
+import json
+import math
+import struct
+
+import numpy as np
+import pytest
+
+from xiaozhi_client.utils.vad_sweep import (
+    auto_labels, evaluate_file, load_labels, main, simulate_record, simulate_voice, summarize, sweep,
+)
+from xiaozhi_client.utils.wav import WAVE_FORMAT_IEEE_FLOAT, write_wav
+
+RATE = 16000
+FRAME = 0.06
+
+
+def speech_wav(path, segments, seconds=6.0):
+    """在给定区间内放音调、其余为弱噪声的录音"""
+    rng = np.random.default_rng(0)
+    samples = rng.standard_normal(int(RATE * seconds)) * 0.001
+    for start, end in segments:
+        t = np.arange(int(start * RATE), int(end * RATE))
+        samples[t] += 0.3 * np.sin(2 * np.pi * 300 * t / RATE)
+    write_wav(str(path), (samples * 32767).astype(np.int16).tobytes(), RATE)
+    return str(path)
+
+
+def test_simulate_voice_sends_hangover_then_stops():
+    rms = np.array([0, 0, 1, 1, 0, 0, 0, 0, 1, 0, 0, 0], dtype=float)
+    normal, quiet, stops = simulate_voice(rms, threshold=0.5, max_frames=2)
+    assert np.flatnonzero(normal).tolist() == [2, 3, 8]
+    # 开始说话之前的静音不发送；每段之后以低增益发送max_frames帧
+    assert np.flatnonzero(quiet).tolist() == [4, 5, 9, 10]
+    assert stops.tolist() == [5, 10]
+
+
+def test_simulate_record_ends_at_first_long_silence():
+    rms = np.array([1, 0, 1, 1, 0, 0, 0, 1, 1], dtype=float)
+    sent, quiet, stops = simulate_record(rms, sound_threshold=0.5, silence_frames=3)
+    assert stops.tolist() == [6]
+    assert np.flatnonzero(sent).tolist() == [0, 2, 3]
+    assert not quiet.any()
+
+
+def test_labels_from_txt_and_json(tmp_path):
+    (tmp_path / "a.txt").write_text("2.0\t3.0\tspeech\n0.5 1.0\n", encoding="utf-8")
+    (tmp_path / "b.json").write_text(json.dumps({"segments": [[1, 2]]}), encoding="utf-8")
+    assert load_labels(str(tmp_path / "a.wav")) == [(0.5, 1.0), (2.0, 3.0)]
+    assert load_labels(str(tmp_path / "b.wav")) == [(1.0, 2.0)]
+    assert load_labels(str(tmp_path / "c.wav")) is None
+
+
+def test_auto_labels_merge_short_gaps():
+    rms = np.full(50, 0.001)
+    rms[10:20] = 0.2
+    rms[22:30] = 0.2
+    rms[40:45] = 0.2
+    segments = auto_labels(rms, FRAME, hangover=0.3)
+    assert segments == [(pytest.approx(0.6), pytest.approx(1.8)), (pytest.approx(2.4), pytest.approx(2.7))]
+
+
+def test_evaluate_file_reports_endpoint_latency(tmp_path):
+    segments = [(1.02, 2.04), (4.02, 5.04)]
+    path = speech_wav(tmp_path / "speech.wav", segments)
+    (tmp_path / "speech.json").write_text(json.dumps(segments), encoding="utf-8")
+
+    results = evaluate_file(path, "voice", [0.01], [10, 100])
+    short = results[(0.01, 10)]
+    assert short.clipped_frames == 0 and short.noise_frames == 0
+    assert short.latencies == [pytest.approx(10 * FRAME, abs=FRAME)] * 2
+    # 挂起时间长于语音间隔：第一段与第二段合并，第二段到文件结束也没有发送stop
+    long = results[(0.01, 100)]
+    assert long.merged_endpoints == 2 and long.latencies == []
+    report = summarize(short, 60, 24000)
+    assert report["clipped_speech_pct"] == 0
+    assert report["endpoint_mean_ms"] == pytest.approx(600, abs=60)
+
+
+def test_sweep_skips_unlabeled_files_and_writes_report(tmp_path):
+    labeled = speech_wav(tmp_path / "labeled.wav", [(1.0, 2.0)], seconds=4.0)
+    (tmp_path / "labeled.txt").write_text("1.0 2.0\n", encoding="utf-8")
+    unlabeled = speech_wav(tmp_path / "unlabeled.wav", [(1.0, 2.0)], seconds=4.0)
+
+    totals, skipped = sweep([labeled, unlabeled], "voice", [0.01, 0.02], [10], jobs=1)
+    assert skipped == [unlabeled]
+    assert set(totals) == {(0.01, 10), (0.02, 10)}
+    assert totals[(0.01, 10)].frames == int(4.0 / FRAME)
+
+    output = tmp_path / "sweep.json"
+    assert main([labeled, unlabeled, "--auto-label", "--thresholds", "0.01", "--frames", "10",
+                 "--jobs", "1", "--output", str(output)]) == 0
+    assert output.exists()
+
+
+def test_condition_on_float_wav_does_not_touch_file(tmp_path):
+    samples = np.sin(2 * np.pi * 300 * np.arange(RATE * 2) / RATE).astype(np.float32) * 0.3
+    fmt = struct.pack('<HHIIHH', WAVE_FORMAT_IEEE_FLOAT, 1, RATE, RATE * 4, 4, 32)
+    body = (b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+            + b'data' + struct.pack('<I', samples.nbytes) + samples.tobytes())
+    path = tmp_path / "float.wav"
+    path.write_bytes(b'RIFF' + struct.pack('<I', len(body)) + body)
+    original = path.read_bytes()
+
+    results = evaluate_file(str(path), "voice", [0.01], [10], condition=True, auto_label=True)
+    assert results[(0.01, 10)].frames == int(2.0 / FRAME)
+    assert path.read_bytes() == original
+
+
+def test_sort_puts_missing_endpoint_latency_last(tmp_path, capsys):
+    segments = [(1.02, 2.04), (4.02, 5.04)]
+    path = speech_wav(tmp_path / "speech.wav", segments)
+    (tmp_path / "speech.json").write_text(json.dumps(segments), encoding="utf-8")
+    output = tmp_path / "sweep.json"
+    assert main([path, "--thresholds", "0.01", "--frames", "100,10,200", "--sort", "endpoint_mean_ms",
+                 "--jobs", "1", "--output", str(output)]) == 0
+    rows = json.loads(output.read_text(encoding="utf-8"))["results"]
+    assert rows[0]["frames"] == 10
+    assert all(math.isnan(row["endpoint_mean_ms"]) for row in rows[1:])
+
+    with pytest.raises(SystemExit):
+        main([path, "--sort", "no_such_metric"])
+    assert "invalid choice" in capsys.readouterr().err
@@ -0,0 +1,73 @@
+import struct
+import wave
+
+import numpy as np
+import pytest
+
+from xiaozhi_client.utils.wav import (
+    WAVE_FORMAT_IEEE_FLOAT, WavReader, iter_wav_chunks, pcm_to_float32, read_wav_info, save_wav,
+    unique_wav_path, write_wav,
+)
+
+
+def test_write_wav_round_trips_through_stdlib_and_reader(tmp_path):
+    pcm = (np.arange(2400, dtype=np.int16) * 7).reshape(-1, 2)
+    path = write_wav(str(tmp_path / "stereo.wav"), pcm.tobytes(), sample_rate=24000, channels=2)
+
+    with wave.open(path, 'rb') as w:
+        assert (w.getframerate(), w.getnchannels(), w.getsampwidth()) == (24000, 2, 2)
+        assert w.getnframes() == 1200
+    with WavReader(path) as reader:
+        assert reader.info.duration == pytest.approx(0.05)
+        assert np.array_equal(reader.as_array(), pcm)
+        assert bytes(reader.as_memoryview()) == pcm.tobytes()
+
+
+def test_reader_skips_extra_chunks_and_reads_float(tmp_path):
+    samples = np.linspace(-1, 1, 100, dtype=np.float32)
+    fmt = struct.pack('<HHIIHH', WAVE_FORMAT_IEEE_FLOAT, 1, 16000, 64000, 4, 32)
+    body = (b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+            + b'LIST' + struct.pack('<I', 3) + b'abc\x00'  # 奇数长度的块带一个填充字节
+            + b'data' + struct.pack('<I', samples.nbytes) + samples.tobytes())
+    path = tmp_path / "float.wav"
+    path.write_bytes(b'RIFF' + struct.pack('<I', len(body)) + body)
+
+    info = read_wav_info(str(path))
+    assert info.dtype == np.dtype('<f4')
+    with WavReader(str(path)) as reader:
+        assert np.array_equal(reader.as_array()[:, 0], samples)
+
+
+
+@pytest.mark.parametrize("channels, block_align, sample_rate", [(0, 2, 16000), (1, 0, 16000), (2, 1, 16000), (1, 2, 0)])
+def test_zero_fmt_fields_are_rejected(tmp_path, channels, block_align, sample_rate):
+    fmt = struct.pack('<HHIIHH', 1, channels, sample_rate, 32000, block_align, 16)
+    body = b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt + b'data' + struct.pack('<I', 4) + bytes(4)
+    path = tmp_path / "broken.wav"
+    path.write_bytes(b'RIFF' + struct.pack('<I', len(body)) + body)
+
+    with pytest.raises(ValueError):
+        read_wav_info(str(path))
+    with pytest.raises(ValueError):
+        WavReader(str(path))
+
+
+def test_iter_chunks_pads_last_chunk(tmp_path):
+    pcm = np.arange(1000, dtype=np.int16)
+    path = write_wav(str(tmp_path / "mono.wav"), pcm.tobytes())
+
+    chunks = list(iter_wav_chunks(path, 320, pad=True))
+    assert [len(c) for c in chunks] == [320] * 4
+    assert np.array_equal(np.concatenate(chunks)[:1000, 0], pcm)
+    assert not chunks[-1][40:].any()
+
+
+def test_pcm_to_float32_scales_by_width():
+    assert pcm_to_float32(np.array([-32768, 16384], dtype=np.int16)).tolist() == [-1.0, 0.5]
+    assert pcm_to_float32(np.array([0, 128], dtype=np.uint8)).tolist() == [-1.0, 0.0]
+
+
+def test_saved_files_never_overwrite(tmp_path):
+    paths = {save_wav(str(tmp_path), bytes(320)) for _ in range(20)}
+    assert len(paths) == 20
+    assert unique_wav_path(str(tmp_path)) not in paths
@@ -1,9 +1,14 @@
 from .client import XiaozhiClient
+from .iot import IoTRegistry, IoTStateSync, IoTError
+from .turns import TurnResult
+from .archive import ConversationArchive, ArchivedTurn
+from .tts_stream import TtsStream, TtsBoundary
 from .types import (
     AudioConfig,
     ClientConfig,
     ListenMode,
     ListenState,
+    AudioReceiveMode,
     MessageType,
     IoTProperty,
     IoTMethod,
@@ -14,10 +19,19 @@ from .types import (
 __version__ = '0.1.3'
 __all__ = [
     'XiaozhiClient',
+    'IoTRegistry',
+    'IoTStateSync',
+    'IoTError',
+    'TurnResult',
+    'ConversationArchive',
+    'ArchivedTurn',
+    'TtsStream',
+    'TtsBoundary',
     'AudioConfig',
     'ClientConfig',
     'ListenMode',
     'ListenState',
+    'AudioReceiveMode',
     'MessageType',
     'IoTProperty',
     'IoTMethod',
@@ -0,0 +1,437 @@
+import os
+import time
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+# write_wav写出的标准44字节文件头之后即为PCM数据
+WAV_DATA_OFFSET = 44
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    device_id TEXT,
+    session_id TEXT,
+    stt TEXT,
+    llm TEXT,
+    reply TEXT,
+    first_response REAL,
+    first_sentence REAL,
+    duration REAL,
+    aborted INTEGER NOT NULL DEFAULT 0,
+    audio_bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS turns_started ON turns(started);
+CREATE INDEX IF NOT EXISTS turns_device ON turns(device_id, started);
+CREATE INDEX IF NOT EXISTS turns_session ON turns(session_id, started);
+CREATE TABLE IF NOT EXISTS audio (
+    id INTEGER PRIMARY KEY,
+    turn_id INTEGER NOT NULL REFERENCES turns(id) ON DELETE CASCADE,
+    direction TEXT NOT NULL,
+    path TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    data_offset INTEGER NOT NULL,
+    sample_rate INTEGER,
+    channels INTEGER
+);
+CREATE INDEX IF NOT EXISTS audio_turn ON audio(turn_id);
+CREATE INDEX IF NOT EXISTS audio_path ON audio(path);
+CREATE TABLE IF NOT EXISTS sentences (
+    turn_id INTEGER NOT NULL REFERENCES turns(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    pcm_offset INTEGER,
+    PRIMARY KEY (turn_id, seq)
+) WITHOUT ROWID;
+"""
+
+# trigram分词支持中文等无空格文本的子串检索（SQLite 3.34+）；不可用时退回LIKE扫描
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5(
+    stt, reply, content='turns', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS turns_fts_insert AFTER INSERT ON turns BEGIN
+    INSERT INTO turns_fts(rowid, stt, reply) VALUES (new.id, new.stt, new.reply);
+END;
+CREATE TRIGGER IF NOT EXISTS turns_fts_delete AFTER DELETE ON turns BEGIN
+    INSERT INTO turns_fts(turns_fts, rowid, stt, reply) VALUES ('delete', old.id, old.stt, old.reply);
+END;
+"""
+
+
+@dataclass
+class ArchivedAudio:
+    """一轮对话关联的音频文件"""
+    direction: str  # "downlink"为TTS，"uplink"为本地录音
+    path: str
+    bytes: int  # 文件大小
+    data_offset: int  # PCM数据在文件中的起始字节
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+
+
+@dataclass
+class ArchivedSentence:
+    """TTS句子及其在下行音频PCM数据中的字节偏移，未解码播放时偏移为None"""
+    text: str
+    pcm_offset: Optional[int] = None
+
+
+@dataclass
+class ArchivedTurn:
+    """归档的一轮对话，耗时均为相对本轮开始的秒数"""
+    id: int
+    started: float  # 本轮开始的Unix时间
+    device_id: Optional[str] = None
+    session_id: Optional[str] = None
+    stt: Optional[str] = None
+    llm: Optional[str] = None
+    reply: Optional[str] = None
+    first_response: Optional[float] = None
+    first_sentence: Optional[float] = None
+    duration: Optional[float] = None
+    aborted: bool = False
+    audio: List[ArchivedAudio] = field(default_factory=list)
+    sentences: List[ArchivedSentence] = field(default_factory=list)
+
+    def audio_for(self, direction: str = "downlink") -> Optional[ArchivedAudio]:
+        for audio in self.audio:
+            if audio.direction == direction:
+                return audio
+        return None
+
+
+class PendingTurn:
+    """进行中的一轮对话，由客户端按收到的stt/llm/tts消息逐步填充，结束后写入归档
+
+    句子文本按消息顺序记录；PCM偏移由音频任务在句子边界处按同样的顺序记录，
+    写入时按序号配对，两边的处理快慢不同也不会错位。
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter,
+                 wall_clock: Callable[[], float] = time.time):
+        self.started = wall_clock()
+        self._clock = clock
+        self._started = clock()
+        self.stt: Optional[str] = None
+        self.llm: List[str] = []
+        self.sentences: List[str] = []
+        self.offsets: List[int] = []
+        self.audio: List[ArchivedAudio] = []
+        self.first_response: Optional[float] = None
+        self.first_sentence: Optional[float] = None
+        self.tts_started = False
+
+    def elapsed(self) -> float:
+        return self._clock() - self._started
+
+    def note_response(self):
+        if self.first_response is None:
+            self.first_response = self.elapsed()
+
+    def add_sentence(self, text: str):
+        self.note_response()
+        if self.first_sentence is None:
+            self.first_sentence = self.elapsed()
+        self.sentences.append(text)
+
+    def add_audio(self, direction: str, path: str, sample_rate: Optional[int] = None,
+                  channels: Optional[int] = None, data_offset: int = WAV_DATA_OFFSET):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        self.audio.append(ArchivedAudio(direction, path, size, data_offset, sample_rate, channels))
+
+
+class ConversationArchive:
+    """以嵌入式SQLite索引归档对话轮次
+
+    每轮保存STT、LLM和TTS文本、耗时、关联的音频文件，以及每个TTS句子在音频中的字节偏移，
+    可按时间范围、设备、会话或文本快速查询，不必扫描音频目录。
+
+    设置retention_days或max_bytes后，写入时按保留期和总音频字节数淘汰最旧的轮次，
+    同时删除不再被任何轮次引用的音频文件。每轮的音频字节数记在turns表中，淘汰时沿started索引
+    按批取最旧的轮次，不扫描全表。
+
+    submit_turn在独立的写入线程中写入和淘汰，不阻塞事件循环；查询可在任意线程中进行，
+    与写入经锁串行。
+    """
+
+    _EVICT_BATCH = 64
+
+    def __init__(self, path: str, retention_days: Optional[float] = None,
+                 max_bytes: Optional[int] = None, check_interval: float = 60.0):
+        self.path = path
+        self.retention_days = retention_days
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self.evicted_turns = 0
+        self.evicted_files = 0
+        self._last_retention = 0.0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="xiaozhi-archive")
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(_SCHEMA)
+        try:
+            self._db.executescript(_FTS_SCHEMA)
+            self.full_text = True
+        except sqlite3.OperationalError as e:
+            logger.debug(f"SQLite不支持trigram全文索引，文本查询使用LIKE: {e}")
+            self.full_text = False
+        self._db.commit()
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM audio").fetchone()[0]
+
+    @property
+    def total_bytes(self) -> int:
+        """归档中全部音频文件的字节数"""
+        return self._total_bytes
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+
+    def submit_turn(self, turn: PendingTurn, device_id: Optional[str] = None,
+                    session_id: Optional[str] = None, aborted: bool = False) -> Future:
+        """在写入线程中写入一轮对话（含淘汰），立即返回，Future的结果为轮次ID"""
+        # 耗时在提交时确定，不计入排队等待写入的时间
+        duration = turn.elapsed()
+        return self._writer.submit(self.add_turn, turn, device_id, session_id, aborted, duration)
+
+    def flush(self):
+        """等待已提交的写入全部完成"""
+        self._writer.submit(lambda: None).result()
+
+    def add_turn(self, turn: PendingTurn, device_id: Optional[str] = None,
+                 session_id: Optional[str] = None, aborted: bool = False,
+                 duration: Optional[float] = None) -> int:
+        """写入一轮对话并按需淘汰，返回其ID；在调用线程中同步执行"""
+        with self._lock:
+            turn_id = self._insert(turn, device_id, session_id, aborted,
+                                   turn.elapsed() if duration is None else duration)
+        self._maybe_enforce()
+        return turn_id
+
+    def _insert(self, turn: PendingTurn, device_id: Optional[str], session_id: Optional[str],
+                aborted: bool, duration: float) -> int:
+        downlink = next((a for a in turn.audio if a.direction == "downlink"), None)
+        pcm_size = downlink.bytes - downlink.data_offset if downlink is not None else 0
+        audio_bytes = sum(a.bytes for a in turn.audio)
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT INTO turns (started, device_id, session_id, stt, llm, reply, first_response,"
+                " first_sentence, duration, aborted, audio_bytes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (turn.started, device_id, session_id, turn.stt, "".join(turn.llm) or None,
+                 "".join(turn.sentences) or None, turn.first_response, turn.first_sentence,
+                 duration, int(aborted), audio_bytes)
+            )
+            turn_id = cursor.lastrowid
+            self._db.executemany(
+                "INSERT INTO audio (turn_id, direction, path, bytes, data_offset, sample_rate, channels)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(turn_id, a.direction, a.path, a.bytes, a.data_offset, a.sample_rate, a.channels)
+                 for a in turn.audio]
+            )
+            rows = []
+            for seq, text in enumerate(turn.sentences):
+                offset = turn.offsets[seq] if seq < len(turn.offsets) else None
+                # 偏移超出已保存的音频（句子在保存之后才解码）时不记录
+                if offset is not None and offset > pcm_size:
+                    offset = None
+                rows.append((turn_id, seq, text, offset))
+            self._db.executemany(
+                "INSERT INTO sentences (turn_id, seq, text, pcm_offset) VALUES (?, ?, ?, ?)", rows
+            )
+        self._total_bytes += audio_bytes
+        return turn_id
+
+    def _maybe_enforce(self):
+        if self.retention_days is None and self.max_bytes is None:
+            return
+        over_quota = self.max_bytes is not None and self._total_bytes > self.max_bytes
+        now = time.monotonic()
+        if over_quota or now - self._last_retention >= self.check_interval:
+            self._last_retention = now
+            self.enforce()
+
+    def enforce(self, now: Optional[float] = None) -> int:
+        """按保留期和容量上限淘汰最旧的轮次，返回淘汰的轮次数"""
+        now = time.time() if now is None else now
+        evicted = 0
+        if self.retention_days is not None:
+            cutoff = now - self.retention_days * 86400
+            with self._lock:
+                expired = [r[0] for r in self._db.execute("SELECT id FROM turns WHERE started < ?", (cutoff,))]
+            if expired:
+                self.delete(expired)
+                evicted += len(expired)
+        while self.max_bytes is not None and self._total_bytes > self.max_bytes:
+            excess = self._total_bytes - self.max_bytes
+            # 沿started索引取最旧的一批，累计到刚好释放足够空间为止
+            doomed = []
+            freed = 0
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, audio_bytes FROM turns ORDER BY started, id LIMIT ?", (self._EVICT_BATCH,)
+                ).fetchall()
+            for turn_id, size in rows:
+                doomed.append(turn_id)
+                freed += size
+                if freed >= excess:
+                    break
+            if not doomed:
+                break
+            self.delete(doomed)
+            evicted += len(doomed)
+        return evicted
+
+    def delete(self, turn_ids: Iterable[int]):
+        """删除指定轮次及其不再被引用的音频文件"""
+        turn_ids = list(turn_ids)
+        paths = set()
+        freed = 0
+        with self._lock:
+            with self._db:
+                for chunk in _chunks(turn_ids):
+                    marks = ",".join("?" * len(chunk))
+                    for path, size in self._db.execute(
+                            f"SELECT path, bytes FROM audio WHERE turn_id IN ({marks})", chunk):
+                        paths.add(path)
+                        freed += size
+                    self._db.execute(f"DELETE FROM turns WHERE id IN ({marks})", chunk)
+            self._total_bytes -= freed
+            self.evicted_turns += len(turn_ids)
+            orphans = [path for path in paths if not self._db.execute(
+                "SELECT 1 FROM audio WHERE path = ? LIMIT 1", (path,)).fetchone()]
+        # 删除文件不占用锁，查询不必等待磁盘操作
+        for path in orphans:
+            try:
+                os.remove(path)
+                self.evicted_files += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除归档音频失败: {path}: {e}")
+        if turn_ids:
+            logger.debug(f"归档淘汰 {len(turn_ids)} 轮对话，{len(paths)} 个音频文件")
+
+    def search(self, text: Optional[str] = None, since: Optional[float] = None,
+               until: Optional[float] = None, device_id: Optional[str] = None,
+               session_id: Optional[str] = None, limit: int = 100,
+               newest_first: bool = True) -> List[ArchivedTurn]:
+        """按条件查询轮次，条件之间为“且”
+
+        Args:
+            text: 在STT和回复文本中查找的子串
+            since: 开始时间下限（Unix时间，含）
+            until: 开始时间上限（Unix时间，不含）
+            device_id: 设备ID
+            session_id: 会话ID
+            limit: 最多返回的轮次数
+            newest_first: 是否按时间倒序返回
+        """
+        where, params = [], []
+        if since is not None:
+            where.append("started >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("started < ?")
+            params.append(until)
+        if device_id is not None:
+            where.append("device_id = ?")
+            params.append(device_id)
+        if session_id is not None:
+            where.append("session_id = ?")
+            params.append(session_id)
+        if text:
+            # trigram索引至少需要三个字符，更短的查询只能扫描
+            if self.full_text and len(text) >= 3:
+                where.append("id IN (SELECT rowid FROM turns_fts WHERE turns_fts MATCH ?)")
+                params.append('"' + text.replace('"', '""') + '"')
+            else:
+                pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                where.append("(stt LIKE ? ESCAPE '\\' OR reply LIKE ? ESCAPE '\\')")
+                params.extend((pattern, pattern))
+        sql = "SELECT * FROM turns"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY started {'DESC' if newest_first else 'ASC'}, id LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return self._load(self._db.execute(sql, params).fetchall())
+
+    def get(self, turn_id: int) -> Optional[ArchivedTurn]:
+        with self._lock:
+            turns = self._load(self._db.execute("SELECT * FROM turns WHERE id = ?", (turn_id,)).fetchall())
+        return turns[0] if turns else None
+
+    def find_audio(self, path: str) -> Optional[ArchivedTurn]:
+        """查找音频文件所属的轮次"""
+        with self._lock:
+            row = self._db.execute("SELECT turn_id FROM audio WHERE path = ? LIMIT 1", (path,)).fetchone()
+        return self.get(row[0]) if row else None
+
+    def sentence_pcm(self, turn: ArchivedTurn, index: int) -> Optional[bytes]:
+        """按记录的偏移从下行音频文件中读出第index句的PCM，没有偏移或文件时返回None"""
+        audio = turn.audio_for("downlink")
+        if audio is None or index >= len(turn.sentences):
+            return None
+        start = turn.sentences[index].pcm_offset
+        if start is None:
+            return None
+        end = audio.bytes - audio.data_offset
+        for sentence in turn.sentences[index + 1:]:
+            if sentence.pcm_offset is not None:
+                end = sentence.pcm_offset
+                break
+        try:
+            with open(audio.path, 'rb') as f:
+                f.seek(audio.data_offset + start)
+                return f.read(end - start)
+        except OSError:
+            return None
+
+    def _load(self, rows: List[tuple]) -> List[ArchivedTurn]:
+        """把turns行组装为ArchivedTurn，并批量取回音频和句子"""
+        turns = [
+            ArchivedTurn(id=r[0], started=r[1], device_id=r[2], session_id=r[3], stt=r[4], llm=r[5],
+                         reply=r[6], first_response=r[7], first_sentence=r[8], duration=r[9],
+                         aborted=bool(r[10]))
+            for r in rows
+        ]
+        by_id: Dict[int, ArchivedTurn] = {t.id: t for t in turns}
+        for chunk in _chunks(list(by_id)):
+            marks = ",".join("?" * len(chunk))
+            for turn_id, direction, path, size, offset, rate, channels in self._db.execute(
+                    "SELECT turn_id, direction, path, bytes, data_offset, sample_rate, channels"
+                    f" FROM audio WHERE turn_id IN ({marks}) ORDER BY id", chunk):
+                by_id[turn_id].audio.append(ArchivedAudio(direction, path, size, offset, rate, channels))
+            for turn_id, text, offset in self._db.execute(
+                    f"SELECT turn_id, text, pcm_offset FROM sentences WHERE turn_id IN ({marks})"
+                    " ORDER BY turn_id, seq", chunk):
+                by_id[turn_id].sentences.append(ArchivedSentence(text, offset))
+        return turns
+
+    def close(self):
+        """等待已提交的写入完成后关闭数据库"""
+        self._writer.shutdown(wait=True)
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def _chunks(items: List[int], size: int = 500) -> Iterable[Tuple[int, ...]]:
+    """SQLite单条语句的参数个数有限，IN查询分批进行"""
+    for i in range(0, len(items), size):
+        yield tuple(items[i:i + size])
@@ -5,35 +5,60 @@ import numpy as np
 import websockets
 import opuslib
 from loguru import logger
-from typing import Optional, Callable, Any, List
-from .types import AudioConfig, ClientConfig, ListenMode, MessageType, ListenState
+from typing import Optional, Callable, Any, List, AsyncIterator
+from .types import AudioConfig, ClientConfig, ListenMode, MessageType, ListenState, AudioReceiveMode
+from .types import OPUS_SAMPLE_RATES, OPUS_FRAME_DURATIONS
+from .iot import IoTRegistry, IoTStateSync, IoTError
+from .turns import Turn, TurnResult, TURN_MESSAGE_TYPES
+from .tts_stream import TtsStream, TtsBoundary
+from .archive import ConversationArchive, PendingTurn
 import os
-import datetime
 import threading
+from dataclasses import replace
 from queue import Queue, Empty, Full
 import sounddevice as sd
-from xiaozhi_client.utils.wav import save_wav
+from xiaozhi_client.utils.wav import save_wav, write_wav, unique_wav_path, WavReader, pcm_to_float32
+from xiaozhi_client.utils.resample import PolyphaseResampler, FrameAligner
+from xiaozhi_client.utils.pcm import PcmFrameEncoder, frame_rms
+from xiaozhi_client.utils.aec import EchoCanceller, EchoReference, BargeInDetector
+from xiaozhi_client.utils.tts_cache import TtsCache
+from xiaozhi_client.utils.session_log import SessionRecorder, read_session, split_segments, replay_frames
+from xiaozhi_client.utils.trace import TraceBuffer, TraceEvent
+from xiaozhi_client.utils.profiling import Stage, StageProfiler, profile_window
+from xiaozhi_client.utils.pacer import FramePacer
+from xiaozhi_client.utils.adapt import EncoderSettings, LinkAdapter, AdaptationPolicy
+from xiaozhi_client.utils.outbound import OutboundScheduler, SendPriority
+from xiaozhi_client.utils.audio_worker import AudioWorker
+from xiaozhi_client.utils.conditioning import InputConditioner
+from xiaozhi_client.utils.capture import CaptureEngine, LoopChannel, LevelMeter
+from xiaozhi_client.utils.simulation import Simulation
 import time  # 确保引入time模块
-import random  # 确保引入random模块
 
 class XiaozhiClient:
     def __init__(self, config: ClientConfig, audio_config: Optional[AudioConfig] = None):
         self.config = config
-        self.audio_config = audio_config or AudioConfig()
+        self.audio_config = audio_config or AudioConfig()  # 上行（麦克风）音频参数
+        # 下行（TTS）音频参数，服务端hello下发audio_params后按其重新配置解码、播放和WAV保存
+        self.downlink_config = replace(self.audio_config)
         self.device_id = self._get_device_id()
         self.client_id = str(uuid.uuid4())
+        self.session_id: Optional[str] = None  # 服务端hello下发的会话ID
+        self.iot = IoTRegistry()  # IoT设备注册表，hello之后自动上报
+        self.iot_state = IoTStateSync(self.iot, self.send_text, lambda: self.session_id)  # IoT增量状态上报
         self.websocket: Optional[websockets.WebSocketClientProtocol] = None
         self.encoder = opuslib.Encoder(
             self.audio_config.sample_rate,
             self.audio_config.channels,
             'voip'
         )
+        # 复用的PCM转换/编码缓冲区，避免每帧分配
+        self._frame_encoder = PcmFrameEncoder(self.audio_config.frame_size, self.audio_config.channels)
         self.decoder = None
         self._init_decoder()
         
         # 回调函数
         self.on_tts_start: Optional[Callable] = None
-        self.on_tts_data: Optional[Callable] = None #暂不对外开放
+        self.on_tts_data: Optional[Callable] = None  # AudioReceiveMode.ENCODED时收到的Opus包
         self.on_tts_end: Optional[Callable] = None
         self.on_tts_message: Optional[Callable] = None
         self.on_iot_message: Optional[Callable] = None
@@ -45,6 +70,7 @@ class XiaozhiClient:
         self.on_message: Optional[Callable] = None
         self.on_connection_lost: Optional[Callable[[str], Any]] = None  # 添加连接断开回调
         self.on_connection_error: Optional[Callable[[Exception], Any]] = None  # 添加连接错误回调
+        self.on_barge_in: Optional[Callable] = None  # 播放期间检测到用户插话
 
         # 音频处理状态
         self.pcm_buffer = bytearray()  # 改为使用 bytearray
@@ -58,6 +84,27 @@ class XiaozhiClient:
         os.makedirs(self.audio_dir, exist_ok=True)
         self.stream = None
         self._audio_task = None
+        self._audio_wakeup = asyncio.Event()  # audio_queue有新数据或播放任务需要退出
+        self._worker_tasks: List[asyncio.Task] = []
+        self._session_recorder: Optional[SessionRecorder] = None  # 会话录制
+        self._offline_replay = False  # 未连接时回放会话，处理函数发出的消息直接丢弃
+        self._outbound = OutboundScheduler(self._wire_send)  # 控制消息优先于音频帧发送
+
+        # 追踪与日志
+        self._trace: Optional[TraceBuffer] = None
+        self._trace_dump_on_error = True
+        self._verbose_logging = True  # 是否在消息处理热路径上输出info日志
+        self._audio_send_count = 0
+        self._profiler: Optional[StageProfiler] = None  # 各阶段耗时统计
+        self._pacer: Optional[FramePacer] = None  # 非实时输入的发送节拍器
+        self._link_adapter: Optional[LinkAdapter] = None  # 按链路状况调整上行编码参数
+        self._adapt_task: Optional[asyncio.Task] = None
+        self._audio_worker: Optional[AudioWorker] = None  # 在子进程中运行音频设备
+        # 时钟、连接和音频设备，仿真模式下替换为虚拟时钟、内存连接和无头设备
+        self._clock: Callable[[], float] = time.monotonic
+        self._wall_clock: Callable[[], float] = time.time
+        self._connect = websockets.connect
+        self._audio_backend = None
 
         self.message_queue = asyncio.Queue()  # 添加消息队列
         self.audio_data_queue = asyncio.Queue()  # 添加音频数据队列
@@ -65,19 +112,46 @@ class XiaozhiClient:
         self.audio_play_thread = None
         self.audio_buffer = Queue(maxsize=1024)  # 添加音频缓冲队列
 
+        # 中止相关状态
+        self._playback_epoch = 0  # 每次中止递增，播放线程据此丢弃中止前取出的音频
+        self._discard_tts_audio = False  # 中止后丢弃迟到的TTS音频包，直到下一次tts start
+        self._dropped_audio_packets = 0
+        self._abort_started: Optional[float] = None
+        self.last_abort_latency: Optional[float] = None  # 最近一次中止到本地静音的耗时（秒）
+
+        # TTS句子缓存
+        self._tts_cache: Optional[TtsCache] = None
+        self._rx_sentence_cached = False  # 接收端：当前句子已命中缓存，丢弃其音频包
+        self._sentence_text: Optional[str] = None  # 解码端：正在累积PCM的句子
+        self._sentence_pcm = bytearray()
+
+        # TTS音频流订阅者
+        self._tts_streams: List[TtsStream] = []
+
+        # 文本对话轮次：服务端逐轮处理，同一时刻只有一个进行中的轮次
+        self._turn_lock = asyncio.Lock()
+        self._active_turn: Optional[Turn] = None
+        self._turn_tasks = set()
+        self.last_turn: Optional[TurnResult] = None
+
+        # 共享采集引擎：录音、语音输入和电平表都作为订阅者挂在同一个输入流上
+        self._capture: Optional[CaptureEngine] = None
+        self._level_meter: Optional[LevelMeter] = None
+
         # 录音相关状态
         self.is_recording = False
-        self.recording_stream = None
         self.silent_frames_count = 0
         self.recording_buffer = []
+        self._recording_subscriber = None
+        self._recording_task = None
 
         # 语音输入相关
-        self._input_stream = None
+        self._input_subscriber = None
         self._audio_input_queue = asyncio.Queue()
         self._input_task = None
         self._input_paused = threading.Event()
         self._input_running = threading.Event()
-        self._input_queue = Queue(maxsize=1024)  # 改用线程安全的Queue
+        self._input_queue: Optional[LoopChannel] = None  # 采集线程交给事件循环的帧
         self._input_initialized = False  # 添加新标记表示输入是否已经初始化过
         self._last_audio_sent_time = 0  # 添加最近一次发送音频的时间戳
         self._silence_detection_enabled = True  # 是否启用静音检测
@@ -86,13 +160,160 @@ class XiaozhiClient:
         self._max_silence_frames = 200  # 最大静音帧数 (约3-4秒)
         self._last_stats_time = 0  # 上次统计信息时间
 
+        # 对话归档：每轮的文本、耗时和音频文件写入SQLite索引
+        self._archive: Optional[ConversationArchive] = None
+        self._archive_turn: Optional[PendingTurn] = None
+
+        # 输入预处理：高通、降噪、自动增益
+        self._input_conditioner: Optional[InputConditioner] = None
+
+        # 回声消除与插话检测
+        self._echo_canceller: Optional[EchoCanceller] = None
+        self._echo_reference: Optional[EchoReference] = None
+        self._echo_reference_frame: Optional[np.ndarray] = None
+        self._barge_in: Optional[BargeInDetector] = None
+        self._tts_active = False
+
+    @property
+    def _plays_audio(self) -> bool:
+        """是否在本地解码播放收到的音频"""
+        return self.config.audio_receive_mode is AudioReceiveMode.PLAY
+
     def _init_decoder(self):
-        """初始化解码器"""
+        """初始化解码器，不在本地解码音频时不创建"""
+        if not self._plays_audio:
+            self.decoder = None
+            return
         self.decoder = opuslib.Decoder(
-            self.audio_config.sample_rate,
-            self.audio_config.channels
+            self.downlink_config.sample_rate,
+            self.downlink_config.channels
         )
 
+    def _device_sample_rate(self) -> int:
+        """音频设备实际运行的采样率"""
+        return self.audio_config.device_sample_rate or self.audio_config.sample_rate
+
+    def _output_sample_rate(self) -> int:
+        """播放设备实际运行的采样率"""
+        return self.downlink_config.device_sample_rate or self.downlink_config.sample_rate
+
+    def _device_block_size(self) -> int:
+        """设备采样率下一帧对应的样点数"""
+        return round(self.audio_config.frame_size * self._device_sample_rate() / self.audio_config.sample_rate)
+
+    def _create_input_resampler(self):
+        """设备采样率与协议采样率不同时，创建采集端重采样器和帧对齐器"""
+        device_rate = self._device_sample_rate()
+        if device_rate == self.audio_config.sample_rate:
+            return None, None
+        resampler = PolyphaseResampler(device_rate, self.audio_config.sample_rate, self.audio_config.channels)
+        aligner = FrameAligner(self.audio_config.frame_size, self.audio_config.channels)
+        return resampler, aligner
+
+    def _open_input_stream(self, **kwargs):
+        """创建采集流，启用音频子进程时由子进程采集"""
+        if self._audio_backend is not None:
+            return self._audio_backend.input_stream(**kwargs)
+        if self._audio_worker is not None:
+            return self._audio_worker.input_stream(**kwargs)
+        return sd.InputStream(**kwargs)
+
+    def _open_output_stream(self, **kwargs):
+        """创建播放流，启用音频子进程时由子进程播放"""
+        if self._audio_backend is not None:
+            return self._audio_backend.output_stream(**kwargs)
+        if self._audio_worker is not None:
+            return self._audio_worker.output_stream(**kwargs)
+        return sd.OutputStream(**kwargs)
+
+    def _get_capture_engine(self) -> CaptureEngine:
+        """取得共享采集引擎，首次使用时创建"""
+        if self._capture is None:
+            self._capture = CaptureEngine(
+                self._open_input_stream,
+                self.audio_config.frame_size,
+                self.audio_config.channels,
+                device_rate=self._device_sample_rate(),
+                block_size=self._device_block_size(),
+                create_resampler=self._create_input_resampler,
+                preprocess=self._preprocess_capture,
+            )
+        return self._capture
+
+    def _preprocess_capture(self, audio_data: np.ndarray):
+        """采集线程中对每帧只做一次的预处理：先回声消除，再做非线性的输入预处理"""
+        canceller = self._echo_canceller
+        echo_reference = self._echo_reference
+        reference = self._echo_reference_frame
+        if canceller is not None and echo_reference is not None and len(audio_data) == len(reference):
+            echo_reference.pull(reference)
+            canceller.process(audio_data, reference, out=audio_data)
+        self._condition_input(audio_data)
+
+    @property
+    def capture_engine(self) -> CaptureEngine:
+        """共享采集引擎，可用subscribe挂载自定义的轻量订阅者"""
+        return self._get_capture_engine()
+
+    @property
+    def level_meter(self) -> Optional[LevelMeter]:
+        """输入电平表，未启用时为None"""
+        return self._level_meter
+
+    def enable_level_meter(self, enabled=True, decay=0.9):
+        """启用或禁用输入电平表，启用后即使没有录音或语音输入也会打开麦克风
+
+        Args:
+            enabled: 是否启用电平表
+            decay: 峰值每帧的衰减系数
+        """
+        engine = self._get_capture_engine()
+        if self._level_meter is not None:
+            engine.unsubscribe(self._level_meter)
+            self._level_meter = None
+        if enabled:
+            meter = LevelMeter(decay)
+            engine.subscribe(meter)
+            self._level_meter = meter
+        logger.info(f"输入电平表已{'启用' if enabled else '禁用'}")
+
+    @property
+    def audio_worker(self) -> Optional[AudioWorker]:
+        """音频子进程，未启用时为None"""
+        return self._audio_worker
+
+    def enable_audio_worker(self, enabled=True, playback_buffer_ms=120):
+        """启用或禁用在独立子进程中运行音频采集和播放
+
+        界面重绘等占用GIL的工作较多时，可避免设备回调被拖慢造成的采集溢出和播放断流。
+        需在connect和开始语音输入之前调用；子进程以spawn方式启动，脚本入口需要
+        ``if __name__ == "__main__":`` 保护。
+
+        Args:
+            enabled: 是否启用音频子进程
+            playback_buffer_ms: 播放缓冲区中最多积压的音频时长（毫秒）
+        """
+        if self._audio_worker is not None:
+            self._audio_worker.stop()
+            self._audio_worker = None
+        if enabled:
+            worker = AudioWorker(playback_buffer_ms)
+            worker.start()
+            self._audio_worker = worker
+        logger.debug(f"音频子进程设置: 启用={enabled}, 播放缓冲={playback_buffer_ms}ms")
+
+    def enable_simulation(self, simulation: Simulation):
+        """切换到仿真模式：时钟、连接和音频设备改用simulation提供的虚拟时钟、内存连接和无头设备
+
+        须在 ``simulation.run`` 运行的协程中创建客户端，并在connect、enable_pacing和开始语音输入之前调用。
+        耗时统计（轮次耗时、中止延迟、发送节拍、链路RTT）均以虚拟时钟计。
+        """
+        self._clock = simulation.clock.monotonic
+        self._wall_clock = simulation.clock.time
+        self._connect = simulation.connect
+        self._audio_backend = simulation.audio
+        logger.debug("已切换到仿真模式")
+
     def set_device_id(self, device_id: str):
         """设置设备ID"""
         self.device_id = device_id
@@ -118,9 +339,10 @@ class XiaozhiClient:
         
         # 合并设备标识等headers
         headers.update(self._get_headers())
+        self._offline_replay = False
         
         try:
-            self.websocket = await websockets.connect(
+            self.websocket = await self._connect(
                 self.config.ws_url,
                 extra_headers=headers,  # 使用 extra_headers
                 ping_interval=20,  # 启用ping检测，20秒一次
@@ -128,11 +350,8 @@ class XiaozhiClient:
                 close_timeout=5    # 关闭超时时间
             )
             asyncio.create_task(self._message_handler())
-            # 启动音频播放任务
-            self._audio_task = asyncio.create_task(self._run_audio_player())
-            # 启动消息处理任务
-            asyncio.create_task(self._process_messages())
-            asyncio.create_task(self._process_audio_queue())
+            self._start_workers()
+            self._start_adaptation()
             # 发送hello消息
             await self._send_hello()
         except (websockets.exceptions.WebSocketException, ConnectionError) as e:
@@ -142,6 +361,44 @@ class XiaozhiClient:
                 await self.on_connection_error(e)
             raise
 
+    def _start_workers(self):
+        """启动音频播放和消息处理任务，已在运行的任务不会重复启动
+
+        不在本地解码音频时不打开播放设备，也不启动解码任务
+        """
+        plays_audio = self._plays_audio
+        if plays_audio and (self._audio_task is None or self._audio_task.done()):
+            self.should_exit.clear()
+            # 启动音频播放任务
+            self._audio_task = asyncio.create_task(self._run_audio_player())
+        if not self._worker_tasks or any(task.done() for task in self._worker_tasks):
+            for task in self._worker_tasks:
+                task.cancel()
+            # 启动消息处理任务
+            self._worker_tasks = [asyncio.create_task(self._process_messages())]
+            if plays_audio:
+                self._worker_tasks.append(asyncio.create_task(self._process_audio_queue()))
+
+    async def _ws_send(self, data, on_error: Optional[Callable[[BaseException], Any]] = None):
+        """按优先级发送一帧：文本为控制消息，等待写出；二进制为音频帧，入队即返回，写出失败时调用on_error"""
+        priority = SendPriority.CONTROL if isinstance(data, str) else SendPriority.AUDIO
+        await self._outbound.send(data, priority, on_error)
+
+    def _audio_send_failed(self, error: BaseException):
+        """音频帧写出失败的默认处理：记录日志和追踪事件"""
+        logger.error(f"音频帧发送失败: {error}")
+        self._trace_error(error)
+
+    async def _wire_send(self, data):
+        """通过websocket写出一帧，启用会话录制时同时写入日志"""
+        if self._session_recorder is not None:
+            self._session_recorder.record(data, outbound=True)
+        await self.websocket.send(data)
+
+    def outbound_stats(self):
+        """各优先级发送从入队到写出的耗时统计（毫秒）"""
+        return self._outbound.stats()
+
     async def _send_hello(self):
         """发送hello消息"""
         hello_message = {
@@ -155,23 +412,13 @@ class XiaozhiClient:
                 "frame_duration": self.audio_config.frame_duration
             }
         }
-        await self.websocket.send(json.dumps(hello_message, ensure_ascii=False))
+        await self._ws_send(json.dumps(hello_message, ensure_ascii=False))
 
     """处理接收到的网络消息"""
     async def _message_handler(self):
         try:
             async for message in self.websocket:
-                if isinstance(message, str):
-                    try:
-                        msg_data = json.loads(message)
-                        await self.message_queue.put(msg_data)
-                    except json.JSONDecodeError:
-                        if self.on_message:
-                            await self.on_message(message)
-                else:
-                    # 音频数据直接处理，不经过队列
-                    await self.audio_data_queue.put(message)
-                    pass
+                await self._dispatch_incoming(message)
 
         except websockets.exceptions.ConnectionClosed as e:
             error_msg = f"WebSocket连接已关闭: {e.code} - {e.reason}"
@@ -186,23 +433,195 @@ class XiaozhiClient:
         except Exception as e:
             error_msg = f"未知错误: {str(e)}"
             logger.error(error_msg)
+            self._trace_error(e)
             if self.on_connection_error:
                 await self.on_connection_error(e)
         finally:
             # 确保连接断开时清理资源
             await self._cleanup()
 
+    async def _dispatch_incoming(self, message):
+        """把收到的一帧分发到消息队列或音频队列"""
+        profiler = self._profiler
+        if profiler is None:
+            await self._route_incoming(message)
+            return
+        started = time.perf_counter_ns()
+        await self._route_incoming(message)
+        profiler.record(Stage.RECEIVE, time.perf_counter_ns() - started)
+
+    async def _route_incoming(self, message):
+        if self._session_recorder is not None:
+            self._session_recorder.record(message, outbound=False)
+        if isinstance(message, str):
+            try:
+                msg_data = json.loads(message)
+                # 新的TTS流开始，不再丢弃音频包
+                if msg_data.get('type') == MessageType.TTS.value:
+                    state = msg_data.get('state')
+                    if state == 'start':
+                        self._discard_tts_audio = False
+                    if self._tts_streams and state in ('start', 'sentence_start', 'stop'):
+                        boundary = TtsBoundary(state, msg_data.get('text'))
+                        for stream in self._tts_streams:
+                            stream.feed_boundary(boundary)
+                    if ((self._tts_cache is not None or self._archive is not None)
+                            and not self._discard_tts_audio and self._plays_audio):
+                        await self._mark_tts_sentence(msg_data)
+                await self.message_queue.put(msg_data)
+            except json.JSONDecodeError:
+                if self.on_message:
+                    await self.on_message(message)
+        else:
+            if self._trace is not None:
+                self._trace.record(TraceEvent.AUDIO_IN, len(message))
+            # 已中止的TTS流迟到的音频包直接丢弃
+            if self._discard_tts_audio:
+                self._dropped_audio_packets += 1
+                return
+            for stream in self._tts_streams:
+                stream.feed_audio(message)
+            mode = self.config.audio_receive_mode
+            if mode is not AudioReceiveMode.PLAY:
+                # 纯文本部署：不解码、不缓存、不播放，按需原样转交编码数据
+                if mode is AudioReceiveMode.ENCODED and self.on_tts_data:
+                    await self.on_tts_data(message)
+                return
+            # 命中缓存的句子不需要解码服务端音频
+            if self._rx_sentence_cached:
+                return
+            # 音频包连同入队时间放入解码队列
+            await self.audio_data_queue.put((message, time.perf_counter_ns()))
+
+    def tts_stream(self, format: str = "pcm", max_chunks: int = 256) -> TtsStream:
+        """订阅收到的TTS音频，返回可异步迭代的流
+
+        流直接在接收路径上取得Opus包，与本地播放和AudioReceiveMode无关；不需要本地播放时
+        可配合AudioReceiveMode.ENCODED或DISCARD使用。迭代产出音频块和TtsBoundary边界事件，
+        调用close()或退出async with后结束。
+
+        Args:
+            format: "opus"产出原始包的memoryview，"pcm"产出解码后的int16 NumPy视图
+            max_chunks: 缓冲的最大音频包数，超出时丢弃最旧的包
+        """
+        stream = TtsStream(self.downlink_config, format, max_chunks, on_close=self._tts_streams.remove)
+        self._tts_streams.append(stream)
+        return stream
+
+    def enable_trace(self, enabled=True, capacity=4096, verbose_logging=False, dump_on_error=True):
+        """启用或禁用内存追踪缓冲区
+
+        Args:
+            enabled: 是否启用追踪
+            capacity: 环形缓冲区可保存的事件数
+            verbose_logging: 是否继续在消息处理热路径上输出info日志
+            dump_on_error: 出错时是否自动输出追踪记录
+        """
+        self._trace = TraceBuffer(capacity) if enabled else None
+        self._trace_dump_on_error = dump_on_error
+        self._verbose_logging = verbose_logging if enabled else True
+        logger.debug(f"追踪设置: 启用={enabled}, 容量={capacity}, 详细日志={self._verbose_logging}")
+
+    def dump_trace(self, reason: str = "") -> List[str]:
+        """输出追踪缓冲区中的全部事件，返回格式化后的文本行"""
+        if self._trace is None:
+            return []
+        return self._trace.dump(reason)
+
+    def _trace_error(self, error: Exception):
+        """记录错误事件，并按设置自动输出追踪记录"""
+        if self._trace is None:
+            return
+        self._trace.record(TraceEvent.ERROR, obj=error)
+        if self._trace_dump_on_error:
+            self._trace.dump(f"{type(error).__name__}: {error}")
+
+    def enable_profiling(self, enabled=True, window=1024) -> Optional[StageProfiler]:
+        """启用或禁用各阶段耗时统计
+
+        覆盖采集排队、输入处理、编码、发送、接收分发、解码排队、解码、播放排队和写入设备，
+        可通过返回的StageProfiler.add_hook注册自定义计时钩子。
+
+        Args:
+            enabled: 是否启用
+            window: 每个阶段保留用于分位数统计的最近样本数
+        """
+        self._profiler = StageProfiler(window) if enabled else None
+        logger.debug(f"阶段耗时统计设置: 启用={enabled}, 窗口={window}")
+        return self._profiler
+
+    @property
+    def profiler(self) -> Optional[StageProfiler]:
+        return self._profiler
+
+    async def profile_session(self, duration: float, mode: str = "cprofile",
+                              output: Optional[str] = None, interval: float = 0.005) -> str:
+        """在接下来的一段时间内对会话做性能分析，返回文本报告
+
+        Args:
+            duration: 分析时长（秒）
+            mode: "cprofile"只分析事件循环线程，"sampling"按interval采样所有线程（含音频回调）
+            output: 可选的输出文件，cprofile为pstats格式，sampling为火焰图折叠栈格式
+            interval: 采样间隔（秒）
+        """
+        logger.info(f"开始性能分析: 模式={mode}, 时长={duration}s")
+        report = await profile_window(duration, mode, output, interval)
+        if self._profiler is not None:
+            report += "\n\n" + self._profiler.report()
+        return report
+
+    def enable_session_recording(self, path: Optional[str] = None):
+        """开始或停止录制websocket收发的全部帧
+
+        Args:
+            path: 会话日志路径（追加写入），None表示停止录制
+        """
+        if self._session_recorder is not None:
+            self._session_recorder.close()
+            self._session_recorder = None
+        if path:
+            self._session_recorder = SessionRecorder(path, self._clock)
+            logger.info(f"开始录制会话: {path}")
+
+    async def replay_session(self, path: str, speed: float = 1.0, segment: Optional[int] = None):
+        """把会话日志中收到的帧按原始时序直接送入接收队列，用于离线复现和分析
+
+        Args:
+            path: 会话日志路径
+            speed: 回放倍速，<=0表示不等待、尽快回放
+            segment: 只回放指定的录制段（支持负数索引），None表示依次回放全部段
+        """
+        segments = split_segments(read_session(path))
+        if segment is not None:
+            segments = [segments[segment]]
+        frames = [frame for frames in segments for frame in frames if not frame.outbound]
+        if self.websocket is None:
+            self._offline_replay = True
+        self._start_workers()
+        logger.info(f"回放会话: {path}, 共 {len(frames)} 帧, 倍速 {speed}")
+        await replay_frames(frames, self._dispatch_incoming, speed)
+
     async def _cleanup(self):
         """清理资源"""
         await self.stop_voice_input()
+        self.iot_state.cancel()
+        if self._adapt_task is not None:
+            self._adapt_task.cancel()
+            self._adapt_task = None
+        if self._active_turn is not None:
+            self._active_turn.fail(ConnectionError("WebSocket连接已关闭"))
+        for stream in list(self._tts_streams):
+            stream.close()
         # 确保停止录音
         if self.is_recording:
             await self.stop_recording()
             
         self.should_exit.set()
+        self._audio_wakeup.set()
         if self.stream:
             self.stream.stop()
             self.stream.close()
+        await self._outbound.close()
         if self.websocket:
             await self.websocket.close()
             self.websocket = None
@@ -233,6 +652,10 @@ class XiaozhiClient:
                 await self._handle_hello_message(msg_data)
             else:
                 await self._handle_other_message(msg_data)
+
+            turn = self._active_turn
+            if turn is not None and msg_type in TURN_MESSAGE_TYPES:
+                turn.feed(msg_data)
             
             if self.on_message:
                 await self.on_message(msg_data)
@@ -241,42 +664,265 @@ class XiaozhiClient:
     async def _process_audio_queue(self):
         """处理音频数据队列"""
         while True:
-            audio_data = await self.audio_data_queue.get()
+            audio_data, enqueued = await self.audio_data_queue.get()
             self.audio_data_queue.task_done()
+            if isinstance(audio_data, tuple):
+                self._handle_sentence_marker(*audio_data)
+                continue
             try:
-                pcm_data = self.decoder.decode(audio_data, self.audio_config.frame_size)
+                profiler = self._profiler
+                if profiler is not None:
+                    started = time.perf_counter_ns()
+                    profiler.record(Stage.DECODE_WAIT, started - enqueued)
+                pcm_data = self.decoder.decode(audio_data, self.downlink_config.max_decode_size)
+                if profiler is not None:
+                    profiler.record(Stage.DECODE, time.perf_counter_ns() - started)
                 if pcm_data:
                     self.audio_queue.put((pcm_data, True))
+                    self._audio_wakeup.set()
                     # Convert PCM data to bytes if it isn't already
                     if isinstance(pcm_data, (bytes, bytearray)):
                         self.pcm_buffer.extend(pcm_data)
                     else:
                         self.pcm_buffer.extend(bytes(pcm_data))
+                    if self._sentence_text is not None:
+                        self._sentence_pcm.extend(pcm_data)
             except Exception as e:
                 logger.error(f"音频处理错误: {e}")
+                self._trace_error(e)
                 self._init_decoder()
 
+    async def _mark_tts_sentence(self, msg_data: dict):
+        """在音频队列中插入句子边界标记，保持与音频包的先后顺序"""
+        state = msg_data.get('state')
+        if state == 'sentence_start':
+            text = msg_data.get('text', '')
+            cached = self._tts_cache.get(text) if self._tts_cache is not None else None
+            self._rx_sentence_cached = cached is not None
+            await self.audio_data_queue.put(((text, cached), time.perf_counter_ns()))
+        elif state in ('sentence_end', 'stop'):
+            self._rx_sentence_cached = False
+            await self.audio_data_queue.put(((None, None), time.perf_counter_ns()))
+
+    def _handle_sentence_marker(self, text: Optional[str], cached: Optional[bytes]):
+        """句子边界：缓存上一句解码出的PCM，命中缓存的句子直接播放缓存"""
+        if text is not None and self._archive_turn is not None:
+            self._archive_turn.offsets.append(len(self.pcm_buffer))
+        if self._tts_cache is not None and self._sentence_text and self._sentence_pcm:
+            self._tts_cache.put(self._sentence_text, self._sentence_pcm)
+        # 只为归档记录偏移时不需要累积整句PCM
+        self._sentence_text = text if cached is None and self._tts_cache is not None else None
+        self._sentence_pcm = bytearray()
+        if cached is not None:
+            logger.debug(f"TTS缓存命中: {text}")
+            self._enqueue_pcm(cached)
+
+    def _enqueue_pcm(self, pcm: bytes):
+        """把已解码的PCM按帧放入播放队列"""
+        frame_bytes = self.downlink_config.frame_size * self.downlink_config.channels * 2
+        view = memoryview(pcm)
+        for i in range(0, len(view), frame_bytes):
+            self.audio_queue.put((view[i:i + frame_bytes], True))
+        self._audio_wakeup.set()
+        self.pcm_buffer.extend(pcm)
+
+    def _archive_current(self, new_turn=False) -> PendingTurn:
+        """取得正在归档的轮次；new_turn为True且上一轮已开始TTS时，把上一轮记为中止并开始新的一轮"""
+        turn = self._archive_turn
+        if turn is not None and new_turn and turn.tts_started:
+            self._archive_finish(aborted=True)
+            turn = None
+        if turn is None:
+            turn = PendingTurn(self._clock, self._wall_clock)
+            self._archive_turn = turn
+        return turn
+
+    def _archive_finish(self, wav_path: Optional[str] = None, aborted=False):
+        """结束当前轮次并写入归档"""
+        turn = self._archive_turn
+        self._archive_turn = None
+        if turn is None or self._archive is None:
+            return
+        if wav_path:
+            turn.add_audio('downlink', wav_path, self.downlink_config.sample_rate, self.downlink_config.channels)
+        # 写入和淘汰（含删除音频文件）在归档的写入线程中进行，不阻塞消息处理
+        self._archive.submit_turn(turn, self.device_id, self.session_id, aborted).add_done_callback(
+            self._archive_written
+        )
+
+    @staticmethod
+    def _archive_written(future):
+        error = future.exception()
+        if error is not None:
+            logger.error(f"写入对话归档失败: {error}")
+
+    @property
+    def archive(self) -> Optional[ConversationArchive]:
+        """对话归档，可按时间、设备、会话或文本查询；未启用时为None"""
+        return self._archive
+
+    def enable_archive(self, enabled=True, path=None, retention_days=None, max_bytes=None) -> Optional[asyncio.Future]:
+        """启用或禁用对话归档
+
+        每轮对话的STT、LLM和TTS文本、耗时、保存的WAV文件以及每个TTS句子在WAV中的字节偏移
+        写入嵌入式SQLite索引。
+
+        关闭已有归档时要等后台线程写完排队的轮次。在事件循环中调用时关闭交给线程池执行，不阻塞事件循环，
+        返回其future，可await等待关闭完成；不在事件循环中调用时同步关闭并返回None。
+
+        Args:
+            enabled: 是否启用归档
+            path: 索引数据库路径，默认为音频目录下的archive.db
+            retention_days: 保留天数，超过的轮次连同音频文件一起删除，None表示不限
+            max_bytes: 归档音频的总字节数上限，超过时从最旧的轮次开始淘汰，None表示不限
+        """
+        closing = None
+        if self._archive is not None:
+            archive, self._archive = self._archive, None
+            self._archive_turn = None
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                archive.close()
+            else:
+                closing = loop.run_in_executor(None, archive.close)
+        if enabled:
+            path = path or os.path.join(self.audio_dir, "archive.db")
+            self._archive = ConversationArchive(path, retention_days, max_bytes)
+            logger.info(f"对话归档已启用: {path}")
+        else:
+            logger.info("对话归档已禁用")
+        return closing
+
+    @property
+    def tts_cache(self) -> Optional[TtsCache]:
+        """TTS句子缓存，可用于预填充提示语和查看命中率"""
+        return self._tts_cache
+
+    def enable_tts_cache(self, enabled=True, max_bytes=32 * 1024 * 1024, spill_dir=None,
+                         max_disk_bytes=512 * 1024 * 1024):
+        """启用或禁用按句子文本缓存TTS解码结果
+
+        Args:
+            enabled: 是否启用缓存
+            max_bytes: 内存缓存的最大字节数
+            spill_dir: 内存淘汰条目的落盘目录，None表示不落盘
+            max_disk_bytes: 磁盘缓存的最大字节数
+        """
+        if enabled:
+            self._tts_cache = TtsCache(max_bytes, spill_dir, max_disk_bytes)
+        else:
+            self._tts_cache = None
+        self._rx_sentence_cached = False
+        self._sentence_text = None
+        self._sentence_pcm = bytearray()
+        logger.debug(f"TTS缓存设置: 启用={enabled}, 内存上限={max_bytes}, 落盘目录={spill_dir}")
+
+    def play_prompt(self, text: str) -> bool:
+        """直接在本地播放已缓存的提示语，未缓存或不在本地播放音频时返回False"""
+        if self._tts_cache is None or not self._plays_audio:
+            return False
+        pcm = self._tts_cache.get(text)
+        if pcm is None:
+            return False
+        self._enqueue_pcm(pcm)
+        return True
+
     async def _handle_hello_message(self, msg_data: dict):
         #logger.info(f"服务器消息: {msg_data}")
         """处理Hello消息"""
+        if self._trace is not None:
+            self._trace.record(TraceEvent.HELLO, obj=msg_data)
+        self.session_id = msg_data.get('session_id', self.session_id)
+        await self._apply_downlink_config(self._negotiate_downlink(msg_data.get('audio_params')))
+        if len(self.iot):
+            await self.send_iot_descriptors()
+            await self.send_iot_states()
         if self.on_hello_message:
             await self.on_hello_message(msg_data)
     
+    def _negotiate_downlink(self, params) -> AudioConfig:
+        """根据服务端hello中的audio_params确定下行音频参数，缺省或不支持的字段沿用上行参数"""
+        base = self.audio_config
+        if not params:
+            return replace(base)
+        try:
+            sample_rate = int(params.get('sample_rate', base.sample_rate))
+            channels = int(params.get('channels', base.channels))
+            frame_duration = int(params.get('frame_duration', base.frame_duration))
+        except (AttributeError, TypeError, ValueError):
+            logger.warning(f"无法解析服务端音频参数: {params}")
+            return replace(base)
+        audio_format = params.get('format', base.format)
+        if (audio_format != 'opus' or sample_rate not in OPUS_SAMPLE_RATES
+                or channels not in (1, 2) or frame_duration not in OPUS_FRAME_DURATIONS):
+            logger.warning(f"不支持的服务端音频参数: {params}，沿用上行参数")
+            return replace(base)
+        return replace(
+            base,
+            sample_rate=sample_rate,
+            channels=channels,
+            frame_duration=frame_duration,
+            frame_size=sample_rate * frame_duration // 1000
+        )
+
+    async def _apply_downlink_config(self, config: AudioConfig) -> bool:
+        """切换下行音频参数：重建解码器、清空已按旧参数解码的缓存，并以新采样率重新打开播放设备"""
+        previous = self.downlink_config
+        if config == previous:
+            return False
+        self.downlink_config = config
+        logger.info(
+            f"下行音频参数: {previous.sample_rate}Hz/{previous.channels}声道/{previous.frame_duration}ms -> "
+            f"{config.sample_rate}Hz/{config.channels}声道/{config.frame_duration}ms"
+        )
+        # 清空各级队列并按新参数重建解码器
+        self._flush_playback()
+        # 缓存中的PCM是按旧采样率解码的，不能再播放
+        if self._tts_cache is not None:
+            self._tts_cache.clear()
+        for stream in self._tts_streams:
+            stream.set_audio_config(config)
+        if self._audio_task is not None and not self._audio_task.done():
+            self.should_exit.set()
+            self._audio_wakeup.set()
+            await self._audio_task
+            self.should_exit.clear()
+            self._audio_task = asyncio.create_task(self._run_audio_player())
+        return True
+
     async def _handle_llm_message(self, msg_data: dict):
-        logger.info(f"LLM消息: {msg_data.get('text')}")
         """处理LLM消息"""
+        if self._trace is not None:
+            self._trace.record(TraceEvent.LLM, obj=msg_data)
+        if self._verbose_logging:
+            logger.info(f"LLM消息: {msg_data.get('text')}")
+        if self._archive is not None:
+            turn = self._archive_current()
+            turn.note_response()
+            turn.llm.append(msg_data.get('text') or '')
         if self.on_llm_message:
             await self.on_llm_message(msg_data)
     
     async def _handle_stt_message(self, msg_data: dict):
-        logger.info(f"STT消息: {msg_data.get('text')}")
         """处理STT消息"""
+        if self._trace is not None:
+            self._trace.record(TraceEvent.STT, obj=msg_data)
+        if self._verbose_logging:
+            logger.info(f"STT消息: {msg_data.get('text')}")
+        if self._archive is not None:
+            turn = self._archive_current(new_turn=True)
+            turn.note_response()
+            turn.stt = msg_data.get('text')
         if self.on_stt_message:
             await self.on_stt_message(msg_data)
 
     async def _handle_other_message(self, msg_data: dict):
         """处理其他消息"""
-        logger.info(f"未知消息类型{msg_data.get('type')}: {msg_data}")
+        if self._trace is not None:
+            self._trace.record(TraceEvent.OTHER, obj=msg_data)
+        if self._verbose_logging:
+            logger.info(f"未知消息类型{msg_data.get('type')}: {msg_data}")
         if self.on_other_message:
             await self.on_other_message
 
@@ -286,43 +932,91 @@ class XiaozhiClient:
         if state == 'start':
             self.pcm_buffer = bytearray()  # 重置为空 bytearray
             self._init_decoder()
-            logger.info(f"TTS开始 ")
+            self._tts_active = True
+            if self._barge_in:
+                self._barge_in.reset()
+            if self._trace is not None:
+                self._trace.record(TraceEvent.TTS_START, obj=msg_data)
+            if self._archive is not None:
+                self._archive_current().tts_started = True
+            if self._verbose_logging:
+                logger.info(f"TTS开始 ")
             if self.on_tts_start:
                 await self.on_tts_start(msg_data)
                 
         elif state == 'sentence_start':
             self.current_sentence_text = msg_data.get('text', '')
-            logger.info(f"tts语句: {self.current_sentence_text}")
+            if self._trace is not None:
+                self._trace.record(TraceEvent.TTS_SENTENCE, obj=self.current_sentence_text)
+            if self._archive is not None:
+                self._archive_current().add_sentence(self.current_sentence_text)
+            if self._verbose_logging:
+                logger.info(f"tts语句: {self.current_sentence_text}")
             if self.on_tts_message:
                 await self.on_tts_message(msg_data)
                 
         elif state == 'stop':
-            logger.info(f"TTS结束")
+            self._tts_active = False
+            if self._trace is not None:
+                self._trace.record(TraceEvent.TTS_STOP, len(self.pcm_buffer))
+            if self._verbose_logging:
+                logger.info(f"TTS结束")
+            wav_path = None
             try:
-                save_wav(self.audio_dir, self.pcm_buffer)
+                wav_path = save_wav(
+                    self.audio_dir,
+                    self.pcm_buffer,
+                    sample_rate=self.downlink_config.sample_rate,
+                    channels=self.downlink_config.channels
+                )
             except Exception as e:
                 logger.error(f"保存音频文件失败: {e}")
+            if self._archive is not None:
+                self._archive_finish(wav_path)
 
             if self.on_tts_end:
                 await self.on_tts_end(msg_data)
 
     async def _handle_iot_message(self, msg_data: dict):
-        """处理IoT设备描述消息"""
-        # 可以在这里添加IoT设备描述的处理逻辑
-        pass
+        """处理IoT命令消息：查表校验后在后台执行，不阻塞消息处理"""
+        if self._trace is not None:
+            self._trace.record(TraceEvent.IOT, obj=msg_data)
+        for command in msg_data.get('commands') or ():
+            try:
+                self.iot.dispatch(command)
+            except IoTError as e:
+                logger.warning(f"忽略IoT命令: {e}")
+        if self.on_iot_message:
+            await self.on_iot_message(msg_data)
+
+    async def send_iot_descriptors(self):
+        """上报已注册的IoT设备描述"""
+        await self.send_text(self.iot.descriptor_message(self.session_id))
+
+    async def send_iot_states(self):
+        """上报全部IoT设备的当前状态，之后的变化通过iot_state增量上报"""
+        await self.iot_state.send_full()
 
     async def _handle_listen_message(self, msg_data: dict):
         """处理语音识别状态消息"""
         # 可以在这里添加语音识别状态的处理逻辑
         pass
 
-    async def send_audio(self, audio_data: np.ndarray):
+    async def send_audio(self, audio_data: np.ndarray, rms: Optional[float] = None, gain: float = 1.0,
+                         paced: bool = True, on_error: Optional[Callable[[BaseException], Any]] = None):
         """发送音频数据
         
         Args:
             audio_data: float32类型的numpy数组，范围[-1.0, 1.0]
+            rms: 调用方已计算出的音频强度，传入后不再重复计算
+            gain: 编码前施加的增益，与int16转换在同一步完成
+            paced: 启用发送节拍时是否按帧时长逐帧放行，实时采集的数据传False
+            on_error: 音频帧入队后写出失败时在发送任务中调用，参数为异常；默认记录日志和追踪事件。
+                写出在后台进行，错误不会从本次或之后的发送中抛出
         """
         if self.websocket is None or self.websocket.closed:
+            if self._offline_replay:
+                return
             raise ConnectionError("WebSocket connection not established")
 
         try:
@@ -330,46 +1024,156 @@ class XiaozhiClient:
             if audio_data.dtype != np.float32:
                 audio_data = audio_data.astype(np.float32)
 
-            # 计算并记录音频强度
-            rms = np.sqrt(np.mean(np.square(audio_data)))
-            if random.random() < 0.01:  # 只对1%的帧记录强度
+            # 记录音频强度：追踪开启时记录每一帧，否则每100次调用输出一条调试日志
+            self._audio_send_count += 1
+            if self._trace is not None:
+                self._trace.record(TraceEvent.AUDIO_OUT, len(audio_data), rms if rms is not None else -1.0)
+            elif self._verbose_logging and self._audio_send_count % 100 == 0:
+                if rms is None:
+                    rms = frame_rms(audio_data)
                 logger.debug(f"发送音频数据，强度: {rms:.5f}")
 
-            # 将float32数据转换为PCM int16格式
-            pcm_data = (audio_data * 32767).astype(np.int16)
-            
-            # 按帧长度分割数据
-            frame_size = self.audio_config.frame_size
-            for i in range(0, len(pcm_data), frame_size):
-                frame = pcm_data[i:i + frame_size]
-                
-                # 如果是最后一帧且长度不足，则补零
-                if len(frame) < frame_size:
-                    frame = np.pad(frame, (0, frame_size - len(frame)))
-                
-                # 编码为Opus格式
-                opus_data = self.encoder.encode(frame.tobytes(), frame_size)
+            # 按帧长度分割数据，在复用缓冲区中转换为PCM int16（不足一帧时补零）后编码
+            frame_encoder = self._frame_encoder
+            frame_len = frame_encoder.frame_len
+            profiler = self._profiler
+            pacer = self._pacer if paced else None
+            for i in range(0, len(audio_data), frame_len):
+                if pacer is not None and not await pacer.wait():
+                    continue
+                if profiler is not None:
+                    started = time.perf_counter_ns()
+                frame_encoder.load(audio_data[i:i + frame_len], gain)
+                opus_data = frame_encoder.encode(self.encoder)
+                if profiler is not None:
+                    encoded = time.perf_counter_ns()
+                    profiler.record(Stage.ENCODE, encoded - started)
                 if opus_data:
-                    await self.websocket.send(opus_data)
+                    await self._ws_send(opus_data, on_error or self._audio_send_failed)
+                    if profiler is not None:
+                        profiler.record(Stage.SEND, time.perf_counter_ns() - encoded)
                 
-        except Exception as e:
-            logger.error(f"音频编码发送错误: {e}")
-            # 重新初始化编码器
+        except opuslib.OpusError as e:
+            logger.error(f"音频编码错误: {e}")
+            self._trace_error(e)
+            # 只有编码器出错时才重新初始化编码器
             self.encoder = opuslib.Encoder(
                 self.audio_config.sample_rate,
                 self.audio_config.channels,
                 'voip'
             )
+            if self._link_adapter is not None:
+                self._configure_encoder(self._link_adapter.settings)
+            raise
+        except Exception as e:
+            logger.error(f"音频发送错误: {e}")
+            self._trace_error(e)
             raise
 
+    def _configure_encoder(self, settings: EncoderSettings):
+        """把编码参数应用到Opus编码器"""
+        self.encoder.bitrate = settings.bitrate
+        self.encoder.inband_fec = settings.fec
+        self.encoder.packet_loss_perc = settings.packet_loss_perc
+
+    async def _apply_encoder_settings(self, settings: EncoderSettings):
+        self._configure_encoder(settings)
+        if self._trace is not None:
+            self._trace.record(TraceEvent.ADAPT, settings.bitrate, settings.packet_loss_perc, obj=settings)
+
+    def enable_adaptation(self, enabled=True, bitrate=32000, policy: Optional[AdaptationPolicy] = None,
+                          interval=2.0) -> Optional[LinkAdapter]:
+        """启用或禁用上行编码参数自适应
+
+        周期性测量websocket的ping往返时间、传输层写缓冲和发送队列中的音频积压，链路变差时降低比特率、开启FEC，
+        链路恢复后逐级还原。包时长始终保持hello中协商的frame_duration。决策记录见返回对象的decisions。
+
+        Args:
+            enabled: 是否启用
+            bitrate: 链路良好时的比特率（bps）
+            policy: 自定义策略，参数为(LinkSample, 当前EncoderSettings)，返回(新参数, 原因)或None
+            interval: 测量间隔（秒）
+        """
+        if self._adapt_task is not None:
+            self._adapt_task.cancel()
+            self._adapt_task = None
+        if not enabled:
+            self._link_adapter = None
+            return None
+        base = EncoderSettings(bitrate)
+        self._link_adapter = LinkAdapter(base, policy, interval)
+        self._configure_encoder(base)
+        self._start_adaptation()
+        return self._link_adapter
+
+    def _uplink_backlog(self) -> float:
+        """发送调度器中排队、尚未写出的上行音频时长（秒）"""
+        return self._outbound.queued(SendPriority.AUDIO) * self.audio_config.frame_duration / 1000.0
+
+    def _start_adaptation(self):
+        if self._link_adapter is None or self.websocket is None:
+            return
+        if self._adapt_task is None or self._adapt_task.done():
+            self._adapt_task = asyncio.create_task(self._run_adaptation())
+
+    async def _run_adaptation(self):
+        try:
+            await self._link_adapter.run(self.websocket, self._apply_encoder_settings, self._uplink_backlog)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.error(f"上行编码参数自适应异常: {e}")
+            self._trace_error(e)
+
+    def enable_pacing(self, enabled=True, burst_frames=3, speed=1.0, catch_up="burst") -> Optional[FramePacer]:
+        """启用或禁用发送节拍：文件或缓冲区输入按帧时长逐帧发送，行为与实时麦克风一致
+
+        Args:
+            enabled: 是否启用
+            burst_frames: 允许领先实时的帧数
+            speed: 发送倍速
+            catch_up: 落后时的追赶策略，"burst"、"reset"或"drop"
+        """
+        if enabled:
+            self._pacer = FramePacer(self.audio_config.frame_duration / 1000.0, burst_frames, speed, catch_up,
+                                     clock=self._clock)
+        else:
+            self._pacer = None
+        logger.debug(f"发送节拍设置: 启用={enabled}, 预发帧数={burst_frames}, 倍速={speed}, 追赶策略={catch_up}")
+        return self._pacer
+
+    @property
+    def pacer(self) -> Optional[FramePacer]:
+        return self._pacer
+
+    async def send_wav_file(self, path: str):
+        """以内存映射方式按帧流式发送WAV文件，不会将整个文件读入内存
+
+        Args:
+            path: WAV文件路径，采样率和声道数需与audio_config一致
+        """
+        with WavReader(path) as reader:
+            info = reader.info
+            if info.sample_rate != self.audio_config.sample_rate or info.channels != self.audio_config.channels:
+                raise ValueError(
+                    f"WAV格式不匹配: {info.sample_rate}Hz/{info.channels}声道, "
+                    f"需要 {self.audio_config.sample_rate}Hz/{self.audio_config.channels}声道"
+                )
+            for chunk in reader.iter_chunks(self.audio_config.frame_size):
+                await self.send_audio(pcm_to_float32(chunk.reshape(-1)))
+
     async def send_text(self, message: dict):
         """发送文本消息"""
         if self.websocket is None or self.websocket.closed:
+            if self._offline_replay:
+                # 离线回放没有连接，hello后上报IoT描述等回复直接丢弃，不中断消息处理
+                logger.debug(f"离线回放中丢弃发送: {message.get('type')}")
+                return
             raise ConnectionError("WebSocket connection not established")
         
         # 使用ensure_ascii=False来保持中文字符
         json_str = json.dumps(message, ensure_ascii=False)
-        await self.websocket.send(json_str)
+        await self._ws_send(json_str)
 
     async def close(self):
         """关闭连接"""
@@ -384,6 +1188,14 @@ class XiaozhiClient:
         if self.websocket:
             await self.websocket.close()
             self.websocket = None
+        if self._session_recorder is not None:
+            self._session_recorder.flush()
+        if self._capture is not None:
+            self._capture.close()
+            self._level_meter = None
+        if self._audio_worker is not None:
+            self._audio_worker.stop()
+            self._audio_worker = None
 
     async def start_listen(self, mode: ListenMode = ListenMode.AUTO):
         """开始语音识别"""
@@ -407,44 +1219,260 @@ class XiaozhiClient:
             "text": text
         })
 
+    async def ask(self, text: str, timeout: float = 30.0) -> TurnResult:
+        """发送文本并等待本轮对话结束（收到tts stop）
+
+        多个并发的ask按调用顺序排队，上一轮结束后立即发送下一轮。
+        超时或被取消时会中止本轮对话。
+
+        Args:
+            text: 发送的文本
+            timeout: 从调用到本轮结束的最长等待时间（秒），包括排在其他轮次之后等待的时间
+
+        Raises:
+            asyncio.TimeoutError: 超时
+            ConnectionError: 等待期间连接断开
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        turn = await self._begin_turn(text, stream=False, timeout=timeout)
+        completed = False
+        try:
+            await asyncio.wait_for(turn.done.wait(), max(0.0, deadline - loop.time()))
+            completed = True
+        finally:
+            await self._end_turn(turn, completed)
+        if turn.error is not None:
+            raise turn.error
+        return turn.result
+
+    async def ask_stream(self, text: str, timeout: float = 30.0) -> AsyncIterator[dict]:
+        """发送文本并依次产出本轮的stt、llm和tts消息，收到tts stop后结束
+
+        超时（包括排队等待其他轮次的时间）或被取消时会中止本轮对话。本轮的汇总结果在结束后见last_turn。
+        提前break时，生成器要等到aclose()才会中止本轮并放行下一轮；不显式关闭时取决于垃圾回收的时机，
+        因此可能提前退出的调用方应使用contextlib.aclosing。
+
+        Example:
+            async with contextlib.aclosing(client.ask_stream("讲个笑话")) as stream:
+                async for msg in stream:
+                    if msg['type'] == 'tts' and msg.get('state') == 'sentence_start':
+                        print(msg['text'])
+                        break
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        turn = await self._begin_turn(text, stream=True, timeout=timeout)
+        completed = False
+        try:
+            while True:
+                msg_data = await asyncio.wait_for(turn.queue.get(), max(0.0, deadline - loop.time()))
+                if msg_data is None:
+                    break
+                yield msg_data
+            completed = True
+        finally:
+            await self._end_turn(turn, completed)
+        if turn.error is not None:
+            raise turn.error
+
+    async def _begin_turn(self, text: str, stream: bool, timeout: float) -> Turn:
+        # 排队等待上一轮同样计入调用方的超时
+        await asyncio.wait_for(self._turn_lock.acquire(), timeout)
+        turn = Turn(text, stream, self._clock)
+        self._active_turn = turn
+        try:
+            turn.start()
+            await self.send_txt_message(text)
+        except BaseException:
+            self._active_turn = None
+            self._turn_lock.release()
+            raise
+        return turn
+
+    async def _end_turn(self, turn: Turn, completed: bool):
+        """结束轮次；未正常结束时中止对话，并在服务端确认（或宽限期）后再放行下一轮"""
+        self.last_turn = turn.result
+        if completed or turn.done.is_set():
+            self._release_turn(turn)
+            logger.debug(
+                f"文本轮次结束: 首条响应 {turn.result.first_response}s, "
+                f"首句 {turn.result.first_sentence}s, 总耗时 {turn.result.latency}s"
+            )
+            return
+        turn.result.aborted = True
+        # 先让后续的排队轮次等待，避免把本轮迟到的tts stop当成下一轮的结束
+        task = asyncio.create_task(self._drain_turn(turn))
+        self._turn_tasks.add(task)
+        task.add_done_callback(self._turn_tasks.discard)
+        try:
+            await self.abort()
+        except Exception as e:
+            logger.debug(f"中止文本轮次失败: {e}")
+
+    async def _drain_turn(self, turn: Turn, grace: float = 2.0):
+        try:
+            await asyncio.wait_for(turn.done.wait(), grace)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._release_turn(turn)
+
+    def _release_turn(self, turn: Turn):
+        if self._active_turn is turn:
+            self._active_turn = None
+            self._turn_lock.release()
+
     async def abort(self):
-        """中止当前对话"""
+        """中止当前对话，并立即清空本地所有待解码和待播放的音频"""
+        self._discard_tts_audio = True
+        self._tts_active = False
+        self._abort_started = self._clock()
+        dropped = self._flush_playback()
+        # 唤醒播放线程（或事件循环中的播放任务），以便尽快确认静音
+        if self.audio_play_thread is not None:
+            try:
+                self.audio_buffer.put_nowait(None)
+            except Full:
+                pass
+        self._audio_wakeup.set()
+        for stream in self._tts_streams:
+            stream.feed_boundary(TtsBoundary("abort"))
+        if self._trace is not None:
+            self._trace.record(TraceEvent.ABORT, dropped)
+        logger.debug(f"中止对话，丢弃本地音频 {dropped} 项")
         await self.send_text({
             "type": MessageType.ABORT.value
         })
-    def _audio_play_thread_fn(self):
-        """专门的音频播放线程"""
+
+    def _flush_playback(self) -> int:
+        """清空解码、播放各级队列并重置解码器，返回丢弃的条目数
+
+        除播放线程外各级队列都在事件循环线程中消费，这里同步完成清空，中间没有让出点；
+        播放线程通过播放代数识别并丢弃清空前已经取出的音频。
+        """
+        self._playback_epoch += 1
+        dropped = 0
+        while True:
+            try:
+                self.audio_data_queue.get_nowait()
+                self.audio_data_queue.task_done()
+                dropped += 1
+            except asyncio.QueueEmpty:
+                break
+        while True:
+            try:
+                self.audio_queue.get_nowait()
+                self.audio_queue.task_done()
+                dropped += 1
+            except Empty:
+                break
+        while True:
+            try:
+                self.audio_buffer.get_nowait()
+                dropped += 1
+            except Empty:
+                break
+        self._init_decoder()
+        self.pcm_buffer = bytearray()
+        self._rx_sentence_cached = False
+        self._sentence_text = None
+        self._sentence_pcm = bytearray()
+        if self._echo_reference is not None:
+            self._echo_reference.clear()
+        # 子进程播放缓冲区中已写入、尚未播放的音频同样丢弃
+        if self._audio_worker is not None:
+            self._audio_worker.discard_playback()
+        return dropped
+
+    def _check_abort_silence(self):
+        """播放线程在中止后首次空闲时记录中止到静音的耗时"""
+        started = self._abort_started
+        if started is not None and self.audio_buffer.empty():
+            self._abort_started = None
+            self.last_abort_latency = self._clock() - started
+            device_latency = getattr(self.stream, 'latency', 0.0) or 0.0
+            logger.debug(
+                f"中止到本地静音耗时 {self.last_abort_latency * 1000:.1f}ms"
+                f"（另有设备输出延迟 {device_latency * 1000:.1f}ms）"
+            )
+    def _play_item(self, item):
+        """把一项播放缓冲写入设备；None表示唤醒，丢弃中止前的旧代数音频"""
+        if item is None:
+            self.is_playing.clear()
+        elif item[2] == self._playback_epoch:
+            audio_data, reference, _, enqueued = item
+            self.is_playing.set()
+            # 写入设备前推入回声参考信号（协议采样率）
+            if self._echo_reference is not None:
+                self._echo_reference.push(reference)
+            profiler = self._profiler
+            if profiler is None:
+                self.stream.write(audio_data)
+            else:
+                started = time.perf_counter_ns()
+                profiler.record(Stage.PLAY_WAIT, started - enqueued)
+                self.stream.write(audio_data)
+                profiler.record(Stage.PLAY_WRITE, time.perf_counter_ns() - started)
+        self._check_abort_silence()
+
+    def _audio_play_thread_fn(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """专门的音频播放线程，音频子进程退出时结束并唤醒播放任务"""
         try:
             while not self.should_exit.is_set():
                 try:
-                    audio_data = self.audio_buffer.get(timeout=0.1)
-                    if audio_data is not None:
-                        self.is_playing.set()
-                        self.stream.write(audio_data)
+                    self._play_item(self.audio_buffer.get(timeout=0.1))
                 except Empty:
                     self.is_playing.clear()
                     continue
                 except Exception as e:
                     logger.error(f"音频播放错误: {e}")
+                    if self._audio_worker is not None and not self._audio_worker.running:
+                        break
         finally:
             self.is_playing.clear()
+            if loop is not None and not loop.is_closed():
+                loop.call_soon_threadsafe(self._audio_wakeup.set)
 
     async def _run_audio_player(self):
-        """运行音频播放器"""
-        self.stream = sd.OutputStream(
-            samplerate=self.audio_config.sample_rate,
-            channels=self.audio_config.channels,
+        """运行音频播放器，按下行音频参数打开播放设备"""
+        downlink = self.downlink_config
+        device_rate = self._output_sample_rate()
+        self.stream = self._open_output_stream(
+            samplerate=device_rate,
+            channels=downlink.channels,
             dtype=np.int16
         )
         self.stream.start()
+        # 写入不阻塞的设备（仿真的无头设备）由事件循环直接写入，按设备缓冲时长让出，不启动播放线程
+        loop_driven = getattr(self.stream, 'loop_driven', False)
+
+        # 设备采样率与协议采样率不同时，在送入播放缓冲前重采样
+        output_resampler = None
+        if device_rate != downlink.sample_rate:
+            output_resampler = PolyphaseResampler(
+                downlink.sample_rate, device_rate, downlink.channels
+            )
+        # 回声参考信号需与采集端一致：单声道、上行采样率
+        reference_resampler = None
+        if downlink.sample_rate != self.audio_config.sample_rate:
+            reference_resampler = PolyphaseResampler(downlink.sample_rate, self.audio_config.sample_rate)
 
-        # 启动专门的音频播放线程
-        self.audio_play_thread = threading.Thread(target=self._audio_play_thread_fn)
-        self.audio_play_thread.daemon = True
-        self.audio_play_thread.start()
+        if loop_driven:
+            self.audio_play_thread = None
+        else:
+            # 启动专门的音频播放线程
+            self.audio_play_thread = threading.Thread(
+                target=self._audio_play_thread_fn, args=(asyncio.get_running_loop(),)
+            )
+            self.audio_play_thread.daemon = True
+            self.audio_play_thread.start()
 
         try:
             while not self.should_exit.is_set():
+                if self.audio_play_thread is not None and not self.audio_play_thread.is_alive():
+                    # 播放线程因音频子进程退出而结束
+                    break
                 if not self.audio_queue.empty():
                     data, is_stream = self.audio_queue.get()
                     self.audio_queue.task_done()
@@ -452,12 +1480,40 @@ class XiaozhiClient:
                     try:
                         if is_stream:
                             # 将音频数据放入缓冲队列
-                            audio_data = np.frombuffer(data, dtype=np.int16)
-                            self.audio_buffer.put(audio_data)
+                            reference = np.frombuffer(data, dtype=np.int16)
+                            audio_data = reference
+                            if self._echo_reference is not None:
+                                if downlink.channels > 1:
+                                    reference = reference.reshape(-1, downlink.channels).mean(axis=1).astype(np.int16)
+                                if reference_resampler is not None:
+                                    reference = reference_resampler.process(reference.astype(np.float32) / 32768.0)
+                            if output_resampler is not None:
+                                resampled = output_resampler.process(audio_data.astype(np.float32) / 32768.0)
+                                audio_data = np.clip(resampled * 32768.0, -32768, 32767).astype(np.int16)
+                            item = (audio_data, reference, self._playback_epoch, time.perf_counter_ns())
+                            if loop_driven:
+                                self._play_item(item)
+                                # 与阻塞写入的设备一样，缓冲超过一帧时等待设备消耗
+                                backlog = self.stream.latency - self.downlink_config.frame_duration / 1000.0
+                                if backlog > 0:
+                                    await asyncio.sleep(backlog)
+                            else:
+                                self.audio_buffer.put(item)
                     except Exception as e:
                         logger.error(f"音频处理错误: {e}")
                 else:
-                    await asyncio.sleep(0.01)
+                    self._audio_wakeup.clear()
+                    if loop_driven:
+                        self._check_abort_silence()
+                    if loop_driven and self.is_playing.is_set():
+                        # 设备缓冲中的音频播完才算播放结束
+                        try:
+                            await asyncio.wait_for(self._audio_wakeup.wait(), self.stream.latency)
+                        except asyncio.TimeoutError:
+                            self.is_playing.clear()
+                            self._check_abort_silence()
+                    else:
+                        await self._audio_wakeup.wait()
         finally:
             if self.stream:
                 self.stream.stop()
@@ -467,6 +1523,14 @@ class XiaozhiClient:
                 self.should_exit.set()
                 self.audio_play_thread.join(timeout=1.0)
 
+        worker = self._audio_worker
+        if worker is not None and not worker.running and not self.should_exit.is_set():
+            # 音频子进程意外退出：释放它，改为在本进程中打开设备继续播放
+            logger.error("音频子进程已退出，改为在本进程中播放")
+            worker.stop()
+            self._audio_worker = None
+            self._audio_task = asyncio.create_task(self._run_audio_player())
+
     async def start_recording(self, silence_threshold: float = 0.01, 
                             silence_frames: int = 5,
                             sound_threshold: float = 0.1):
@@ -483,64 +1547,46 @@ class XiaozhiClient:
         self.is_recording = True
         self.silent_frames_count = 0
         self.recording_buffer = []
+        # 采集线程只把帧交给事件循环，编码、发送和写入录音缓冲都在事件循环中完成
+        channel = LoopChannel(asyncio.get_running_loop())
 
-        def audio_callback(indata, frames, time, status):
-            if status:
-                logger.warning(f"音频输入状态: {status}")
-            
-            if not self.is_recording:
-                return
+        def on_frame(audio_data, rms, timestamp):
+            channel.put((audio_data, rms))
 
-            try:
-                # 计算音频能量
-                audio_data = np.frombuffer(indata, dtype=np.float32)
-                rms = np.sqrt(np.mean(audio_data ** 2))
+        try:
+            self._get_capture_engine().subscribe(on_frame)
+        except Exception as e:
+            logger.error(f"启动录音失败: {e}")
+            self.is_recording = False
+            raise
+        self._recording_subscriber = on_frame
+        self._recording_task = asyncio.create_task(
+            self._process_recording(channel, silence_frames, sound_threshold)
+        )
+        logger.info("开始录音")
+
+        # 发送开始录音的消息
+        await self.start_listen()
 
+    async def _process_recording(self, channel: LoopChannel, silence_frames: int, sound_threshold: float):
+        """发送录音帧并在连续静音后停止录音"""
+        try:
+            while self.is_recording:
+                audio_data, rms = await channel.get()
                 if rms > sound_threshold:
                     self.silent_frames_count = 0
-                    # 将float32数据转换为PCM int16
-                    pcm_data = (audio_data * 32767).astype(np.int16)
-                    # 编码为Opus格式
-                    opus_data = self.encoder.encode(pcm_data.tobytes(), 
-                                                  self.audio_config.frame_size)
-                    if opus_data:
-                        # 使用事件循环发送数据
-                        asyncio.run_coroutine_threadsafe(
-                            self.websocket.send(opus_data), 
-                            asyncio.get_event_loop()
-                        )
-                        self.recording_buffer.append(pcm_data.tobytes())
+                    # 将float32数据转换为PCM int16保存
+                    self.recording_buffer.append((audio_data * 32767).astype(np.int16).tobytes())
+                    await self.send_audio(audio_data, rms=rms, paced=False)
                 else:
                     self.silent_frames_count += 1
                     if self.silent_frames_count >= silence_frames:
-                        # 停止录音
-                        asyncio.run_coroutine_threadsafe(
-                            self.stop_recording(),
-                            asyncio.get_event_loop()
-                        )
-
-            except Exception as e:
-                logger.error(f"录音处理错误: {e}")
-
-        try:
-            # 启动录音流
-            self.recording_stream = sd.InputStream(
-                channels=self.audio_config.channels,
-                samplerate=self.audio_config.sample_rate,
-                callback=audio_callback,
-                dtype=np.float32,
-                blocksize=self.audio_config.frame_size
-            )
-            self.recording_stream.start()
-            logger.info("开始录音")
-
-            # 发送开始录音的消息
-            await self.start_listen()
-
+                        await self.stop_recording()
+                        return
+        except asyncio.CancelledError:
+            pass
         except Exception as e:
-            logger.error(f"启动录音失败: {e}")
-            self.is_recording = False
-            raise
+            logger.error(f"录音处理错误: {e}")
 
     async def stop_recording(self):
         """停止录音"""
@@ -548,18 +1594,35 @@ class XiaozhiClient:
             return
 
         self.is_recording = False
-        if self.recording_stream:
-            self.recording_stream.stop()
-            self.recording_stream.close()
-            self.recording_stream = None
+        if self._recording_subscriber is not None:
+            self._get_capture_engine().unsubscribe(self._recording_subscriber)
+            self._recording_subscriber = None
+        task = self._recording_task
+        self._recording_task = None
+        # 静音自动停止时由录音任务自身调用，不能取消并等待自己
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
 
         # 保存录音文件
         try:
             if self.recording_buffer:
-                timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-                filepath = os.path.join(self.audio_dir, f'recorded_{timestamp}.wav')
-                save_wav(filepath, b''.join(self.recording_buffer))
+                filepath = unique_wav_path(self.audio_dir, 'recorded_')
+                write_wav(
+                    filepath,
+                    b''.join(self.recording_buffer),
+                    sample_rate=self.audio_config.sample_rate,
+                    channels=self.audio_config.channels
+                )
                 logger.info(f"录音已保存: {filepath}")
+                if self._archive is not None:
+                    # 录音结束时识别结果尚未返回，先挂在下一轮上
+                    self._archive_current(new_turn=True).add_audio(
+                        'uplink', filepath, self.audio_config.sample_rate, self.audio_config.channels
+                    )
         except Exception as e:
             logger.error(f"保存录音失败: {e}")
 
@@ -570,11 +1633,11 @@ class XiaozhiClient:
     def check_audio_input(self) -> bool:
         """检查是否有可用的音频输入设备"""
         try:
-            with sd.InputStream(
+            with self._open_input_stream(
                 channels=self.audio_config.channels,
-                samplerate=self.audio_config.sample_rate,
+                samplerate=self._device_sample_rate(),
                 dtype=np.float32,
-                blocksize=self.audio_config.frame_size
+                blocksize=self._device_block_size()
             ) as stream:
                 return True
         except Exception as e:
@@ -586,53 +1649,41 @@ class XiaozhiClient:
         logger.debug("开始启动语音输入")
         
         # 先确保之前的资源被清理
-        if self._input_stream is not None:
-            logger.debug("检测到已存在语音输入流，先停止它")
+        if self._input_subscriber is not None:
+            logger.debug("检测到已存在语音输入，先停止它")
             await self.stop_voice_input()
         
-        if not self.check_audio_input():
+        # 采集引擎已在运行（录音或电平表）时设备必然可用，不再重复打开设备检查
+        engine = self._get_capture_engine()
+        if not engine.running and not self.check_audio_input():
             raise RuntimeError("未检测到可用的音频输入设备")
 
         self._input_running.set()
         self._input_paused.clear()
-        self._last_audio_sent_time = time.time()
+        self._last_audio_sent_time = self._clock()
         self._consecutive_silence_frames = 0
+        # 排队上限需小于采集引擎帧池的槽位数减2，排队中的帧才不会被覆盖
+        channel = LoopChannel(asyncio.get_running_loop(), maxsize=128)
+        self._input_queue = channel
+        quiet_frames = 0  # 采集线程中的连续静音计数，只用于限制静音帧的入队数量
 
-        def input_callback(indata, frames, time, status):
-            if status or self._input_paused.is_set():
+        def on_frame(audio_data, rms, enqueued):
+            nonlocal quiet_frames
+            if self._input_paused.is_set():
                 return
-                
-            try:
-                audio_data = indata.reshape(-1).astype(np.float32)
-                rms = np.sqrt(np.mean(np.square(audio_data)))
-                
-                # 如果是有效声音，直接发送
-                if rms > self._silence_threshold:
-                    try:
-                        self._input_queue.put_nowait((audio_data, rms))
-                        self._consecutive_silence_frames = 0
-                    except Full:
-                        pass
-                else:
-                    # 如果是静音，记录并适时发送静音帧
-                    self._consecutive_silence_frames += 1
-                    if self._consecutive_silence_frames <= self._max_silence_frames:
-                        try:
-                            self._input_queue.put_nowait((audio_data * 0.01, rms))
-                        except Full:
-                            pass
-            except Exception as e:
-                logger.debug(f"音频处理错误: {e}")
+            # 如果是有效声音，直接发送
+            if rms > self._silence_threshold:
+                quiet_frames = 0
+                channel.put((audio_data, rms, enqueued))
+            else:
+                # 如果是静音，只在语音结束判定前发送静音帧（衰减在编码时完成）
+                quiet_frames += 1
+                if quiet_frames <= self._max_silence_frames:
+                    channel.put((audio_data, rms, enqueued))
             
         try:
-            self._input_stream = sd.InputStream(
-                channels=self.audio_config.channels,
-                samplerate=self.audio_config.sample_rate,
-                callback=input_callback,
-                dtype=np.float32,
-                blocksize=self.audio_config.frame_size
-            )
-            self._input_stream.start()
+            engine.subscribe(on_frame)
+            self._input_subscriber = on_frame
             
             if self._input_task and not self._input_task.done():
                 self._input_task.cancel()
@@ -658,45 +1709,52 @@ class XiaozhiClient:
             recording = False  # 添加录音状态标记
             frames_sent = 0
             
+            channel = self._input_queue
             while self._input_running.is_set():
                 try:
-                    while not self._input_queue.empty() and self._input_running.is_set():
-                        audio_data, rms = self._input_queue.get_nowait()
-                        
-                        if not self._input_paused.is_set():
-                            # 如果音频强度超过阈值，进入录音状态
-                            if rms > self._silence_threshold:
-                                if not recording:
-                                    logger.debug(f"检测到声音开始，能量: {rms:.5f}")
-                                    recording = True
-                                    # 发送开始录音消息
-                                    await self.start_listen()
+                    audio_data, rms, enqueued = await channel.get()
+                    profiler = self._profiler
+                    if profiler is not None:
+                        started = time.perf_counter_ns()
+                        profiler.record(Stage.CAPTURE_WAIT, started - enqueued)
+                    
+                    if not self._input_paused.is_set():
+                        # 播放期间检测用户插话
+                        if self._barge_in is not None and self._is_tts_playing():
+                            echo_rms = self._echo_canceller.echo_rms if self._echo_canceller else 0.0
+                            if self._barge_in.update(rms, echo_rms):
+                                await self._handle_barge_in()
+
+                        # 如果音频强度超过阈值，进入录音状态
+                        if rms > self._silence_threshold:
+                            if not recording:
+                                logger.debug(f"检测到声音开始，能量: {rms:.5f}")
+                                recording = True
+                                # 发送开始录音消息
+                                await self.start_listen()
+                            
+                            # 直接发送音频数据
+                            await self.send_audio(audio_data, rms=rms, paced=False)
+                            frames_sent += 1
+                            self._last_audio_sent_time = self._clock()
+                            self._consecutive_silence_frames = 0
+                        else:
+                            if recording:
+                                self._consecutive_silence_frames += 1
+                                # 发送低音量帧以触发服务端静音检测
+                                await self.send_audio(audio_data, rms=rms, gain=0.01, paced=False)
                                 
-                                # 直接发送音频数据
-                                await self.send_audio(audio_data)
-                                frames_sent += 1
-                                self._last_audio_sent_time = time.time()
-                                self._consecutive_silence_frames = 0
-                            else:
-                                if recording:
-                                    self._consecutive_silence_frames += 1
-                                    # 发送低音量帧以触发服务端静音检测
-                                    await self.send_audio(audio_data * 0.01)
-                                    
-                                    # 如果连续静音帧达到阈值，结束录音
-                                    if self._consecutive_silence_frames >= self._max_silence_frames:
-                                        logger.debug(f"检测到语音结束，已发送 {frames_sent} 帧")
-                                        recording = False
-                                        frames_sent = 0
-                                        # 发送停止录音消息
-                                        await self.stop_listen()
-                        
-                        self._input_queue.task_done()
-                        
-                    await asyncio.sleep(0.001)
+                                # 如果连续静音帧达到阈值，结束录音
+                                if self._consecutive_silence_frames >= self._max_silence_frames:
+                                    logger.debug(f"检测到语音结束，已发送 {frames_sent} 帧")
+                                    recording = False
+                                    frames_sent = 0
+                                    # 发送停止录音消息
+                                    await self.stop_listen()
+                    
+                    if profiler is not None:
+                        profiler.record(Stage.PROCESS_INPUT, time.perf_counter_ns() - started)
                     
-                except Empty:
-                    continue
                 except Exception as e:
                     logger.error(f"处理音频帧错误: {e}")
                     
@@ -708,6 +1766,109 @@ class XiaozhiClient:
         except Exception as e:
             logger.error(f"音频输入处理任务异常: {e}")
 
+    def _is_tts_playing(self) -> bool:
+        """服务端仍在下发TTS或本地仍在播放"""
+        return self._tts_active or self.is_playing.is_set()
+
+    async def _handle_barge_in(self):
+        """用户在播放期间插话：中止当前对话"""
+        if self._trace is not None:
+            self._trace.record(TraceEvent.BARGE_IN)
+        logger.info("检测到用户插话，中止当前播放")
+        await self.abort()
+        if self.on_barge_in:
+            await self.on_barge_in()
+
+    def enable_echo_cancellation(self, enabled=True, barge_in=True, filter_length_ms=300,
+                                 step_size=0.8, barge_in_threshold=0.03, barge_in_frames=3,
+                                 dtd_threshold=0.5):
+        """启用或禁用回声消除，启用后播放期间无需暂停语音输入
+
+        Args:
+            enabled: 是否启用回声消除
+            barge_in: 是否在播放期间检测用户插话并自动调用abort()
+            filter_length_ms: 可消除的回声路径长度（毫秒）
+            step_size: 自适应滤波步长
+            barge_in_threshold: 插话判定的最小强度（回声消除后）
+            barge_in_frames: 插话判定需连续满足的帧数
+            dtd_threshold: 双讲检测阈值，麦克风峰值超过播放峰值的该比例时冻结滤波器更新
+        """
+        if not enabled:
+            self._echo_canceller = None
+            self._echo_reference = None
+            self._barge_in = None
+            logger.debug("回声消除已禁用")
+            return
+
+        if self.audio_config.channels != 1:
+            raise ValueError("回声消除仅支持单声道")
+        sample_rate = self.audio_config.sample_rate
+        frame_size = self.audio_config.frame_size
+        # 处理块长取帧长的约数，控制单次FFT规模
+        block_size = frame_size
+        while block_size > 512 and block_size % 2 == 0:
+            block_size //= 2
+
+        self._echo_reference_frame = np.zeros(frame_size, dtype=np.float32)
+        self._echo_reference = EchoReference(sample_rate)
+        self._echo_canceller = EchoCanceller(
+            block_size=block_size,
+            filter_length=sample_rate * filter_length_ms // 1000,
+            step_size=step_size,
+            dtd_threshold=dtd_threshold
+        )
+        self._barge_in = BargeInDetector(barge_in_threshold, barge_in_frames) if barge_in else None
+        logger.debug(f"回声消除设置: 块长={block_size}, 滤波器={filter_length_ms}ms, 插话检测={barge_in}")
+
+    def _condition_input(self, audio_data: np.ndarray):
+        """在采集线程中原地预处理一帧，未启用时不做任何事"""
+        conditioner = self._input_conditioner
+        if conditioner is None:
+            return
+        conditioner.process(audio_data)
+        profiler = self._profiler
+        if profiler is not None:
+            profiler.record(Stage.CONDITION, conditioner.last_cost_ns)
+
+    @property
+    def input_conditioner(self) -> Optional[InputConditioner]:
+        """输入预处理链，可用于查看每块耗时和当前增益"""
+        return self._input_conditioner
+
+    def enable_input_conditioning(self, enabled=True, highpass_cutoff=80.0, noise_suppression=True,
+                                  agc=True, over_subtraction=2.0, agc_target=0.1, agc_max_gain=10.0):
+        """启用或禁用麦克风输入预处理，处理后的音频再做静音检测和编码
+
+        Args:
+            enabled: 是否启用预处理
+            highpass_cutoff: 高通截止频率（Hz），去除直流和低频嗡声，None表示不滤波
+            noise_suppression: 是否启用谱减降噪
+            agc: 是否启用自动增益
+            over_subtraction: 降噪过减因子，越大降噪越强
+            agc_target: 自动增益的目标强度
+            agc_max_gain: 自动增益的最大增益
+        """
+        if not enabled:
+            self._input_conditioner = None
+            logger.debug("输入预处理已禁用")
+            return
+
+        if self.audio_config.channels != 1:
+            raise ValueError("输入预处理仅支持单声道")
+        self._input_conditioner = InputConditioner(
+            self.audio_config.sample_rate,
+            block_size=self.audio_config.frame_size,
+            highpass_cutoff=highpass_cutoff,
+            noise_suppression=noise_suppression,
+            agc=agc,
+            over_subtraction=over_subtraction,
+            agc_target=agc_target,
+            agc_max_gain=agc_max_gain
+        )
+        logger.debug(
+            f"输入预处理设置: 高通={highpass_cutoff}Hz, 降噪={noise_suppression}, 自动增益={agc}"
+        )
+
     def pause_voice_input(self):
         """暂停语音输入"""
         logger.debug("暂停语音输入")
@@ -718,17 +1879,10 @@ class XiaozhiClient:
         logger.debug("恢复语音输入")
         self._input_paused.clear()
         self._consecutive_silence_frames = 0
-        self._last_audio_sent_time = time.time()
+        self._last_audio_sent_time = self._clock()
         
         # 清空积累的队列数据
-        items_cleared = 0
-        while True:
-            try:
-                self._input_queue.get_nowait()
-                self._input_queue.task_done()
-                items_cleared += 1
-            except Empty:
-                break
+        items_cleared = self._input_queue.clear() if self._input_queue is not None else 0
         
         # 确保开始新的录音会话
         if items_cleared > 0:
@@ -753,22 +1907,18 @@ class XiaozhiClient:
                 pass
             self._input_task = None
         
-        if self._input_stream:
-            self._input_stream.stop()
-            self._input_stream.close()
-            self._input_stream = None
+        if self._input_subscriber is not None:
+            self._get_capture_engine().unsubscribe(self._input_subscriber)
+            self._input_subscriber = None
             
         # 重置所有状态
         self._consecutive_silence_frames = 0
         self._last_audio_sent_time = 0
         
         # 清空所有队列
-        while True:
-            try:
-                self._input_queue.get_nowait()
-                self._input_queue.task_done()
-            except Empty:
-                break
+        if self._input_queue is not None:
+            self._input_queue.clear()
+            self._input_queue = None
             
         while not self._audio_input_queue.empty():
             try:
@@ -790,5 +1940,5 @@ class XiaozhiClient:
         self._max_silence_frames = max_frames
         # 重置相关计数器
         self._consecutive_silence_frames = 0
-        self._last_audio_sent_time = time.time()
+        self._last_audio_sent_time = self._clock()
         logger.debug(f"静音检测设置: 启用={enabled}, 阈值={threshold}, 最大帧数={max_frames}")
\ No newline at end of file
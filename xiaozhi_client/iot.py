@@ -0,0 +1,422 @@
+import math
+import asyncio
+import inspect
+import functools
+from dataclasses import asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from .types import IoTDescriptor, IoTMethod, IoTProperty, MessageType
+
+
+class IoTError(ValueError):
+    """IoT命令无法执行：设备或方法不存在，或参数不合法"""
+
+
+def _to_number(value: Any):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError(f"需要number, 实际为{type(value).__name__}")
+    return value
+
+
+def _to_boolean(value: Any) -> bool:
+    if not isinstance(value, bool):
+        raise TypeError(f"需要boolean, 实际为{type(value).__name__}")
+    return value
+
+
+def _to_string(value: Any) -> str:
+    if not isinstance(value, str):
+        raise TypeError(f"需要string, 实际为{type(value).__name__}")
+    return value
+
+
+def _is_async_callable(handler: Callable) -> bool:
+    """handler调用后是否返回协程：解开functools.partial，并识别定义了async __call__的对象"""
+    while isinstance(handler, functools.partial):
+        handler = handler.func
+    if inspect.iscoroutinefunction(handler):
+        return True
+    call = getattr(handler, "__call__", None)
+    return not inspect.isroutine(handler) and inspect.iscoroutinefunction(call)
+
+
+# 协议中的参数类型 -> 校验函数
+_VALIDATORS: Dict[str, Callable[[Any], Any]] = {
+    "number": _to_number,
+    "boolean": _to_boolean,
+    "string": _to_string,
+}
+
+
+class _MethodEntry:
+    """预编译的方法分发条目：注册时即解析好参数校验器和调用方式"""
+
+    __slots__ = ("device", "method", "handler", "params", "is_async")
+
+    def __init__(self, device: str, method: str, parameters: Dict[str, IoTProperty], handler: Callable):
+        self.device = device
+        self.method = method
+        self.handler = handler
+        self.params: Tuple[Tuple[str, Callable[[Any], Any]], ...] = tuple(
+            (name, _VALIDATORS[prop.type]) for name, prop in parameters.items()
+        )
+        self.is_async = _is_async_callable(handler)
+
+    def bind(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """校验参数并返回handler的关键字参数"""
+        kwargs = {}
+        for name, validate in self.params:
+            if name not in arguments:
+                raise IoTError(f"{self.device}.{self.method} 缺少参数: {name}")
+            try:
+                kwargs[name] = validate(arguments[name])
+            except TypeError as e:
+                raise IoTError(f"{self.device}.{self.method} 参数 {name} 类型错误: {e}")
+        return kwargs
+
+
+class IoTRegistry:
+    """IoT设备注册表
+
+    应用声明设备、属性和方法，客户端在hello之后上报设备描述；服务端下发的命令按
+    (设备名, 方法名)直接查表得到预编译的分发条目，校验参数后在后台执行handler，
+    同步handler在线程池中运行，不会阻塞消息处理。
+
+    Example:
+        registry = client.iot
+        registry.add_device("Lamp", "一盏台灯")
+        registry.add_property("Lamp", "power", "灯是否打开", "boolean", getter=lambda: lamp.on)
+        registry.add_method("Lamp", "TurnOn", "打开灯", {}, lamp.turn_on)
+        registry.add_method("Lamp", "SetBrightness", "设置亮度",
+                            {"brightness": IoTProperty("0到100的整数", "number")}, lamp.set_brightness)
+    """
+
+    def __init__(self):
+        self._devices: Dict[str, IoTDescriptor] = {}
+        self._getters: Dict[str, Dict[str, Callable[[], Any]]] = {}
+        self._methods: Dict[Tuple[str, str], _MethodEntry] = {}
+        self._tasks: Set[asyncio.Future] = set()
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._devices
+
+    def add_device(self, name: str, description: str) -> IoTDescriptor:
+        """声明一个设备，重复声明返回已有的描述"""
+        descriptor = self._devices.get(name)
+        if descriptor is None:
+            descriptor = IoTDescriptor(name, description, {}, {})
+            self._devices[name] = descriptor
+            self._getters[name] = {}
+        return descriptor
+
+    def add_property(self, device: str, name: str, description: str, type: str,
+                     getter: Optional[Callable[[], Any]] = None):
+        """声明设备属性
+
+        Args:
+            device: 设备名称，需先调用add_device
+            name: 属性名称
+            description: 属性描述
+            type: "number"、"boolean"或"string"
+            getter: 读取当前值的函数，用于上报设备状态
+        """
+        if type not in _VALIDATORS:
+            raise ValueError(f"不支持的属性类型: {type}")
+        self._device(device).properties[name] = IoTProperty(description, type)
+        if getter is not None:
+            self._getters[device][name] = getter
+
+    def add_method(self, device: str, name: str, description: str,
+                   parameters: Dict[str, IoTProperty], handler: Callable):
+        """声明设备方法
+
+        Args:
+            device: 设备名称，需先调用add_device
+            name: 方法名称
+            description: 方法描述
+            parameters: 参数名 -> IoTProperty(描述, 类型)
+            handler: 以参数名作为关键字参数调用的函数；协程函数、其functools.partial或定义了
+                async __call__的对象在事件循环中执行，其余在线程池中执行
+        """
+        for param, prop in parameters.items():
+            if prop.type not in _VALIDATORS:
+                raise ValueError(f"参数 {param} 的类型不受支持: {prop.type}")
+        self._device(device).methods[name] = IoTMethod(
+            description, {param: asdict(prop) for param, prop in parameters.items()}
+        )
+        self._methods[(device, name)] = _MethodEntry(device, name, parameters, handler)
+
+    def remove_device(self, name: str):
+        self._devices.pop(name, None)
+        self._getters.pop(name, None)
+        for key in [key for key in self._methods if key[0] == name]:
+            del self._methods[key]
+
+    def _device(self, name: str) -> IoTDescriptor:
+        descriptor = self._devices.get(name)
+        if descriptor is None:
+            raise KeyError(f"未注册的IoT设备: {name}")
+        return descriptor
+
+    def descriptors(self) -> List[IoTDescriptor]:
+        return list(self._devices.values())
+
+    def descriptor_message(self, session_id: Optional[str] = None) -> dict:
+        """构造上报设备描述的消息"""
+        return {
+            "session_id": session_id,
+            "type": MessageType.IOT.value,
+            "update": True,
+            "descriptors": [asdict(descriptor) for descriptor in self._devices.values()],
+        }
+
+    def read_state(self, device: str) -> Dict[str, Any]:
+        """通过getter读取设备当前的全部属性值"""
+        return {name: getter() for name, getter in self._getters.get(device, {}).items()}
+
+    def states(self) -> List[Dict[str, Any]]:
+        """全部设备的当前状态"""
+        return [
+            {"name": device, "state": self.read_state(device)}
+            for device, getters in self._getters.items() if getters
+        ]
+
+    def state_message(self, session_id: Optional[str] = None,
+                      states: Optional[List[Dict[str, Any]]] = None) -> dict:
+        """构造上报设备状态的消息，states为None时上报全部设备"""
+        return {
+            "session_id": session_id,
+            "type": MessageType.IOT.value,
+            "update": True,
+            "states": self.states() if states is None else states,
+        }
+
+    def resolve(self, command: Dict[str, Any]) -> Tuple[_MethodEntry, Dict[str, Any]]:
+        """把一条命令解析为(分发条目, 已校验的参数)"""
+        entry = self._methods.get((command.get("name"), command.get("method")))
+        if entry is None:
+            raise IoTError(f"未注册的IoT方法: {command.get('name')}.{command.get('method')}")
+        return entry, entry.bind(command.get("parameters") or {})
+
+    def dispatch(self, command: Dict[str, Any]) -> asyncio.Future:
+        """在后台执行一条命令，立即返回代表执行结果的Future，须在事件循环中调用"""
+        entry, kwargs = self.resolve(command)
+        future = asyncio.ensure_future(self._execute(entry, kwargs))
+        self._tasks.add(future)
+        future.add_done_callback(lambda done: self._finish(entry, done))
+        return future
+
+    @staticmethod
+    async def _execute(entry: _MethodEntry, kwargs: Dict[str, Any]) -> Any:
+        """异步handler在事件循环中执行，同步handler在线程池中执行"""
+        if entry.is_async:
+            result = entry.handler(**kwargs)
+        else:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(None, lambda: entry.handler(**kwargs))
+        # 注册时无法识别的异步handler（如返回协程的普通函数）在这里补上await，不会静默丢弃
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    def _finish(self, entry: _MethodEntry, future: asyncio.Future):
+        self._tasks.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"IoT方法 {entry.device}.{entry.method} 执行失败: {future.exception()}")
+
+    async def wait_idle(self):
+        """等待所有正在执行的命令完成"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def cancel_all(self):
+        for future in list(self._tasks):
+            future.cancel()
+
+
+class IoTStateSync:
+    """IoT属性的增量状态同步
+
+    记录每个属性最近一次上报的值，只上报发生变化的属性；同一窗口内的多次变化合并为一条
+    states消息（同一属性取最后的值，变回已上报值的属性不再上报）。每个设备有上报频率上限，
+    用户可感知的变化可以优先立即上报。须在事件循环线程中调用，其他线程使用update_threadsafe。
+
+    Example:
+        client.iot_state.update("Speaker", "volume", 80)
+        client.iot_state.update("Lamp", "power", True, priority=True)
+    """
+
+    def __init__(self, registry: IoTRegistry, send: Callable[[dict], Awaitable[None]],
+                 session_id: Callable[[], Optional[str]] = lambda: None,
+                 window: float = 0.1, max_rate: float = 5.0):
+        """
+        Args:
+            registry: 设备注册表，用于poll和全量上报时读取属性
+            send: 发送消息的协程函数
+            session_id: 返回当前会话ID的函数
+            window: 合并窗口（秒），窗口内的变化合并为一条消息
+            max_rate: 每个设备默认的最高上报频率（次/秒）
+        """
+        self.registry = registry
+        self.window = window
+        self.max_rate = max_rate
+        self._send = send
+        self._session_id = session_id
+        self._sent: Dict[str, Dict[str, Any]] = {}  # 已上报的值
+        self._pending: Dict[str, Dict[str, Any]] = {}  # 待上报的变化
+        self._pending_since: Dict[str, float] = {}
+        self._last_flush: Dict[str, float] = {}
+        self._intervals: Dict[str, float] = {}
+        self._priority: Set[str] = set()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_at = math.inf
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self.updates = 0  # 收到的属性更新数
+        self.messages = 0  # 发出的states消息数
+
+    def set_rate_limit(self, device: str, max_rate: Optional[float]):
+        """设置设备的最高上报频率（次/秒），None恢复默认值"""
+        if max_rate is None:
+            self._intervals.pop(device, None)
+        else:
+            self._intervals[device] = 1.0 / max_rate if max_rate > 0 else 0.0
+
+    def _interval(self, device: str) -> float:
+        interval = self._intervals.get(device)
+        if interval is None:
+            interval = 1.0 / self.max_rate if self.max_rate > 0 else 0.0
+        return interval
+
+    def _due(self, device: str) -> float:
+        return max(self._pending_since[device] + self.window,
+                   self._last_flush.get(device, -math.inf) + self._interval(device))
+
+    def update(self, device: str, name: str, value: Any, priority: bool = False):
+        """记录一个属性的新值
+
+        Args:
+            device: 设备名称
+            name: 属性名称
+            value: 新值
+            priority: 是否为用户可感知的变化，为True时忽略合并窗口和频率上限立即上报
+        """
+        self.updates += 1
+        sent = self._sent.get(device)
+        if sent is not None and name in sent and sent[name] == value:
+            # 变回已上报的值，不需要再上报；保留窗口起点，避免来回变化的属性一直推迟上报
+            pending = self._pending.get(device)
+            if pending is not None:
+                pending.pop(name, None)
+            return
+        loop = self._loop = asyncio.get_running_loop()
+        pending = self._pending.get(device)
+        if pending is None:
+            pending = self._pending[device] = {}
+            self._pending_since[device] = loop.time()
+        pending[name] = value
+        if priority:
+            self._priority.add(device)
+            self._schedule(loop.time())
+        else:
+            self._schedule(self._due(device))
+
+    def update_threadsafe(self, loop: asyncio.AbstractEventLoop, device: str, name: str,
+                          value: Any, priority: bool = False):
+        """在其他线程中记录属性的新值"""
+        loop.call_soon_threadsafe(self.update, device, name, value, priority)
+
+    def poll(self):
+        """通过注册表中的getter读取全部属性，把变化记为待上报"""
+        for entry in self.registry.states():
+            device = entry["name"]
+            for name, value in entry["state"].items():
+                self.update(device, name, value)
+
+    def _drop_pending(self, device: str):
+        self._pending.pop(device, None)
+        self._pending_since.pop(device, None)
+        self._priority.discard(device)
+
+    def _schedule(self, when: float):
+        if when >= self._timer_at:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_at = when
+        self._timer = self._loop.call_at(when, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._timer_at = math.inf
+        task = self._loop.create_task(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self, force: bool = False):
+        """上报已到期的变化，force为True时上报全部待上报的变化"""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        now = self._loop.time()
+        ready = [
+            device for device in self._pending
+            if force or device in self._priority or self._due(device) <= now
+        ]
+        states = []
+        for device in ready:
+            if self._pending[device]:
+                states.append({"name": device, "state": self._pending[device]})
+                self._last_flush[device] = now
+            self._drop_pending(device)
+        if states:
+            try:
+                await self._send(self.registry.state_message(self._session_id(), states))
+            except Exception as e:
+                logger.warning(f"IoT状态上报失败: {e}")
+                for entry in states:
+                    # 发送失败的变化放回待上报，期间更新过的属性以新值为准
+                    device = entry["name"]
+                    newer = self._pending.get(device)
+                    self._pending[device] = {**entry["state"], **(newer or {})}
+                    self._pending_since.setdefault(device, now)
+            else:
+                self.messages += 1
+                for entry in states:
+                    self._sent.setdefault(entry["name"], {}).update(entry["state"])
+        if self._pending:
+            self._schedule(min(self._due(device) for device in self._pending))
+
+    async def send_full(self):
+        """上报全部设备的当前状态并作为增量比较的基准，用于新会话开始时"""
+        states = self.registry.states()
+        for entry in states:
+            self._drop_pending(entry["name"])
+        if not states:
+            return
+        await self._send(self.registry.state_message(self._session_id(), states))
+        self.messages += 1
+        now = asyncio.get_running_loop().time()
+        for entry in states:
+            self._sent[entry["name"]] = dict(entry["state"])
+            self._last_flush[entry["name"]] = now
+
+    def cancel(self):
+        """取消计划中的上报，保留待上报的变化"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._timer_at = math.inf
+
+    def reset(self):
+        """清空已上报和待上报的状态"""
+        self.cancel()
+        self._sent.clear()
+        self._pending.clear()
+        self._pending_since.clear()
+        self._last_flush.clear()
+        self._priority.clear()
@@ -0,0 +1,137 @@
+import asyncio
+from collections import deque
+from typing import Callable, Deque, NamedTuple, Optional, Union
+
+import numpy as np
+import opuslib
+
+from .types import AudioConfig
+
+
+class TtsBoundary(NamedTuple):
+    """TTS流中的边界事件"""
+    state: str  # "start"、"sentence_start"、"stop"或"abort"
+    text: Optional[str] = None  # sentence_start时为句子文本
+
+
+TtsChunk = Union[memoryview, np.ndarray, TtsBoundary]
+
+
+class TtsStream:
+    """TTS音频的异步迭代流
+
+    接收路径直接把原始Opus包推入有界缓冲区，不经过pcm_buffer和播放队列。
+    format为"opus"时产出包的memoryview；为"pcm"时在迭代时用独立的解码器解码，
+    产出int16的NumPy视图（多声道时形状为(帧数, 声道数)）。缓冲区满时丢弃最旧的音频包，
+    边界事件不会被丢弃。
+
+    Example:
+        async with client.tts_stream(format="pcm") as stream:
+            async for chunk in stream:
+                if isinstance(chunk, TtsBoundary):
+                    ...
+                else:
+                    sink.write(chunk)
+    """
+
+    def __init__(self, audio_config: AudioConfig, format: str = "pcm", max_chunks: int = 256,
+                 on_close: Optional[Callable[["TtsStream"], None]] = None):
+        """
+        Args:
+            audio_config: 下行音频参数
+            format: "opus"产出原始包的memoryview，"pcm"产出解码后的int16 NumPy视图
+            max_chunks: 缓冲的最大音频包数，超出时丢弃最旧的包
+            on_close: 关闭时以流本身为参数调用一次，客户端用来取消订阅
+        """
+        if format not in ("opus", "pcm"):
+            raise ValueError(f"不支持的格式: {format}")
+        self.format = format
+        self.max_chunks = max_chunks
+        self.dropped = 0  # 因缓冲区满或解码失败丢弃的音频包数
+        self.set_audio_config(audio_config)
+        self._items: Deque[Union[bytes, TtsBoundary]] = deque()
+        self._audio_items = 0
+        self._ready = asyncio.Event()
+        self._closed = False
+        self._on_close = on_close
+
+    def set_audio_config(self, audio_config: AudioConfig):
+        """设置下行音频参数，服务端协商出新的参数时由客户端调用"""
+        self.sample_rate = audio_config.sample_rate
+        self._decode_size = audio_config.max_decode_size
+        self._channels = audio_config.channels
+        self._decoder = opuslib.Decoder(audio_config.sample_rate, audio_config.channels) if self.format == "pcm" else None
+
+    def feed_audio(self, packet: bytes):
+        """推入一个Opus包，在事件循环线程中调用"""
+        if self._closed:
+            return
+        if self._audio_items >= self.max_chunks:
+            for i, item in enumerate(self._items):
+                if not isinstance(item, TtsBoundary):
+                    del self._items[i]
+                    self._audio_items -= 1
+                    self.dropped += 1
+                    break
+        self._items.append(packet)
+        self._audio_items += 1
+        self._ready.set()
+
+    def feed_boundary(self, boundary: TtsBoundary):
+        if self._closed:
+            return
+        if boundary.state == "abort":
+            # 中止时丢弃尚未取走的音频，下游立即停止输出
+            self._items = deque(item for item in self._items if isinstance(item, TtsBoundary))
+            self._audio_items = 0
+        self._items.append(boundary)
+        self._ready.set()
+
+    def close(self):
+        """结束迭代并从客户端注销"""
+        if self._closed:
+            return
+        self._closed = True
+        self._ready.set()
+        if self._on_close is not None:
+            self._on_close(self)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> TtsChunk:
+        while True:
+            while not self._items:
+                if self._closed:
+                    raise StopAsyncIteration
+                self._ready.clear()
+                await self._ready.wait()
+            item = self._items.popleft()
+            if isinstance(item, TtsBoundary):
+                if item.state == "start" and self._decoder is not None:
+                    self._decoder.reset_state()
+                return item
+            self._audio_items -= 1
+            if self._decoder is None:
+                return memoryview(item)
+            try:
+                pcm = np.frombuffer(self._decoder.decode(item, self._decode_size), dtype=np.int16)
+            except opuslib.OpusError:
+                # 单个损坏的包不结束迭代：重置解码器，丢弃该包后继续
+                self._decoder.reset_state()
+                self.dropped += 1
+                continue
+            return pcm.reshape(-1, self._channels) if self._channels > 1 else pcm
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
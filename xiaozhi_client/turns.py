@@ -0,0 +1,88 @@
+import time
+import asyncio
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from .types import MessageType
+
+
+@dataclass
+class TurnResult:
+    """一次文本对话轮次的结果与耗时，耗时均为相对发送请求的秒数"""
+    text: str  # 发送的文本
+    stt: Optional[str] = None  # 服务端识别/回显的文本
+    llm: List[dict] = field(default_factory=list)  # llm消息（表情等）
+    sentences: List[str] = field(default_factory=list)  # TTS句子文本
+    messages: List[dict] = field(default_factory=list)  # 本轮收到的全部相关消息
+    first_response: Optional[float] = None  # 首条相关消息
+    first_sentence: Optional[float] = None  # 首个TTS句子
+    latency: Optional[float] = None  # 收到tts stop
+    aborted: bool = False  # 超时、取消或提前结束而被中止
+
+    @property
+    def reply(self) -> str:
+        """拼接后的回复文本"""
+        return "".join(self.sentences)
+
+
+# 属于一个对话轮次的消息类型
+TURN_MESSAGE_TYPES = (MessageType.STT.value, MessageType.LLM.value, MessageType.TTS.value)
+
+
+class Turn:
+    """进行中的文本对话轮次
+
+    协议中没有请求ID，服务端按顺序逐轮处理，因此同一时刻只有一个进行中的轮次，
+    期间收到的stt/llm/tts消息都归属于它，收到tts stop时结束。
+    """
+
+    def __init__(self, text: str, stream: bool = False, clock: Callable[[], float] = time.perf_counter):
+        self.result = TurnResult(text)
+        self._clock = clock
+        self.done = asyncio.Event()
+        self.error: Optional[BaseException] = None
+        # 流式轮次把消息放入队列，None表示结束
+        self.queue: Optional[asyncio.Queue] = asyncio.Queue() if stream else None
+        self._started = clock()
+
+    def start(self):
+        """记录请求发出的时间"""
+        self._started = self._clock()
+
+    def feed(self, msg_data: dict):
+        """接收一条消息，返回本轮是否已结束"""
+        if self.done.is_set():
+            return True
+        elapsed = self._clock() - self._started
+        result = self.result
+        result.messages.append(msg_data)
+        if result.first_response is None:
+            result.first_response = elapsed
+        msg_type = msg_data.get('type')
+        state = msg_data.get('state')
+        if msg_type == MessageType.STT.value:
+            result.stt = msg_data.get('text')
+        elif msg_type == MessageType.LLM.value:
+            result.llm.append(msg_data)
+        elif state == 'sentence_start':
+            result.sentences.append(msg_data.get('text', ''))
+            if result.first_sentence is None:
+                result.first_sentence = elapsed
+        if self.queue is not None:
+            self.queue.put_nowait(msg_data)
+        if msg_type == MessageType.TTS.value and state == 'stop':
+            result.latency = elapsed
+            self._finish()
+            return True
+        return False
+
+    def fail(self, error: BaseException):
+        """以错误结束本轮，例如连接断开"""
+        if not self.done.is_set():
+            self.error = error
+            self._finish()
+
+    def _finish(self):
+        self.done.set()
+        if self.queue is not None:
+            self.queue.put_nowait(None)
@@ -17,6 +17,16 @@ class MessageType(Enum):
     LLM = "llm"
     STT= "stt"
 
+class AudioReceiveMode(Enum):
+    PLAY = "play"  # 解码并播放，TTS结束时保存WAV
+    ENCODED = "encoded"  # 不解码，把Opus包原样交给on_tts_data
+    DISCARD = "discard"  # 直接丢弃音频包，只处理文本消息
+
+# Opus支持的采样率和本客户端接受的包时长（毫秒）
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+OPUS_FRAME_DURATIONS = (10, 20, 40, 60, 80, 100, 120)
+OPUS_MAX_PACKET_DURATION = 120  # 单个Opus包的最大时长（毫秒），与协商的帧时长无关
+
 class ListenState(Enum):
     START = "start"
     STOP = "stop"
@@ -29,6 +39,12 @@ class AudioConfig:
     frame_size: int = 960
     frame_duration: int = 60
     format: str = "opus"
+    device_sample_rate: Optional[int] = None  # 音频设备实际采样率，None表示与sample_rate相同
+
+    @property
+    def max_decode_size(self) -> int:
+        """解码一个包最多得到的每声道样点数；服务端的包可能比协商的frame_duration长"""
+        return self.sample_rate * OPUS_MAX_PACKET_DURATION // 1000
 
 @dataclass
 class ClientConfig:
@@ -36,6 +52,7 @@ class ClientConfig:
     device_token: str = "test-token"
     enable_token: bool = True
     protocol_version: int = 1
+    audio_receive_mode: AudioReceiveMode = AudioReceiveMode.PLAY  # 收到的TTS音频如何处理
 
 @dataclass
 class IoTProperty:
@@ -0,0 +1,163 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Awaitable, Callable, Deque, List, Optional, Tuple
+
+from loguru import logger
+
+
+@dataclass(frozen=True)
+class EncoderSettings:
+    """上行Opus编码参数"""
+    bitrate: int  # 比特率（bps）
+    fec: bool = False  # 是否启用带内前向纠错
+    packet_loss_perc: int = 0  # 告知编码器的预期丢包率（%），影响FEC冗余量
+
+
+@dataclass
+class LinkSample:
+    """一次链路测量"""
+    timestamp: float  # 事件循环时钟loop.time()
+    rtt: Optional[float]  # websocket ping往返时间（秒），超时为None
+    buffered: int  # 传输层写缓冲区中尚未发出的字节数
+    backlog: float = 0.0  # 发送队列中排队、尚未交给传输层的上行音频时长（秒）
+
+
+@dataclass
+class AdaptationDecision:
+    """一次调整决策"""
+    sample: LinkSample
+    previous: EncoderSettings
+    settings: EncoderSettings
+    reason: str
+
+    def format(self) -> str:
+        rtt = f"{self.sample.rtt * 1000:.0f}ms" if self.sample.rtt is not None else "超时"
+        return (f"RTT={rtt} 积压={self.sample.buffered}B/{self.sample.backlog * 1000:.0f}ms: "
+                f"{self.previous.bitrate}bps/FEC={self.previous.fec}/{self.previous.packet_loss_perc}% -> "
+                f"{self.settings.bitrate}bps/FEC={self.settings.fec}/{self.settings.packet_loss_perc}% ({self.reason})")
+
+
+# 策略：根据测量结果和当前参数返回新的参数及原因，不调整时返回None
+AdaptationPolicy = Callable[[LinkSample, EncoderSettings], Optional[Tuple[EncoderSettings, str]]]
+
+
+def default_ladder(base: EncoderSettings) -> List[EncoderSettings]:
+    """从好到差的参数阶梯：逐级降低比特率并提高FEC冗余
+
+    包时长不在阶梯中：它已在hello中上报给服务端，中途改变会与协商的frame_duration不一致。
+    """
+    return [
+        base,
+        replace(base, bitrate=min(base.bitrate, 24000), fec=True, packet_loss_perc=10),
+        replace(base, bitrate=min(base.bitrate, 16000), fec=True, packet_loss_perc=20),
+        replace(base, bitrate=min(base.bitrate, 12000), fec=True, packet_loss_perc=30),
+        replace(base, bitrate=min(base.bitrate, 8000), fec=True, packet_loss_perc=40),
+    ]
+
+
+class LadderPolicy:
+    """带滞回的阶梯策略
+
+    RTT、写缓冲积压或发送队列积压超过上限（或ping超时）时立即降一级；连续recover_samples次
+    都低于下限时升一级。
+    """
+
+    def __init__(self, ladder: List[EncoderSettings], rtt_high: float = 0.4, rtt_low: float = 0.15,
+                 buffer_high: int = 16 * 1024, buffer_low: int = 2 * 1024, recover_samples: int = 5,
+                 backlog_high: float = 0.5, backlog_low: float = 0.2):
+        self.ladder = ladder
+        self.rtt_high = rtt_high
+        self.rtt_low = rtt_low
+        self.buffer_high = buffer_high
+        self.buffer_low = buffer_low
+        self.backlog_high = backlog_high
+        self.backlog_low = backlog_low
+        self.recover_samples = recover_samples
+        self._good = 0
+
+    def __call__(self, sample: LinkSample, current: EncoderSettings) -> Optional[Tuple[EncoderSettings, str]]:
+        level = self.ladder.index(current) if current in self.ladder else 0
+        if (sample.rtt is None or sample.rtt > self.rtt_high or sample.buffered > self.buffer_high
+                or sample.backlog > self.backlog_high):
+            self._good = 0
+            if level + 1 < len(self.ladder):
+                return self.ladder[level + 1], "链路变差"
+            return None
+        if sample.rtt < self.rtt_low and sample.buffered < self.buffer_low and sample.backlog < self.backlog_low:
+            self._good += 1
+            if self._good >= self.recover_samples and level > 0:
+                self._good = 0
+                return self.ladder[level - 1], "链路恢复"
+        else:
+            self._good = 0
+        return None
+
+
+class LinkAdapter:
+    """周期性测量websocket的RTT、写缓冲和发送队列积压，按策略调整上行编码参数，并记录每次决策"""
+
+    def __init__(self, base: EncoderSettings, policy: Optional[AdaptationPolicy] = None,
+                 interval: float = 2.0, ping_timeout: float = 2.0, history: int = 256):
+        """
+        Args:
+            base: 初始（最佳）编码参数
+            policy: 调整策略，默认使用LadderPolicy(default_ladder(base))
+            interval: 测量间隔（秒）
+            ping_timeout: ping超时时间（秒），超时视为链路严重变差
+            history: 保留的决策记录条数
+        """
+        self.base = base
+        self.settings = base
+        self.policy = policy or LadderPolicy(default_ladder(base))
+        self.interval = interval
+        self.ping_timeout = ping_timeout
+        self.decisions: Deque[AdaptationDecision] = deque(maxlen=history)
+        self.last_sample: Optional[LinkSample] = None
+
+    async def measure(self, websocket, backlog: Optional[Callable[[], float]] = None) -> LinkSample:
+        """测量一次RTT和积压
+
+        Args:
+            websocket: 连接
+            backlog: 返回发送队列中排队音频时长（秒）的函数；音频在交给传输层之前
+                先在发送调度器中排队，只看传输层写缓冲区看不到这部分积压
+        """
+        transport = getattr(websocket, 'transport', None)
+        buffered = transport.get_write_buffer_size() if transport is not None else 0
+        queued = backlog() if backlog is not None else 0.0
+        # 默认事件循环的时钟即time.monotonic()，仿真模式下为虚拟时钟
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        rtt = None
+        try:
+            pong = await websocket.ping()
+            await asyncio.wait_for(pong, self.ping_timeout)
+            rtt = loop.time() - started
+        except asyncio.TimeoutError:
+            pass
+        return LinkSample(started, rtt, buffered, queued)
+
+    async def step(self, sample: LinkSample,
+                   apply: Callable[[EncoderSettings], Awaitable[None]]) -> Optional[AdaptationDecision]:
+        """对一次测量结果执行策略，参数变化时调用apply"""
+        self.last_sample = sample
+        result = self.policy(sample, self.settings)
+        if result is None:
+            return None
+        settings, reason = result
+        if settings == self.settings:
+            return None
+        decision = AdaptationDecision(sample, self.settings, settings, reason)
+        await apply(settings)
+        self.settings = settings
+        self.decisions.append(decision)
+        logger.info(f"上行编码参数调整: {decision.format()}")
+        return decision
+
+    async def run(self, websocket, apply: Callable[[EncoderSettings], Awaitable[None]],
+                  backlog: Optional[Callable[[], float]] = None):
+        """持续测量和调整，直到连接关闭或任务被取消"""
+        while not websocket.closed:
+            await self.step(await self.measure(websocket, backlog), apply)
+            await asyncio.sleep(self.interval)
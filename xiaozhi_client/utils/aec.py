@@ -0,0 +1,184 @@
+import math
+import threading
+from typing import Optional
+
+import numpy as np
+
+
+class EchoReference:
+    """播放参考信号的线程安全FIFO
+
+    播放线程在把音频写入设备前推入参考信号，采集回调按采集节奏取出等长的参考信号，
+    没有参考信号时补零（即当前没有播放）。
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._ring = np.zeros(capacity, dtype=np.float32)
+        self._read = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def push(self, samples: np.ndarray):
+        """推入int16或float32的播放样点，超出容量时丢弃最旧的样点"""
+        if samples.dtype == np.int16:
+            data = samples.astype(np.float32) * (1.0 / 32768.0)
+        else:
+            data = samples.astype(np.float32, copy=False)
+        data = data[-self.capacity:]
+        n = len(data)
+        with self._lock:
+            overflow = self._count + n - self.capacity
+            if overflow > 0:
+                self._read = (self._read + overflow) % self.capacity
+                self._count -= overflow
+            write = (self._read + self._count) % self.capacity
+            first = min(n, self.capacity - write)
+            self._ring[write:write + first] = data[:first]
+            self._ring[:n - first] = data[first:]
+            self._count += n
+
+    def pull(self, out: np.ndarray):
+        """取出len(out)个参考样点写入out，不足部分补零"""
+        n = len(out)
+        with self._lock:
+            available = min(n, self._count)
+            first = min(available, self.capacity - self._read)
+            out[:first] = self._ring[self._read:self._read + first]
+            out[first:available] = self._ring[:available - first]
+            self._read = (self._read + available) % self.capacity
+            self._count -= available
+        out[available:] = 0.0
+
+    def clear(self):
+        with self._lock:
+            self._read = 0
+            self._count = 0
+
+
+class EchoCanceller:
+    """分块频域自适应滤波（PBFDAF）回声消除器
+
+    以播放信号为参考，估计扬声器到麦克风的回声路径并从麦克风信号中减去估计的回声。
+    使用Geigel双讲检测，在近端说话时冻结滤波器更新，避免滤波器发散。
+    """
+
+    def __init__(self, block_size: int = 480, filter_length: int = 4800,
+                 step_size: float = 0.8, dtd_threshold: float = 0.5,
+                 regularization: float = 0.1):
+        """
+        Args:
+            block_size: 处理块长度（样点），调用process时的长度需为其整数倍
+            filter_length: 回声路径长度（样点），决定可消除的最大回声延迟
+            step_size: 归一化步长，0~1
+            dtd_threshold: Geigel双讲检测阈值，麦克风峰值超过参考峰值的该比例时视为双讲。
+                默认0.5假定回声路径至少有6dB衰减，扬声器紧贴麦克风、衰减不足时需调大
+            regularization: 归一化正则项（相对参考信号平均功率的比例），避免无能量频点步长过大
+        """
+        self.block_size = block_size
+        self.partitions = max(1, math.ceil(filter_length / block_size))
+        self.step_size = step_size
+        self.dtd_threshold = dtd_threshold
+        self.regularization = regularization
+        self.echo_rms = 0.0  # 最近一块估计回声的强度
+        self.double_talk = False  # 最近一块是否检测到双讲
+        self.reset()
+
+    def reset(self):
+        """清空滤波器和历史状态"""
+        B = self.block_size
+        bins = B + 1
+        self._weights = np.zeros((self.partitions, bins), dtype=np.complex64)
+        self._spectra = np.zeros((self.partitions, bins), dtype=np.complex64)
+        self._power = np.zeros(bins, dtype=np.float32)
+        self._peaks = np.zeros(self.partitions, dtype=np.float32)
+        self._ref_pair = np.zeros(2 * B, dtype=np.float32)
+        self._err_pair = np.zeros(2 * B, dtype=np.float32)
+        self.echo_rms = 0.0
+        self.double_talk = False
+
+    def process(self, mic: np.ndarray, reference: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """对一段麦克风信号做回声消除
+
+        Args:
+            mic: float32麦克风信号，长度为block_size的整数倍
+            reference: 与mic等长、时间上对齐的播放参考信号
+            out: 输出数组，可以就是mic本身（原地处理）
+        """
+        B = self.block_size
+        if len(mic) % B:
+            raise ValueError(f"输入长度{len(mic)}不是块长度{B}的整数倍")
+        if out is None:
+            out = np.empty_like(mic, dtype=np.float32)
+        echo_energy = 0.0
+        for start in range(0, len(mic), B):
+            echo_energy += self._process_block(mic[start:start + B], reference[start:start + B], out[start:start + B])
+        self.echo_rms = math.sqrt(echo_energy / max(1, len(mic)))
+        return out
+
+    def _process_block(self, d: np.ndarray, x: np.ndarray, out: np.ndarray) -> float:
+        B = self.block_size
+        ref_pair = self._ref_pair
+        ref_pair[:B] = ref_pair[B:]
+        ref_pair[B:] = x
+
+        # 最新参考块的频谱放在第0个分区
+        self._spectra[1:] = self._spectra[:-1]
+        self._spectra[0] = np.fft.rfft(ref_pair)
+        self._peaks[1:] = self._peaks[:-1]
+        self._peaks[0] = np.abs(x).max()
+
+        echo = np.fft.irfft(np.einsum('pk,pk->k', self._weights, self._spectra), n=2 * B)[B:]
+        mic_peak = float(np.abs(d).max())
+        np.subtract(d, echo, out=out)
+
+        ref_peak = float(self._peaks.max())
+        self.double_talk = mic_peak > self.dtd_threshold * ref_peak
+        if ref_peak > 1e-4 and not self.double_talk:
+            # 以滤波器覆盖范围内全部参考块的功率谱归一化，参考信号能量突增时步长也不会过大
+            spectra = self._spectra
+            power = self._power
+            np.sum(spectra.real ** 2 + spectra.imag ** 2, axis=0, out=power)
+            power += self.regularization * float(power.mean()) + 1e-10
+
+            err_pair = self._err_pair
+            err_pair[B:] = out
+            err = np.fft.rfft(err_pair)
+            err *= self.step_size / power
+            gradient = np.conj(self._spectra) * err
+            # 梯度约束：去掉循环卷积带来的后半段分量
+            taps = np.fft.irfft(gradient, n=2 * B, axis=1)
+            taps[:, B:] = 0.0
+            self._weights += np.fft.rfft(taps, axis=1)
+
+        return float(np.dot(echo, echo))
+
+
+class BargeInDetector:
+    """播放期间的插话检测
+
+    回声消除后的麦克风强度连续若干帧超过阈值，且明显高于估计的回声强度时，判定为用户插话。
+    """
+
+    def __init__(self, threshold: float = 0.03, min_frames: int = 3, echo_ratio: float = 2.0):
+        """
+        Args:
+            threshold: 插话判定的最小强度
+            min_frames: 需要连续满足条件的帧数
+            echo_ratio: 强度需超过估计回声强度的倍数
+        """
+        self.threshold = threshold
+        self.min_frames = min_frames
+        self.echo_ratio = echo_ratio
+        self._frames = 0
+
+    def update(self, rms: float, echo_rms: float = 0.0) -> bool:
+        """输入一帧的强度，返回是否刚刚触发插话"""
+        if rms > self.threshold and rms > self.echo_ratio * echo_rms:
+            self._frames += 1
+            return self._frames == self.min_frames
+        self._frames = 0
+        return False
+
+    def reset(self):
+        self._frames = 0
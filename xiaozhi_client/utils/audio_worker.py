@@ -0,0 +1,489 @@
+import threading
+from multiprocessing import get_context, shared_memory
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+from loguru import logger
+
+
+class ShmRing:
+    """单生产者单消费者的共享内存字节环形缓冲区
+
+    头部为若干uint64计数器：写入总字节数、读取总字节数、写入端丢弃的块数、读取端欠载次数、容量
+    和写入端请求丢弃到的位置，之后是数据区。写入端只修改写计数，读取端只修改读计数，先写数据
+    再更新计数。计数器只在锁内读写，数据拷贝在锁外进行：锁的获取和释放是内存屏障，ARM等弱内存序
+    平台上读取端看到新的写计数时，对应的数据也已可见。两个进程使用同一缓冲区时须传入同一把
+    multiprocessing锁。
+    """
+
+    _HEADER = 64
+    _WRITE, _READ, _DROPPED, _UNDERRUNS, _CAPACITY, _SKIP = range(6)
+
+    def __init__(self, capacity: int = 0, name: Optional[str] = None, lock=None):
+        """
+        Args:
+            capacity: 数据区字节数，创建新的缓冲区时使用
+            name: 已有共享内存的名称，给出时连接到该缓冲区而不是创建
+            lock: 保护计数器的锁，跨进程使用时为双方共享的multiprocessing锁；默认为线程锁，只适用于同一进程
+        """
+        self._lock = lock if lock is not None else threading.Lock()
+        if name is None:
+            if capacity <= 0:
+                raise ValueError("capacity必须大于0")
+            self._shm = shared_memory.SharedMemory(create=True, size=self._HEADER + capacity)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._owner = name is None
+        self._header = np.ndarray(self._HEADER // 8, dtype=np.uint64, buffer=self._shm.buf)
+        if self._owner:
+            self._header[:] = 0
+            self._header[self._CAPACITY] = capacity
+        self.capacity = int(self._header[self._CAPACITY])
+        self._data = np.ndarray(self.capacity, dtype=np.uint8, buffer=self._shm.buf, offset=self._HEADER)
+        self.skipped = False  # 读取端：最近一次读取是否执行了写入端请求的丢弃
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def available(self) -> int:
+        """可读取的字节数"""
+        with self._lock:
+            return int(self._header[self._WRITE]) - int(self._header[self._READ])
+
+    def write(self, data: np.ndarray) -> int:
+        """写入尽可能多的字节（uint8数组），返回写入的字节数，只在写入端调用"""
+        with self._lock:
+            write = int(self._header[self._WRITE])
+            free = self.capacity - (write - int(self._header[self._READ]))
+        n = min(len(data), free)
+        if n <= 0:
+            return 0
+        pos = write % self.capacity
+        first = min(n, self.capacity - pos)
+        self._data[pos:pos + first] = data[:first]
+        self._data[:n - first] = data[first:n]
+        with self._lock:
+            self._header[self._WRITE] = write + n
+        return n
+
+    def push(self, data: np.ndarray) -> bool:
+        """整块写入，空间不足时丢弃整块并计数，只在写入端调用"""
+        if self.capacity - self.available() < len(data):
+            with self._lock:
+                self._header[self._DROPPED] += 1
+            return False
+        self.write(data)
+        return True
+
+    def read_into(self, out: np.ndarray) -> int:
+        """读取最多len(out)字节到out（uint8数组），返回读取的字节数，只在读取端调用"""
+        with self._lock:
+            read = int(self._header[self._READ])
+            skip = int(self._header[self._SKIP])
+            self.skipped = skip > read
+            if self.skipped:
+                read = skip
+                self._header[self._READ] = read
+            n = min(len(out), int(self._header[self._WRITE]) - read)
+        if n <= 0:
+            return 0
+        pos = read % self.capacity
+        first = min(n, self.capacity - pos)
+        out[:first] = self._data[pos:pos + first]
+        out[first:n] = self._data[:n - first]
+        with self._lock:
+            self._header[self._READ] = read + n
+        return n
+
+    def discard(self):
+        """丢弃全部未读数据，只在读取端调用"""
+        with self._lock:
+            self._header[self._READ] = self._header[self._WRITE]
+
+    def request_discard(self):
+        """请求读取端丢弃目前已写入的全部数据，只在写入端调用
+
+        读指针只由读取端修改，丢弃在读取端下一次read_into时生效，之后写入的数据不受影响。
+        """
+        with self._lock:
+            self._header[self._SKIP] = self._header[self._WRITE]
+
+    def note_underrun(self):
+        with self._lock:
+            self._header[self._UNDERRUNS] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "available": int(self._header[self._WRITE]) - int(self._header[self._READ]),
+                "dropped": int(self._header[self._DROPPED]),
+                "underruns": int(self._header[self._UNDERRUNS]),
+            }
+
+    def close(self):
+        """断开共享内存，创建方同时释放它"""
+        self._header = None
+        self._data = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def _worker_main(conn, capture_name: str, playback_name: str, capture_bell, playback_bell,
+                 capture_lock, playback_lock):
+    """音频子进程：在自己的解释器中运行sounddevice流，通过共享内存环形缓冲区与主进程交换PCM
+
+    采集回调把每块数据整块写入采集缓冲区并敲一次门铃；播放回调从播放缓冲区取数据，不足部分补零，
+    取完后敲门铃通知主进程有空间。控制命令（打开、启动、停止、关闭流）经管道同步执行。
+    """
+    import sounddevice as sd
+
+    capture = ShmRing(name=capture_name, lock=capture_lock)
+    playback = ShmRing(name=playback_name, lock=playback_lock)
+    streams: Dict[str, Any] = {}
+    playing = [False]
+
+    def input_callback(indata, frames, time, status):
+        capture.push(indata.reshape(-1).view(np.uint8))
+        capture_bell.release()
+
+    def output_callback(outdata, frames, time, status):
+        out = outdata.reshape(-1).view(np.uint8)
+        n = playback.read_into(out)
+        if n < len(out):
+            out[n:] = 0
+            # 播放中途缓冲区被取空即为一次欠载，中止时主动丢弃的不算
+            if playing[0] and not playback.skipped:
+                playback.note_underrun()
+        playing[0] = n == len(out)
+        playback_bell.release()
+
+    def close_stream(kind: str):
+        stream = streams.pop(kind, None)
+        if stream is not None:
+            stream.close()
+
+    try:
+        while True:
+            try:
+                cmd, kind, params = conn.recv()
+            except EOFError:
+                break
+            if cmd == "exit":
+                break
+            try:
+                result = None
+                if cmd == "open":
+                    close_stream(kind)
+                    if kind == "input":
+                        streams[kind] = sd.InputStream(callback=input_callback, **params)
+                    else:
+                        playback.discard()
+                        playing[0] = False
+                        streams[kind] = sd.OutputStream(callback=output_callback, **params)
+                elif cmd in ("start", "stop", "abort"):
+                    getattr(streams[kind], cmd)()
+                elif cmd == "close":
+                    close_stream(kind)
+                elif cmd == "latency":
+                    result = streams[kind].latency
+                conn.send((True, result))
+            except Exception as e:
+                conn.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        for kind in list(streams):
+            close_stream(kind)
+        capture.close()
+        playback.close()
+
+
+class _RemoteStream:
+    """子进程中音频流的主进程代理，接口与sounddevice的流一致"""
+
+    _kind = ""
+
+    def __init__(self, worker: "AudioWorker", samplerate: float, channels: int = 1,
+                 dtype: Any = np.float32, blocksize: int = 0, **kwargs):
+        self._worker = worker
+        self.samplerate = samplerate
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.blocksize = blocksize or int(samplerate) // 50
+        self.active = False
+        self.closed = False
+        params = dict(kwargs, samplerate=samplerate, channels=channels, dtype=self.dtype.name,
+                      blocksize=self.blocksize)
+        worker._attach(self._kind, self)
+        try:
+            worker._call("open", self._kind, params)
+        except Exception:
+            worker._detach(self._kind, self)
+            raise
+
+    @property
+    def latency(self) -> float:
+        if self.closed or not self._worker.running:
+            return 0.0
+        return self._worker._call("latency", self._kind)
+
+    def start(self):
+        self._worker._call("start", self._kind)
+        self.active = True
+
+    def stop(self):
+        if self.active and not self.closed:
+            self.active = False
+            if self._worker.running:
+                self._worker._call("stop", self._kind)
+
+    def abort(self):
+        if self.active and not self.closed:
+            self.active = False
+            if self._worker.running:
+                self._worker._call("abort", self._kind)
+
+    def close(self):
+        if self.closed:
+            return
+        self.active = False
+        self.closed = True
+        if self._worker.running:
+            self._worker._call("close", self._kind)
+        self._worker._detach(self._kind, self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class RemoteInputStream(_RemoteStream):
+    """子进程采集流：主进程的读取线程被门铃唤醒后按块取出数据，以sounddevice回调的形式交给callback
+
+    与sounddevice相同，indata只在回调期间有效，需要保留时应复制。
+    """
+
+    _kind = "input"
+
+    def __init__(self, worker: "AudioWorker", callback: Optional[Callable] = None, **kwargs):
+        self.callback = callback
+        self._thread: Optional[threading.Thread] = None
+        super().__init__(worker, **kwargs)
+
+    def start(self):
+        self._worker._capture.discard()
+        super().start()
+        self._thread = threading.Thread(target=self._read_loop, name="xiaozhi-capture-reader", daemon=True)
+        self._thread.start()
+
+    def _read_loop(self):
+        ring = self._worker._capture
+        bell = self._worker._capture_bell
+        block = np.zeros((self.blocksize, self.channels), dtype=self.dtype)
+        raw = block.reshape(-1).view(np.uint8)
+        dropped = ring.stats()["dropped"]
+        while self.active:
+            if not bell.acquire(timeout=0.1):
+                continue
+            while self.active and ring.available() >= len(raw):
+                ring.read_into(raw)
+                status = None
+                current = ring.stats()["dropped"]
+                if current != dropped:
+                    # 主进程来不及读取时子进程丢弃的块
+                    status = f"input overflow ({current - dropped} blocks)"
+                    dropped = current
+                if self.callback is None:
+                    continue
+                try:
+                    self.callback(block, self.blocksize, None, status)
+                except Exception as e:
+                    logger.error(f"采集回调错误: {e}")
+
+    def _join(self):
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def stop(self):
+        super().stop()
+        self._join()
+
+    def abort(self):
+        super().abort()
+        self._join()
+
+    def close(self):
+        super().close()
+        self._join()
+
+
+class RemoteOutputStream(_RemoteStream):
+    """子进程播放流：write把PCM写入播放缓冲区，缓冲区中的数据超过buffer_ms时阻塞等待，与阻塞式写入一致
+
+    等待期间流被停止或关闭时丢弃剩余数据并返回；子进程退出时抛出RuntimeError，不会一直等下去。
+    """
+
+    _kind = "output"
+
+    def __init__(self, worker: "AudioWorker", buffer_ms: int = 120, **kwargs):
+        super().__init__(worker, **kwargs)
+        frame_bytes = self.channels * self.dtype.itemsize
+        frames = max(self.blocksize, int(self.samplerate * buffer_ms / 1000))
+        self._limit = min(frames * frame_bytes, worker._playback.capacity // frame_bytes * frame_bytes)
+
+    def write(self, data: np.ndarray) -> bool:
+        raw = np.ascontiguousarray(data, dtype=self.dtype).reshape(-1).view(np.uint8)
+        ring = self._worker._playback
+        bell = self._worker._playback_bell
+        offset = 0
+        while offset < len(raw):
+            if self.closed or not self.active:
+                break
+            if not self._worker.running:
+                raise RuntimeError("音频子进程已退出")
+            free = self._limit - ring.available()
+            if free > 0:
+                offset += ring.write(raw[offset:offset + free])
+            else:
+                bell.acquire(timeout=0.1)
+        return False
+
+
+class AudioWorker:
+    """在独立子进程中运行音频采集和播放
+
+    GUI重绘等占用GIL的工作不会再拖慢设备回调：子进程中的回调只做共享内存拷贝和敲门铃，
+    主进程侧的采集回调和播放写入与原来一样运行在各自的线程中，由环形缓冲区吸收抖动。
+    子进程以spawn方式启动，使用它的脚本入口需要 ``if __name__ == "__main__":`` 保护。
+
+    Example:
+        worker = AudioWorker()
+        worker.start()
+        stream = worker.output_stream(samplerate=24000, channels=1, dtype=np.int16)
+        stream.start()
+        stream.write(pcm)
+    """
+
+    def __init__(self, playback_buffer_ms: int = 120, ring_bytes: int = 512 * 1024):
+        """
+        Args:
+            playback_buffer_ms: 播放缓冲区中最多积压的音频时长（毫秒），越大越能抗抖动，中止时的残留也越长
+            ring_bytes: 采集和播放环形缓冲区各自的字节数
+        """
+        self.playback_buffer_ms = playback_buffer_ms
+        self.ring_bytes = ring_bytes
+        self._process = None
+        self._conn = None
+        self._capture: Optional[ShmRing] = None
+        self._playback: Optional[ShmRing] = None
+        self._capture_bell = None
+        self._playback_bell = None
+        self._lock = threading.Lock()
+        self._streams: Dict[str, _RemoteStream] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._process.pid if self._process is not None else None
+
+    def start(self):
+        """启动子进程，等待其就绪后返回"""
+        if self.running:
+            return
+        ctx = get_context("spawn")
+        capture_lock = ctx.Lock()
+        playback_lock = ctx.Lock()
+        self._capture = ShmRing(self.ring_bytes, lock=capture_lock)
+        self._playback = ShmRing(self.ring_bytes, lock=playback_lock)
+        self._capture_bell = ctx.Semaphore(0)
+        self._playback_bell = ctx.Semaphore(0)
+        self._conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self._capture.name, self._playback.name, self._capture_bell, self._playback_bell,
+                  capture_lock, playback_lock),
+            name="xiaozhi-audio",
+            daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        self._call("ping")
+        logger.debug(f"音频子进程已启动: pid={self._process.pid}")
+
+    def stop(self):
+        """关闭所有流并结束子进程"""
+        for stream in list(self._streams.values()):
+            try:
+                stream.close()
+            except Exception as e:
+                logger.warning(f"关闭子进程音频流失败: {e}")
+        if self._process is not None:
+            try:
+                with self._lock:
+                    self._conn.send(("exit", None, None))
+            except (BrokenPipeError, OSError):
+                pass
+            self._process.join(timeout=2.0)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join()
+            self._conn.close()
+            self._process = None
+        for ring in (self._capture, self._playback):
+            if ring is not None:
+                ring.close()
+        self._capture = self._playback = None
+        logger.debug("音频子进程已停止")
+
+    def discard_playback(self):
+        """丢弃播放缓冲区中已写入、尚未播放的音频，中止播放时调用；子进程未运行时不做任何事"""
+        if self.running and self._playback is not None:
+            self._playback.request_discard()
+
+    def _call(self, cmd: str, kind: Optional[str] = None, params: Optional[dict] = None):
+        """向子进程发送一条控制命令并等待结果"""
+        with self._lock:
+            if self._process is None:
+                raise RuntimeError("音频子进程未启动")
+            try:
+                self._conn.send((cmd, kind, params))
+                ok, result = self._conn.recv()
+            except (EOFError, BrokenPipeError, OSError) as e:
+                raise RuntimeError(f"音频子进程已退出: {e}") from e
+        if not ok:
+            raise RuntimeError(f"音频子进程错误: {result}")
+        return result
+
+    def _attach(self, kind: str, stream: _RemoteStream):
+        current = self._streams.get(kind)
+        if current is not None and not current.closed:
+            raise RuntimeError(f"音频子进程同一时刻只支持一个{'采集' if kind == 'input' else '播放'}流")
+        self._streams[kind] = stream
+
+    def _detach(self, kind: str, stream: _RemoteStream):
+        if self._streams.get(kind) is stream:
+            del self._streams[kind]
+
+    def input_stream(self, callback: Optional[Callable] = None, **kwargs) -> RemoteInputStream:
+        """创建采集流，参数与sounddevice.InputStream相同"""
+        return RemoteInputStream(self, callback, **kwargs)
+
+    def output_stream(self, **kwargs) -> RemoteOutputStream:
+        """创建播放流，参数与sounddevice.OutputStream相同"""
+        return RemoteOutputStream(self, self.playback_buffer_ms, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """环形缓冲区统计：capture.dropped为主进程来不及读取而丢弃的块数，playback.underruns为播放中途断流的次数"""
+        return {
+            "pid": self.pid,
+            "running": self.running,
+            "capture": self._capture.stats() if self._capture is not None else None,
+            "playback": self._playback.stats() if self._playback is not None else None,
+        }
@@ -0,0 +1,267 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from xiaozhi_client.utils.pcm import FramePool, frame_rms
+
+# 订阅者回调：(帧, 均方根强度, 采集时间戳perf_counter_ns)，在采集线程中调用
+FrameSubscriber = Callable[[np.ndarray, float, int], None]
+
+
+class LoopChannel:
+    """采集线程到事件循环的有界交接通道
+
+    任意线程都可以put，事件循环中的消费者await get。只有消费者正在等待时才通过
+    ``call_soon_threadsafe`` 唤醒事件循环，积压时不再逐帧唤醒，也不需要轮询。
+    排队数达到maxsize时丢弃新帧，保证引用FramePool槽位的帧不会被覆盖。
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._loop = loop
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._waiter: Optional[asyncio.Future] = None
+        self._wake_pending = False
+
+    def put(self, item: Any) -> bool:
+        """放入一项（可在任意线程调用），队列已满或事件循环已关闭时丢弃并返回False"""
+        with self._lock:
+            if len(self._items) >= self.maxsize:
+                self.dropped += 1
+                return False
+            self._items.append(item)
+            wake = self._waiter is not None and not self._wake_pending
+            if wake:
+                self._wake_pending = True
+        if wake:
+            try:
+                self._loop.call_soon_threadsafe(self._wake)
+            except RuntimeError:
+                # 事件循环已关闭，没有消费者了
+                return False
+        return True
+
+    def _wake(self):
+        with self._lock:
+            waiter = self._waiter
+            self._waiter = None
+            self._wake_pending = False
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def get(self) -> Any:
+        """取出一项，队列为空时等待（只能在所属事件循环中调用）"""
+        while True:
+            with self._lock:
+                if self._items:
+                    return self._items.popleft()
+                waiter = self._loop.create_future()
+                self._waiter = waiter
+            await waiter
+
+    def clear(self) -> int:
+        """清空队列，返回丢弃的项数"""
+        with self._lock:
+            count = len(self._items)
+            self._items.clear()
+        return count
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def empty(self) -> bool:
+        return not self._items
+
+
+class LevelMeter:
+    """输入电平表订阅者
+
+    采集线程中只更新两个浮点数，界面线程随时读取即可，不经过任何队列。
+    峰值按每帧decay衰减，便于绘制回落的电平条。
+    """
+
+    def __init__(self, decay: float = 0.9):
+        self.decay = decay
+        self.rms = 0.0
+        self.peak = 0.0
+        self.timestamp = 0  # 最近一帧的采集时间戳（perf_counter_ns）
+
+    def __call__(self, frame: np.ndarray, rms: float, timestamp: int):
+        self.rms = rms
+        self.peak = max(rms, self.peak * self.decay)
+        self.timestamp = timestamp
+
+    @property
+    def db(self) -> float:
+        """当前均方根电平（dBFS），静音时为-120"""
+        if self.rms <= 1e-6:
+            return -120.0
+        return 20.0 * float(np.log10(self.rms))
+
+    def reset(self):
+        self.rms = 0.0
+        self.peak = 0.0
+        self.timestamp = 0
+
+
+class CaptureEngine:
+    """共享的麦克风采集引擎
+
+    整个客户端只打开一个输入流。采集回调中每帧只做一次重采样/对齐、预处理（回声消除、
+    降噪等）和强度计算，然后把同一帧依次交给所有订阅者。订阅者在采集线程中被调用，
+    必须足够轻量：需要异步处理的通过LoopChannel交给事件循环，且只能在池槽位被复用之前
+    （即排队不超过 ``pool_slots - 2`` 帧）引用帧数据。
+
+    第一个订阅者加入时打开输入流，最后一个订阅者退出时关闭。
+    """
+
+    def __init__(self, open_stream: Callable[..., Any], frame_size: int, channels: int = 1,
+                 device_rate: Optional[int] = None, block_size: Optional[int] = None,
+                 create_resampler: Optional[Callable[[], Tuple[Any, Any]]] = None,
+                 preprocess: Optional[Callable[[np.ndarray], None]] = None,
+                 pool_slots: int = 130):
+        self.frame_size = frame_size
+        self.channels = channels
+        self.device_rate = device_rate
+        self.block_size = block_size or frame_size
+        self._open_stream = open_stream
+        self._create_resampler = create_resampler
+        self._preprocess = preprocess
+        self._pool = FramePool(pool_slots, frame_size, channels)
+        # 订阅者列表整体替换（写时复制），采集线程遍历时无需加锁
+        self._subscribers: Tuple[FrameSubscriber, ...] = ()
+        self._lock = threading.Lock()
+        self._stream = None
+        self._resampler = None
+        self._aligner = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._callbacks = 0
+        self._frames = 0
+        self._status_count = 0
+        self._errors = 0
+        self._cost_total_ns = 0
+        self._cost_max_ns = 0
+
+    @property
+    def running(self) -> bool:
+        return self._stream is not None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, subscriber: FrameSubscriber) -> FrameSubscriber:
+        """加入订阅者，必要时打开输入流；打开失败时撤销订阅并抛出异常"""
+        with self._lock:
+            if subscriber in self._subscribers:
+                return subscriber
+            self._subscribers = self._subscribers + (subscriber,)
+            if self._stream is not None:
+                return subscriber
+            try:
+                self._start()
+            except Exception:
+                self._subscribers = tuple(s for s in self._subscribers if s is not subscriber)
+                raise
+        return subscriber
+
+    def unsubscribe(self, subscriber: FrameSubscriber):
+        """移除订阅者，没有订阅者时关闭输入流"""
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not subscriber)
+            if not self._subscribers:
+                self._stop()
+
+    def close(self):
+        """移除全部订阅者并关闭输入流"""
+        with self._lock:
+            self._subscribers = ()
+            self._stop()
+
+    def _start(self):
+        if self._create_resampler is not None:
+            self._resampler, self._aligner = self._create_resampler()
+        self._reset_stats()
+        stream = self._open_stream(
+            channels=self.channels,
+            samplerate=self.device_rate,
+            callback=self._callback,
+            dtype=np.float32,
+            blocksize=self.block_size
+        )
+        stream.start()
+        self._stream = stream
+        logger.debug("采集引擎已启动")
+
+    def _stop(self):
+        stream = self._stream
+        if stream is None:
+            return
+        self._stream = None
+        try:
+            stream.stop()
+            stream.close()
+        except Exception as e:
+            logger.warning(f"关闭采集流失败: {e}")
+        logger.debug(f"采集引擎已停止，共采集 {self._frames} 帧")
+
+    def _callback(self, indata, frames, time_info, status):
+        if status:
+            # 溢出等状态表示此前丢失了数据，当前块本身仍然有效
+            self._status_count += 1
+        started = time.perf_counter_ns()
+        resampler = self._resampler
+        if resampler is not None:
+            for frame in self._aligner.push(resampler.process(indata)):
+                self._dispatch(frame)
+        elif frames == self.frame_size:
+            self._dispatch(self._pool.write(indata))
+        else:
+            self._dispatch(indata.reshape(-1).astype(np.float32))
+        cost = time.perf_counter_ns() - started
+        self._callbacks += 1
+        self._cost_total_ns += cost
+        if cost > self._cost_max_ns:
+            self._cost_max_ns = cost
+
+    def _dispatch(self, frame: np.ndarray):
+        subscribers = self._subscribers
+        if not subscribers:
+            return
+        try:
+            if self._preprocess is not None:
+                self._preprocess(frame)
+        except Exception as e:
+            self._errors += 1
+            logger.debug(f"采集预处理错误: {e}")
+        rms = frame_rms(frame)
+        timestamp = time.perf_counter_ns()
+        self._frames += 1
+        for subscriber in subscribers:
+            try:
+                subscriber(frame, rms, timestamp)
+            except Exception as e:
+                self._errors += 1
+                logger.debug(f"采集订阅者处理错误: {e}")
+
+    def stats(self) -> dict:
+        """采集帧数、设备状态异常次数、订阅者错误数和每次回调的耗时"""
+        callbacks = max(self._callbacks, 1)
+        return {
+            "running": self.running,
+            "subscribers": len(self._subscribers),
+            "frames": self._frames,
+            "status": self._status_count,
+            "errors": self._errors,
+            "callback_mean_ms": self._cost_total_ns / callbacks / 1e6,
+            "callback_max_ms": self._cost_max_ns / 1e6,
+        }
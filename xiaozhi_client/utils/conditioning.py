@@ -0,0 +1,353 @@
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from xiaozhi_client.utils.pcm import frame_rms
+
+
+class HighPassFilter:
+    """级联一阶高通滤波器，同时去除直流偏置和低频嗡声
+
+    每级为 y = x - 低通(x)，低通递推 y[n] = a*y[n-1] + (1-a)*x[n] 在长度为L的子块内写成闭式
+    y[n] = a^n * (a*y[-1] + (1-a)*cumsum(x[k]*a^-k)[n])，整段向量化计算；
+    子块长度保证a^-L不超过1e6，避免精度损失。
+    """
+
+    def __init__(self, sample_rate: int, cutoff: float = 80.0, order: int = 2):
+        """
+        Args:
+            sample_rate: 采样率
+            cutoff: 截止频率（Hz）
+            order: 级联的一阶滤波器个数，每级衰减6dB/倍频程
+        """
+        if not 0 < cutoff < sample_rate / 2:
+            raise ValueError(f"截止频率必须在0到{sample_rate / 2}Hz之间")
+        self.cutoff = cutoff
+        self.order = order
+        self.a = math.exp(-2.0 * math.pi * cutoff / sample_rate)
+        self.chunk = max(1, min(256, int(math.log(1e6) / -math.log(self.a))))
+        k = np.arange(self.chunk)
+        self._scale = self.a ** -k
+        self._decay = self.a ** k
+        self._work = np.empty(self.chunk, dtype=np.float64)
+        self._state = np.zeros(order, dtype=np.float64)
+
+    def reset(self):
+        self._state[:] = 0.0
+
+    def process(self, block: np.ndarray):
+        """原地滤波一维float32音频块"""
+        a = self.a
+        n = len(block)
+        for stage in range(self.order):
+            previous = self._state[stage]
+            for start in range(0, n, self.chunk):
+                segment = block[start:start + self.chunk]
+                m = len(segment)
+                work = self._work[:m]
+                np.multiply(segment, self._scale[:m], out=work)
+                np.cumsum(work, out=work)
+                work *= 1.0 - a
+                work += a * previous
+                work *= self._decay[:m]
+                previous = work[-1]
+                segment -= work
+            self._state[stage] = previous
+
+
+class SpectralNoiseSuppressor:
+    """谱减法降噪
+
+    50%重叠的sqrt-Hann窗STFT，一个块内的所有帧一次完成FFT；噪声谱按最小值跟踪估计
+    （平滑功率谱的逐帧最小值，语音期间缓慢上升），增益为 sqrt(max(1 - 过减因子*噪声/功率, 下限²))
+    并做时间平滑以抑制音乐噪声。输出比输入延迟一个帧移；块长不是帧移的整数倍时，
+    首次输出不足时一次性再增加不到一个帧移的延迟。
+    """
+
+    def __init__(self, sample_rate: int, hop: Optional[int] = None, block_size: Optional[int] = None,
+                 over_subtraction: float = 2.0, floor: float = 0.1, smoothing: float = 0.5,
+                 noise_rise: float = 0.002):
+        """
+        Args:
+            sample_rate: 采样率
+            hop: 帧移（样点），默认不超过16ms
+            block_size: 输入块长，给出且未指定hop时取其不超过16ms的最大约数作为帧移，避免额外延迟
+            over_subtraction: 过减因子，越大降噪越强、语音失真越多
+            floor: 增益下限（幅度），保留少量背景声避免听感断续
+            smoothing: 增益的时间平滑系数
+            noise_rise: 每帧噪声估计允许上升的比例，决定噪声变大后的跟踪速度
+        """
+        self.sample_rate = sample_rate
+        if hop is None:
+            limit = max(1, int(sample_rate * 0.016))
+            if block_size:
+                hop = max(d for d in range(1, min(block_size, limit) + 1) if block_size % d == 0)
+            else:
+                hop = 2 ** int(math.log2(limit))
+        self.hop = hop
+        self.fft_size = 2 * self.hop
+        self.over_subtraction = over_subtraction
+        self.floor = floor
+        self.smoothing = smoothing
+        self.noise_rise = noise_rise
+        n = np.arange(self.fft_size)
+        self._window = np.sqrt(0.5 - 0.5 * np.cos(2.0 * np.pi * n / self.fft_size)).astype(np.float32)
+        bins = self.fft_size // 2 + 1
+        self._noise = np.zeros(bins, dtype=np.float64)
+        self._smoothed = np.zeros(bins, dtype=np.float64)
+        self._gain = np.ones(bins, dtype=np.float64)
+        self._frame_gain = np.empty(bins, dtype=np.float64)
+        self._tail = np.zeros(self.hop, dtype=np.float32)
+        self._in = np.zeros(self.fft_size * 4, dtype=np.float32)
+        self._out = np.zeros(self.fft_size * 4, dtype=np.float32)
+        self.reset()
+
+    @property
+    def latency(self) -> float:
+        """当前输出延迟（秒）"""
+        return self.latency_samples / self.sample_rate
+
+    def reset(self):
+        self._noise[:] = 0.0
+        self._smoothed[:] = 0.0
+        self._gain[:] = 1.0
+        self._tail[:] = 0.0
+        self._in[:self.hop] = 0.0
+        self._in_len = self.hop  # 保留上一帧移的输入作为下一帧的前半段
+        self._out_len = 0
+        self._frames = 0
+        self.latency_samples = self.hop
+
+    @staticmethod
+    def _grow(buffer: np.ndarray, needed: int) -> np.ndarray:
+        if needed <= len(buffer):
+            return buffer
+        grown = np.zeros(max(needed, 2 * len(buffer)), dtype=buffer.dtype)
+        grown[:len(buffer)] = buffer
+        return grown
+
+    def process(self, block: np.ndarray):
+        """原地处理一维float32音频块"""
+        n = len(block)
+        hop = self.hop
+        self._in = self._grow(self._in, self._in_len + n)
+        self._in[self._in_len:self._in_len + n] = block
+        self._in_len += n
+
+        frames = (self._in_len - hop) // hop
+        if frames:
+            view = np.lib.stride_tricks.as_strided(
+                self._in, shape=(frames, self.fft_size), strides=(hop * self._in.itemsize, self._in.itemsize)
+            )
+            spectrum = np.fft.rfft(view * self._window, axis=1)
+            power = spectrum.real ** 2 + spectrum.imag ** 2
+            for f in range(frames):
+                self._update_gain(power[f])
+                spectrum[f] *= self._gain
+            frames_out = np.fft.irfft(spectrum, n=self.fft_size, axis=1).astype(np.float32)
+            frames_out *= self._window
+
+            # 重叠相加：每帧输出前半段加上一帧的后半段
+            self._out = self._grow(self._out, self._out_len + frames * hop)
+            out = self._out[self._out_len:self._out_len + frames * hop].reshape(frames, hop)
+            out[:] = frames_out[:, :hop]
+            out[0] += self._tail
+            out[1:] += frames_out[:-1, hop:]
+            self._tail[:] = frames_out[-1, hop:]
+            self._out_len += frames * hop
+
+            consumed = frames * hop
+            remaining = self._in_len - consumed
+            self._in[:remaining] = self._in[consumed:self._in_len]
+            self._in_len = remaining
+
+        if self._out_len < n:
+            # 块长不是帧移的整数倍时输出不足：在前面补零，使累计延迟达到两个帧移减一，之后不会再不足
+            shortfall = max(n - self._out_len, 2 * hop - 1 - self.latency_samples)
+            self._out = self._grow(self._out, self._out_len + shortfall)
+            self._out[shortfall:self._out_len + shortfall] = self._out[:self._out_len]
+            self._out[:shortfall] = 0.0
+            self._out_len += shortfall
+            self.latency_samples += shortfall
+        block[:] = self._out[:n]
+        self._out[:self._out_len - n] = self._out[n:self._out_len]
+        self._out_len -= n
+
+    def _update_gain(self, power: np.ndarray):
+        if self._frames == 0:
+            self._smoothed[:] = power
+            self._noise[:] = power
+        else:
+            self._smoothed *= 0.7
+            self._smoothed += 0.3 * power
+            self._noise *= 1.0 + self.noise_rise
+            np.minimum(self._noise, self._smoothed, out=self._noise)
+        self._frames += 1
+
+        gain = self._frame_gain
+        np.divide(self._noise, power + 1e-12, out=gain)
+        gain *= -self.over_subtraction
+        gain += 1.0
+        np.maximum(gain, self.floor * self.floor, out=gain)
+        np.sqrt(gain, out=gain)
+        self._gain *= self.smoothing
+        self._gain += (1.0 - self.smoothing) * gain
+
+
+class AutomaticGainControl:
+    """按块调整增益使语音强度接近目标值
+
+    强度低于gate_rms的块视为静音，保持当前增益不变，避免把背景噪声放大到静音阈值之上。
+    增益在块内线性过渡，最后限幅到[-1, 1]。
+    """
+
+    def __init__(self, target_rms: float = 0.1, max_gain: float = 10.0, min_gain: float = 0.1,
+                 gate_rms: float = 0.01, attack: float = 0.5, release: float = 0.05):
+        """
+        Args:
+            target_rms: 目标强度
+            max_gain: 最大增益
+            min_gain: 最小增益
+            gate_rms: 低于该强度不调整增益
+            attack: 需要降低增益时每块趋近目标的比例
+            release: 需要提高增益时每块趋近目标的比例
+        """
+        self.target_rms = target_rms
+        self.max_gain = max_gain
+        self.min_gain = min_gain
+        self.gate_rms = gate_rms
+        self.attack = attack
+        self.release = release
+        self.gain = 1.0
+        self._ramps: Dict[int, np.ndarray] = {}
+
+    def reset(self):
+        self.gain = 1.0
+
+    def process(self, block: np.ndarray):
+        """原地处理一维float32音频块"""
+        gain = self.gain
+        rms = frame_rms(block)
+        if rms > self.gate_rms:
+            desired = min(self.max_gain, max(self.min_gain, self.target_rms / rms))
+            rate = self.attack if desired < gain else self.release
+            new_gain = gain + rate * (desired - gain)
+        else:
+            new_gain = gain
+        if new_gain != gain:
+            n = len(block)
+            ramp = self._ramps.get(n)
+            if ramp is None:
+                ramp = self._ramps[n] = np.arange(1, n + 1, dtype=np.float32) / n
+            block *= gain + (new_gain - gain) * ramp
+        elif gain != 1.0:
+            block *= gain
+        np.clip(block, -1.0, 1.0, out=block)
+        self.gain = new_gain
+
+
+class InputConditioner:
+    """麦克风输入预处理链：高通 → 谱减降噪 → 自动增益
+
+    在静音检测和编码之前原地处理每个采集块，并统计每块及各级的处理耗时。
+    """
+
+    def __init__(self, sample_rate: int, block_size: Optional[int] = None, highpass_cutoff: Optional[float] = 80.0,
+                 noise_suppression: bool = True, agc: bool = True,
+                 over_subtraction: float = 2.0, noise_floor: float = 0.1,
+                 agc_target: float = 0.1, agc_max_gain: float = 10.0, window: int = 512):
+        """
+        Args:
+            sample_rate: 采样率
+            block_size: 采集块长，用于选择降噪的帧移
+            highpass_cutoff: 高通截止频率（Hz），None表示不滤波
+            noise_suppression: 是否启用谱减降噪
+            agc: 是否启用自动增益
+            over_subtraction: 降噪过减因子
+            noise_floor: 降噪增益下限
+            agc_target: 自动增益的目标强度
+            agc_max_gain: 自动增益的最大增益
+            window: 保留用于分位数统计的最近块数
+        """
+        self.sample_rate = sample_rate
+        self.stages: List[Tuple[str, object]] = []
+        if highpass_cutoff:
+            self.stages.append(("highpass", HighPassFilter(sample_rate, highpass_cutoff)))
+        if noise_suppression:
+            self.stages.append(("noise_suppression", SpectralNoiseSuppressor(
+                sample_rate, block_size=block_size, over_subtraction=over_subtraction, floor=noise_floor)))
+        if agc:
+            self.stages.append(("agc", AutomaticGainControl(agc_target, agc_max_gain)))
+        self.window = window
+        self._stage_totals = [0] * len(self.stages)
+        self._samples = [0] * window
+        self.reset_stats()
+
+    def stage(self, name: str):
+        """按名称取出某一级处理器，不存在时返回None"""
+        for stage_name, processor in self.stages:
+            if stage_name == name:
+                return processor
+        return None
+
+    def reset(self):
+        """清空各级的滤波、噪声估计和增益状态"""
+        for _, processor in self.stages:
+            processor.reset()
+
+    def reset_stats(self):
+        self._count = 0
+        self._total = 0
+        self._maximum = 0
+        self._audio = 0
+        for i in range(len(self._stage_totals)):
+            self._stage_totals[i] = 0
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """原地处理一维float32音频块并返回它"""
+        started = time.perf_counter_ns()
+        last = started
+        for i, (_, processor) in enumerate(self.stages):
+            processor.process(block)
+            now = time.perf_counter_ns()
+            self._stage_totals[i] += now - last
+            last = now
+        cost = last - started
+        self._samples[self._count % self.window] = cost
+        self._count += 1
+        self._total += cost
+        self._audio += len(block)
+        if cost > self._maximum:
+            self._maximum = cost
+        return block
+
+    @property
+    def last_cost_ns(self) -> int:
+        """最近一块的处理耗时（纳秒）"""
+        return self._samples[(self._count - 1) % self.window] if self._count else 0
+
+    def stats(self) -> Dict[str, object]:
+        """处理耗时统计，时间单位为毫秒；load为处理耗时占音频时长的比例"""
+        count = self._count
+        samples = sorted(self._samples[:min(count, self.window)])
+        audio_ns = self._audio * 1e9 / self.sample_rate
+        result = {
+            "blocks": count,
+            "mean_ms": self._total / count / 1e6 if count else 0.0,
+            "p95_ms": samples[min(len(samples) - 1, int(0.95 * len(samples)))] / 1e6 if samples else 0.0,
+            "max_ms": self._maximum / 1e6,
+            "load": self._total / audio_ns if audio_ns else 0.0,
+            "stages_ms": {
+                name: total / count / 1e6 if count else 0.0
+                for (name, _), total in zip(self.stages, self._stage_totals)
+            },
+        }
+        agc = self.stage("agc")
+        if agc is not None:
+            result["agc_gain"] = agc.gain
+        suppressor = self.stage("noise_suppression")
+        if suppressor is not None:
+            result["latency_ms"] = suppressor.latency * 1000
+        return result
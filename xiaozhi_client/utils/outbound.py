@@ -0,0 +1,176 @@
+import time
+import asyncio
+from collections import deque
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+# 音频帧写出失败时的回调，参数为发送异常
+ErrorCallback = Callable[[BaseException], None]
+
+
+class SendPriority(IntEnum):
+    """发送优先级，数值越小越先发送"""
+    CONTROL = 0  # JSON控制消息：abort、listen等
+    AUDIO = 1  # 音频帧
+
+
+class OutboundScheduler:
+    """按优先级排队的websocket发送调度器
+
+    所有发送都由单个写入任务完成：控制消息总是先于已排队的音频帧发出。
+    控制消息的send会等待真正写出并抛出发送错误；音频帧入队即返回（队列满时等待），
+    写出失败时调用入队时传入的on_error，不影响之后的发送。按优先级统计从入队到写出的耗时。
+    """
+
+    def __init__(self, send: Callable[[Any], Awaitable[None]], audio_capacity: int = 64, window: int = 512):
+        """
+        Args:
+            send: 实际写出一帧的协程函数
+            audio_capacity: 最多排队的音频帧数，超出时发送方等待
+            window: 每个优先级保留用于分位数统计的最近样本数
+        """
+        self._send = send
+        self.audio_capacity = audio_capacity
+        self.window = window
+        # 每项为(数据, 入队时间, 控制消息的完成future, 音频帧的错误回调)
+        self._queues: Dict[SendPriority, Deque[Tuple[Any, int, Optional[asyncio.Future], Optional[ErrorCallback]]]] = {
+            priority: deque() for priority in SendPriority
+        }
+        self._latencies: Dict[SendPriority, List[int]] = {priority: [] for priority in SendPriority}
+        self._counts: Dict[SendPriority, int] = {priority: 0 for priority in SendPriority}
+        self._totals: Dict[SendPriority, int] = {priority: 0 for priority in SendPriority}
+        self._maxima: Dict[SendPriority, int] = {priority: 0 for priority in SendPriority}
+        self._ready: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._ready = asyncio.Event()
+            self._space = asyncio.Event()
+            self._space.set()
+            self._task = asyncio.create_task(self._run())
+
+    async def send(self, data: Any, priority: SendPriority, on_error: Optional[ErrorCallback] = None):
+        """按优先级发送一帧
+
+        Args:
+            data: 要写出的帧
+            priority: 优先级
+            on_error: 音频帧写出失败时以异常为参数调用，未提供时只记录日志；控制消息的错误直接抛出
+        """
+        self._ensure_running()
+        if priority == SendPriority.AUDIO:
+            audio = self._queues[SendPriority.AUDIO]
+            while len(audio) >= self.audio_capacity:
+                self._space.clear()
+                await self._space.wait()
+            audio.append((data, time.perf_counter_ns(), None, on_error))
+            self._ready.set()
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].append((data, time.perf_counter_ns(), future, None))
+        self._ready.set()
+        await future
+
+    def queued(self, priority: SendPriority) -> int:
+        return len(self._queues[priority])
+
+    async def _run(self):
+        while True:
+            item = None
+            for priority in SendPriority:
+                queue = self._queues[priority]
+                if queue:
+                    item = queue.popleft()
+                    break
+            if item is None:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            if priority == SendPriority.AUDIO:
+                self._space.set()
+            data, enqueued, future, on_error = item
+            try:
+                await self._send(data)
+            except Exception as e:
+                if future is not None:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self._report(e, on_error)
+                continue
+            self._record(priority, time.perf_counter_ns() - enqueued)
+            if future is not None and not future.done():
+                future.set_result(None)
+
+    @staticmethod
+    def _report(error: Exception, on_error: Optional[ErrorCallback]):
+        """把音频帧的写出错误交给入队方"""
+        if on_error is None:
+            logger.warning(f"音频帧发送失败: {error}")
+            return
+        try:
+            on_error(error)
+        except Exception as e:
+            logger.error(f"音频发送错误回调异常: {e}")
+
+    def _record(self, priority: SendPriority, latency_ns: int):
+        count = self._counts[priority]
+        samples = self._latencies[priority]
+        if len(samples) < self.window:
+            samples.append(latency_ns)
+        else:
+            samples[count % self.window] = latency_ns
+        self._counts[priority] = count + 1
+        self._totals[priority] += latency_ns
+        if latency_ns > self._maxima[priority]:
+            self._maxima[priority] = latency_ns
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """各优先级从入队到写出的耗时统计，时间单位为毫秒"""
+        result = {}
+        for priority in SendPriority:
+            count = self._counts[priority]
+            samples = sorted(self._latencies[priority])
+            result[priority.name.lower()] = {
+                "count": count,
+                "queued": len(self._queues[priority]),
+                "mean_ms": self._totals[priority] / count / 1e6 if count else 0.0,
+                "p95_ms": samples[min(len(samples) - 1, int(0.95 * len(samples)))] / 1e6 if samples else 0.0,
+                "max_ms": self._maxima[priority] / 1e6,
+            }
+        return result
+
+    def clear(self, priority: SendPriority) -> int:
+        """丢弃某个优先级排队中的帧，返回丢弃的数量"""
+        queue = self._queues[priority]
+        dropped = len(queue)
+        for _, _, future, _ in queue:
+            if future is not None and not future.done():
+                future.cancel()
+        queue.clear()
+        if priority == SendPriority.AUDIO and self._space is not None:
+            self._space.set()
+        return dropped
+
+    async def close(self, error: Optional[BaseException] = None):
+        """停止写入任务，排队中的控制消息以error（默认ConnectionError）结束"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        error = error or ConnectionError("WebSocket connection closed")
+        for priority in SendPriority:
+            for _, _, future, _ in self._queues[priority]:
+                if future is not None and not future.done():
+                    future.set_exception(error)
+            self._queues[priority].clear()
+        if self._space is not None:
+            self._space.set()
@@ -0,0 +1,110 @@
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+CATCH_UP_POLICIES = ("burst", "reset", "drop")
+
+
+class FramePacer:
+    """按单调时钟以帧时长为节拍放行音频帧，使文件或缓冲区输入的发送节奏与实时麦克风一致
+
+    允许领先实时最多burst帧；落后超过一帧时按catch_up策略处理：
+    - "burst": 保持原时间表，立即连续发送落后的帧直到追上
+    - "reset": 以当前时刻重新对齐时间表，之后的帧整体顺延
+    - "drop": 丢弃落后的帧（wait返回False），保持与实时同步
+    两次发送间隔超过idle_reset秒时视为新的一段输入，重新开始计时，不计为迟到。
+    """
+
+    def __init__(self, frame_duration: float, burst: int = 3, speed: float = 1.0,
+                 catch_up: str = "burst", idle_reset: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep):
+        """
+        Args:
+            frame_duration: 每帧时长（秒）
+            burst: 允许领先实时的帧数
+            speed: 发送倍速，2.0表示以两倍实时速度发送
+            catch_up: 落后时的追赶策略，"burst"、"reset"或"drop"
+            idle_reset: 超过该空闲时间（秒）后重新开始计时
+            clock: 单调时钟
+            sleep: 异步等待函数
+        """
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"不支持的追赶策略: {catch_up}")
+        if speed <= 0:
+            raise ValueError("speed必须大于0")
+        self.frame_duration = frame_duration
+        self.burst = burst
+        self.speed = speed
+        self.catch_up = catch_up
+        self.idle_reset = idle_reset
+        self._clock = clock
+        self._sleep = sleep
+        self.reset()
+
+    @property
+    def interval(self) -> float:
+        """相邻两帧的放行间隔（秒）"""
+        return self.frame_duration / self.speed
+
+    def reset(self):
+        """清空时间表和统计"""
+        self._anchor = None
+        self._index = 0
+        self._last = 0.0
+        self.frames = 0  # 放行的帧数
+        self.late_frames = 0  # 落后实时超过1/4帧放行的帧数
+        self.dropped_frames = 0  # drop策略丢弃的帧数
+        self.resets = 0  # reset策略重新对齐的次数
+        self.max_lateness = 0.0  # 最大落后时间（秒）
+        self.drift = 0.0  # 最近一帧相对实时的偏差（秒），正数表示落后
+        self.slept = 0.0  # 累计等待时间（秒）
+
+    async def wait(self) -> bool:
+        """等到下一帧的发送时刻，返回False表示该帧应丢弃"""
+        now = self._clock()
+        interval = self.interval
+        if self._anchor is None or now - self._last > self.idle_reset:
+            self._anchor = now
+            self._index = 0
+
+        # 领先实时超过burst帧时等待
+        due = self._anchor + (self._index - self.burst) * interval
+        if due > now:
+            await self._sleep(due - now)
+            self.slept += due - now
+            now = self._clock()
+
+        lateness = now - (self._anchor + self._index * interval)
+        if lateness > interval:
+            if self.catch_up == "drop":
+                self._index += 1
+                self._last = now
+                self.dropped_frames += 1
+                self.drift = lateness
+                return False
+            if self.catch_up == "reset":
+                self._anchor = now - self._index * interval
+                self.resets += 1
+                lateness = 0.0
+        if lateness > interval / 4:
+            self.late_frames += 1
+        if lateness > self.max_lateness:
+            self.max_lateness = lateness
+        self.drift = lateness
+        self._index += 1
+        self._last = now
+        self.frames += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """发送节奏统计，时间单位为毫秒"""
+        return {
+            "frames": self.frames,
+            "late_frames": self.late_frames,
+            "dropped_frames": self.dropped_frames,
+            "resets": self.resets,
+            "max_lateness_ms": self.max_lateness * 1000,
+            "drift_ms": self.drift * 1000,
+            "slept_ms": self.slept * 1000,
+        }
@@ -0,0 +1,96 @@
+import ctypes
+import math
+from typing import List
+
+import numpy as np
+import opuslib
+import opuslib.api
+import opuslib.api.encoder
+
+# 单个Opus包的最大字节数（libopus推荐值）
+MAX_PACKET_BYTES = 4000
+
+
+def frame_rms(block: np.ndarray) -> float:
+    """计算一帧float32音频的均方根强度，不产生临时数组"""
+    n = block.size
+    if n == 0:
+        return 0.0
+    return math.sqrt(float(np.dot(block, block)) / n)
+
+
+class FramePool:
+    """预分配的采集帧环形池
+
+    采集回调把音频块拷贝进下一个槽位后入队，消费者编码完即可复用该槽位。
+    只要队列中排队的帧数不超过 ``slots - 2``，写入的槽位就不会覆盖尚未处理的帧。
+    """
+
+    def __init__(self, slots: int, frame_size: int, channels: int = 1):
+        self.slots = slots
+        self._storage = np.zeros((slots, frame_size, channels), dtype=np.float32)
+        # 预先生成视图对象，取用槽位时不再创建新的ndarray
+        self._blocks: List[np.ndarray] = [self._storage[i] for i in range(slots)]
+        self._flat: List[np.ndarray] = [self._storage[i].reshape(-1) for i in range(slots)]
+        self._next = 0
+
+    def write(self, block: np.ndarray) -> np.ndarray:
+        """将形状为(frame_size, channels)的块拷贝进下一个槽位，返回该槽位的一维视图"""
+        index = self._next
+        self._next = (index + 1) % self.slots
+        np.copyto(self._blocks[index], block, casting='unsafe')
+        return self._flat[index]
+
+
+class PcmFrameEncoder:
+    """复用缓冲区的PCM转换与Opus编码
+
+    float32帧在预分配的缓冲区中原地完成增益、限幅和int16转换，
+    int16缓冲区以零拷贝的ctypes视图直接交给libopus，编码结果写入预分配的包缓冲区。
+    """
+
+    def __init__(self, frame_size: int, channels: int = 1):
+        self.frame_size = frame_size
+        self.channels = channels
+        self.frame_len = frame_size * channels
+        self._scratch = np.zeros(self.frame_len, dtype=np.float32)
+        self._pcm = np.zeros(self.frame_len, dtype=np.int16)
+        self.pcm = memoryview(self._pcm)
+        self._pcm_ptr = ctypes.cast(
+            (ctypes.c_int16 * self.frame_len).from_buffer(self._pcm),
+            opuslib.api.c_int16_pointer
+        )
+        self._packet = ctypes.create_string_buffer(MAX_PACKET_BYTES)
+
+    def load(self, block: np.ndarray, gain: float = 1.0) -> memoryview:
+        """把一帧float32音频转换为int16写入内部缓冲区，不足一帧时补零
+
+        Returns:
+            内部int16缓冲区的memoryview，下次调用load前有效
+        """
+        n = len(block)
+        if n == self.frame_len:
+            scratch = self._scratch
+            np.multiply(block, 32767.0 * gain, out=scratch)
+            np.clip(scratch, -32768.0, 32767.0, out=scratch)
+            np.copyto(self._pcm, scratch, casting='unsafe')
+        else:
+            scratch = self._scratch[:n]
+            np.multiply(block, 32767.0 * gain, out=scratch)
+            np.clip(scratch, -32768.0, 32767.0, out=scratch)
+            np.copyto(self._pcm[:n], scratch, casting='unsafe')
+            self._pcm[n:] = 0
+        return self.pcm
+
+    def encode(self, encoder: opuslib.Encoder) -> bytes:
+        """用给定编码器编码当前缓冲区中的帧"""
+        result = opuslib.api.encoder.libopus_encode(
+            encoder.encoder_state,
+            self._pcm_ptr,
+            self.frame_size,
+            self._packet,
+            MAX_PACKET_BYTES
+        )
+        if result < 0:
+            raise opuslib.OpusError(f'Opus Encoder returned result="{result}"')
+        return ctypes.string_at(self._packet, result)
@@ -0,0 +1,186 @@
+import io
+import sys
+import pstats
+import asyncio
+import cProfile
+import threading
+from enum import Enum
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class Stage(Enum):
+    """音频管线各阶段"""
+    CONDITION = "condition"  # 采集回调中的输入预处理（高通、降噪、自动增益）
+    CAPTURE_WAIT = "capture_wait"  # input_callback入队 → _process_input取出
+    PROCESS_INPUT = "process_input"  # _process_input处理一帧
+    ENCODE = "encode"  # send_audio中的PCM转换与Opus编码
+    SEND = "send"  # send_audio中的websocket发送
+    RECEIVE = "receive"  # _message_handler分发一帧
+    DECODE_WAIT = "decode_wait"  # 收到音频包 → _process_audio_queue取出
+    DECODE = "decode"  # _process_audio_queue解码一包
+    PLAY_WAIT = "play_wait"  # _run_audio_player放入缓冲 → 播放线程取出
+    PLAY_WRITE = "play_write"  # 播放线程写入设备
+
+
+class StageProfiler:
+    """各阶段纳秒级耗时统计
+
+    每个阶段保留最近window个样本用于分位数统计，同时累计总次数、总耗时和最大值。
+    记录开销约为一次列表写入，可以长期开启；注册的钩子会在每次记录时被调用。
+    """
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._samples: Dict[Stage, List[int]] = {stage: [0] * window for stage in Stage}
+        self._counts: Dict[Stage, int] = {stage: 0 for stage in Stage}
+        self._totals: Dict[Stage, int] = {stage: 0 for stage in Stage}
+        self._maxima: Dict[Stage, int] = {stage: 0 for stage in Stage}
+        self._hooks: List[Callable[[Stage, int], None]] = []
+
+    def add_hook(self, hook: Callable[[Stage, int], None]):
+        """注册钩子，参数为(阶段, 耗时纳秒)，可能在音频线程中被调用"""
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[Stage, int], None]):
+        self._hooks.remove(hook)
+
+    def record(self, stage: Stage, duration_ns: int):
+        count = self._counts[stage]
+        self._samples[stage][count % self.window] = duration_ns
+        self._counts[stage] = count + 1
+        self._totals[stage] += duration_ns
+        if duration_ns > self._maxima[stage]:
+            self._maxima[stage] = duration_ns
+        for hook in self._hooks:
+            hook(stage, duration_ns)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """各阶段统计，时间单位为毫秒"""
+        result = {}
+        for stage in Stage:
+            count = self._counts[stage]
+            if not count:
+                continue
+            recent = sorted(self._samples[stage][:min(count, self.window)])
+
+            def percentile(p: float) -> float:
+                return recent[min(len(recent) - 1, int(p * len(recent)))] / 1e6
+
+            result[stage.value] = {
+                "count": count,
+                "mean_ms": self._totals[stage] / count / 1e6,
+                "p50_ms": percentile(0.50),
+                "p95_ms": percentile(0.95),
+                "p99_ms": percentile(0.99),
+                "max_ms": self._maxima[stage] / 1e6,
+            }
+        return result
+
+    def report(self) -> str:
+        """格式化的统计表"""
+        lines = [f"{'阶段':<14} {'次数':>8} {'平均ms':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'最大':>9}"]
+        for name, row in self.summary().items():
+            lines.append(
+                f"{name:<14} {row['count']:>8} {row['mean_ms']:>9.3f} {row['p50_ms']:>9.3f} "
+                f"{row['p95_ms']:>9.3f} {row['p99_ms']:>9.3f} {row['max_ms']:>9.3f}"
+            )
+        return "\n".join(lines)
+
+    def reset(self):
+        for stage in Stage:
+            self._counts[stage] = 0
+            self._totals[stage] = 0
+            self._maxima[stage] = 0
+
+
+class SamplingProfiler:
+    """基于sys._current_frames的采样分析器，覆盖所有线程（包括音频回调线程）"""
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack: List[str] = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def top_functions(self, limit: int = 30) -> List[Tuple[str, int]]:
+        """按栈顶（自身）采样次数排序的函数"""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            if stack:
+                leaves[stack[-1]] += count
+        return leaves.most_common(limit)
+
+    def report(self, limit: int = 30) -> str:
+        lines = [f"采样 {self.samples} 次，间隔 {self.interval * 1000:.1f}ms"]
+        for name, count in self.top_functions(limit):
+            lines.append(f"{count:>8}  {name}")
+        return "\n".join(lines)
+
+    def write_collapsed(self, path: str):
+        """输出折叠栈格式，可直接用flamegraph工具生成火焰图"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.items():
+                f.write(";".join(stack) + f" {count}\n")
+
+
+async def profile_window(duration: float, mode: str = "cprofile", output: Optional[str] = None,
+                         interval: float = 0.005) -> str:
+    """在一段时间窗口内对当前进程做性能分析，返回文本报告
+
+    Args:
+        duration: 分析时长（秒）
+        mode: "cprofile"（事件循环线程的确定性分析）或"sampling"（所有线程的采样分析）
+        output: 可选的输出文件，cprofile为pstats格式，sampling为折叠栈格式
+        interval: 采样间隔（仅sampling模式）
+    """
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            profiler.disable()
+        if output:
+            profiler.dump_stats(output)
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(30)
+        return stream.getvalue()
+    if mode == "sampling":
+        sampler = SamplingProfiler(interval)
+        sampler.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            sampler.stop()
+        if output:
+            sampler.write_collapsed(output)
+        return sampler.report()
+    raise ValueError(f"不支持的分析模式: {mode}")
@@ -0,0 +1,152 @@
+import math
+from typing import List
+
+import numpy as np
+
+
+class PolyphaseResampler:
+    """流式多相重采样器
+
+    滤波器组在构造时预先计算，处理时按输出样点的相位查表并一次性向量化完成卷积；
+    块与块之间保留历史样本和相位，因此可以对连续的音频块逐块调用 ``process``。
+
+    Example:
+        resampler = PolyphaseResampler(48000, 16000)
+        out = resampler.process(block)  # block: float32, 形状(n,)或(n, channels)
+    """
+
+    def __init__(self, in_rate: int, out_rate: int, channels: int = 1,
+                 num_zeros: int = 8, rolloff: float = 0.9, beta: float = 8.6):
+        """
+        Args:
+            in_rate: 输入采样率
+            out_rate: 输出采样率
+            channels: 声道数
+            num_zeros: 低通滤波器单侧过零点个数，越大过渡带越陡、延迟越大
+            rolloff: 截止频率相对奈奎斯特频率的比例
+            beta: Kaiser窗参数
+        """
+        if in_rate <= 0 or out_rate <= 0:
+            raise ValueError("采样率必须大于0")
+        g = math.gcd(in_rate, out_rate)
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.channels = channels
+        self.up = out_rate // g
+        self.down = in_rate // g
+
+        L, M = self.up, self.down
+        # 在上采样域设计原型低通滤波器
+        cutoff = rolloff * 0.5 / max(L, M)
+        half = num_zeros * max(L, M)
+        self.taps = max(1, math.ceil((2 * half + 1) / L))
+        n = self.taps * L
+        m = np.arange(n) - (n - 1) / 2.0
+        h = 2 * cutoff * np.sinc(2 * cutoff * m) * np.kaiser(n, beta)
+        h *= L / h.sum()
+
+        # bank[p, k] = h[k*L + p]，再沿k反转，使窗口可以按升序索引输入
+        bank = h.reshape(self.taps, L).T
+        self._bank = np.ascontiguousarray(bank[:, ::-1], dtype=np.float32)
+
+        self._plans = {}
+        self.reset()
+
+    @property
+    def latency(self) -> float:
+        """滤波器群延迟（秒）"""
+        return (self.taps * self.up - 1) / 2.0 / (self.in_rate * self.up)
+
+    def reset(self):
+        """清空历史样本和相位，开始新的流"""
+        self._history = np.zeros((self.taps - 1, self.channels), dtype=np.float32)
+        self._work = np.zeros((0, self.channels), dtype=np.float32)
+        self._t = 0
+
+    def output_length(self, n_in: int) -> int:
+        """在当前状态下处理n_in个输入样点将产生的输出样点数"""
+        return max(0, -(-(n_in * self.up - self._t) // self.down))
+
+    def _plan(self, n_in: int):
+        key = (n_in, self._t)
+        plan = self._plans.get(key)
+        if plan is None:
+            n_out = self.output_length(n_in)
+            t = self._t + np.arange(n_out, dtype=np.int64) * self.down
+            starts = t // self.up
+            coeffs = self._bank[t % self.up]
+            t_next = self._t + n_out * self.down - n_in * self.up
+            plan = (starts, coeffs, t_next)
+            # 固定块长时相位序列是周期性的，缓存少量计划即可覆盖稳态
+            if len(self._plans) >= 16:
+                self._plans.clear()
+            self._plans[key] = plan
+        return plan
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """重采样一个音频块
+
+        Args:
+            block: float32数组，形状(n,)或(n, channels)
+        Returns:
+            重采样后的float32数组，维度与输入一致
+        """
+        squeeze = block.ndim == 1
+        x = block.reshape(-1, self.channels)
+        n_in = len(x)
+        if n_in == 0:
+            return np.zeros((0,) if squeeze else (0, self.channels), dtype=np.float32)
+
+        hist_len = self.taps - 1
+        total = hist_len + n_in
+        if len(self._work) != total:
+            self._work = np.empty((total, self.channels), dtype=np.float32)
+        work = self._work
+        work[:hist_len] = self._history
+        work[hist_len:] = x
+
+        starts, coeffs, t_next = self._plan(n_in)
+        windows = np.lib.stride_tricks.sliding_window_view(work, self.taps, axis=0)[starts]
+        out = np.einsum('nct,nt->nc', windows, coeffs)
+
+        self._history[:] = work[n_in:]
+        self._t = t_next
+        return out.reshape(-1) if squeeze else out
+
+
+class FrameAligner:
+    """把长度不定的音频块重新切分为固定长度的帧
+
+    重采样后的块长度在非整数比时会有±1样点的抖动，编码器却要求固定帧长。
+    """
+
+    def __init__(self, frame_size: int, channels: int = 1, dtype=np.float32):
+        self.frame_size = frame_size
+        self.channels = channels
+        self._buffer = np.zeros((frame_size * 4, channels), dtype=dtype)
+        self._fill = 0
+
+    def push(self, block: np.ndarray) -> List[np.ndarray]:
+        """写入一个块，返回所有已凑满的帧（每帧是独立的拷贝，形状(frame_size*channels,)）"""
+        data = block.reshape(-1, self.channels)
+        needed = self._fill + len(data)
+        if needed > len(self._buffer):
+            grown = np.zeros((needed * 2, self.channels), dtype=self._buffer.dtype)
+            grown[:self._fill] = self._buffer[:self._fill]
+            self._buffer = grown
+        self._buffer[self._fill:needed] = data
+        self._fill = needed
+
+        frames = []
+        offset = 0
+        while self._fill - offset >= self.frame_size:
+            frames.append(self._buffer[offset:offset + self.frame_size].reshape(-1).copy())
+            offset += self.frame_size
+        if offset:
+            remain = self._fill - offset
+            self._buffer[:remain] = self._buffer[offset:self._fill]
+            self._fill = remain
+        return frames
+
+    def reset(self):
+        self._fill = 0
@@ -0,0 +1,196 @@
+import time
+import struct
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+
+import websockets
+from loguru import logger
+
+# 文件头: 魔数 + 版本
+_MAGIC = b'XZSL'
+_VERSION = 1
+# 记录头: 标志位(方向/类型), 相对本段开始的纳秒数, 负载长度
+_RECORD = struct.Struct('<BqI')
+
+FLAG_OUTBOUND = 0x01
+FLAG_BINARY = 0x02
+FLAG_SEGMENT = 0x04  # 段开始记录，每个SessionRecorder写入一条，没有负载
+
+
+@dataclass
+class SessionFrame:
+    """会话日志中的一帧"""
+    timestamp: float  # 相对本段开始的秒数
+    outbound: bool  # True为客户端发出，False为收到
+    data: Union[str, bytes]
+    segment: int = 0  # 所属录制段的序号，同一文件每追加录制一次为一段
+
+
+class SessionRecorder:
+    """把websocket收发的每一帧以单调时间戳追加写入紧凑的二进制日志
+
+    每次打开都以一条段开始记录开头，之后的时间戳相对本段开始计算。
+    """
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            path: 会话日志路径（追加写入）
+            clock: 单调时钟（秒），仿真模式下传入虚拟时钟，录制的时序才能确定地回放
+        """
+        self.path = path
+        self._clock = clock
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(_MAGIC + bytes([_VERSION]))
+        self._file.write(_RECORD.pack(FLAG_SEGMENT, 0, 0))
+        self._start = clock()
+        self.frames = 0
+
+    def record(self, data: Union[str, bytes, bytearray, memoryview], outbound: bool):
+        """记录一帧，文本按UTF-8写入"""
+        if self._file is None:
+            return
+        flags = FLAG_OUTBOUND if outbound else 0
+        if isinstance(data, str):
+            payload = data.encode('utf-8')
+        else:
+            payload = data
+            flags |= FLAG_BINARY
+        self._file.write(_RECORD.pack(flags, round((self._clock() - self._start) * 1e9), len(payload)))
+        self._file.write(payload)
+        self.frames += 1
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_session(path: str) -> Iterator[SessionFrame]:
+    """按顺序读取会话日志，每帧带有所属录制段的序号（从0开始）
+
+    同一文件多次追加录制时，时间戳会在每段开头归零。
+    """
+    with open(path, 'rb') as f:
+        header = f.read(len(_MAGIC) + 1)
+        if len(header) <= len(_MAGIC) or header[:len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"不是有效的会话日志: {path}")
+        if header[len(_MAGIC)] != _VERSION:
+            raise ValueError(f"不支持的会话日志版本{header[len(_MAGIC)]}: {path}")
+        segment = -1
+        while True:
+            head = f.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                return
+            flags, offset_ns, length = _RECORD.unpack(head)
+            payload = f.read(length)
+            if len(payload) < length:
+                return  # 录制中断导致的不完整记录
+            if flags & FLAG_SEGMENT:
+                segment += 1
+                continue
+            if segment < 0:
+                raise ValueError(f"会话日志缺少段开始记录: {path}")
+            data = payload if flags & FLAG_BINARY else payload.decode('utf-8')
+            yield SessionFrame(offset_ns / 1e9, bool(flags & FLAG_OUTBOUND), data, segment)
+
+
+def split_segments(frames: Iterable[SessionFrame]) -> List[List[SessionFrame]]:
+    """按录制段切分帧，第i项为第i段的帧（没有帧的段为空列表）"""
+    segments: List[List[SessionFrame]] = []
+    for frame in frames:
+        while len(segments) <= frame.segment:
+            segments.append([])
+        segments[frame.segment].append(frame)
+    return segments
+
+
+async def replay_frames(frames: List[SessionFrame], deliver, speed: float = 1.0):
+    """按原始时间间隔（除以speed）依次投递收到的帧，speed<=0表示不等待
+
+    跨段时以新段的第一帧重新计时，紧接上一段的最后一帧投递，段间的真实间隔没有记录。
+
+    Args:
+        frames: 待投递的帧
+        deliver: 异步投递函数，参数为帧数据
+        speed: 回放倍速
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    base = frames[0].timestamp if frames else 0.0
+    segment = frames[0].segment if frames else 0
+    last = base
+    for frame in frames:
+        if frame.segment != segment:
+            # 新的一段：把本段起点对齐到上一帧的投递时刻
+            start += (last - base) / speed if speed > 0 else 0.0
+            base = frame.timestamp
+            segment = frame.segment
+        last = frame.timestamp
+        if speed > 0:
+            delay = start + (frame.timestamp - base) / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await deliver(frame.data)
+
+
+class SessionReplayServer:
+    """本地替身服务器：客户端连接并发送hello后，按录制的时序回放服务端下发的所有帧
+
+    Example:
+        server = SessionReplayServer("session.xzsl", speed=4.0, segment=-1)
+        await server.start("localhost", 8765)
+        client = XiaozhiClient(ClientConfig(ws_url="ws://localhost:8765"))
+    """
+
+    def __init__(self, path: str, speed: float = 1.0, segment: Optional[int] = None):
+        """
+        Args:
+            path: 会话日志路径
+            speed: 回放倍速，<=0表示不等待
+            segment: 只回放指定的录制段（支持负数索引），None表示依次回放全部段
+        """
+        segments = split_segments(read_session(path))
+        self.segments = len(segments)
+        if segment is not None:
+            segments = [segments[segment]]
+        self.frames = [frame for frames in segments for frame in frames if not frame.outbound]
+        self.speed = speed
+        self.received: List[Union[str, bytes]] = []  # 客户端发来的帧
+        self._server = None
+
+    async def start(self, host: str = "localhost", port: int = 8765):
+        self._server = await websockets.serve(self.handle, host, port)
+        logger.info(f"会话回放服务器已启动: ws://{host}:{port}")
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def handle(self, websocket, path=None):
+        """处理一条连接，也可直接交给仿真模式的内存连接使用"""
+        # 第一帧为客户端hello，之后开始回放
+        hello = await websocket.recv()
+        self.received.append(hello)
+        receiver = asyncio.create_task(self._collect(websocket))
+        try:
+            await replay_frames(self.frames, websocket.send, self.speed)
+            # 回放结束后保持连接，直到客户端断开
+            await receiver
+        finally:
+            receiver.cancel()
+
+    async def _collect(self, websocket):
+        try:
+            async for message in websocket:
+                self.received.append(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
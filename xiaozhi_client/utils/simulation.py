@@ -0,0 +1,586 @@
+"""虚拟时钟仿真：在几秒内跑完数小时的对话
+
+仿真模式下客户端的所有定时（asyncio.sleep、wait_for、节拍器、耗时统计）都运行在虚拟时钟上：
+事件循环无事可做时不再真正等待，而是把虚拟时钟直接拨到下一个定时器。
+采集和播放使用由事件循环定时驱动的无头音频设备，websocket换成内存传输并连接到本地替身服务器，
+因此整个仿真在单个线程中确定地运行，统计出的延迟仍然以（虚拟的）真实时长计。
+
+Example:
+    sim = Simulation()
+
+    async def main():
+        client = XiaozhiClient(ClientConfig(ws_url="ws://simulated"))
+        client.enable_simulation(sim)
+        await client.connect()
+        for _ in range(100):
+            sim.audio.say(1.5)                 # 用户说话1.5秒
+            await client.start_voice_input()
+            await sim.server.wait_turns(1)    # 等服务端完成一轮回复
+            await client.stop_voice_input()
+        await client.close()
+
+    sim.run(main())
+"""
+import json
+import math
+import uuid
+import asyncio
+import selectors
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, List, Optional
+
+import numpy as np
+import opuslib
+import websockets
+from loguru import logger
+
+
+class VirtualClock:
+    """仿真时钟，只在事件循环空闲或显式advance时前进"""
+
+    def __init__(self, start: float = 0.0, epoch: Optional[float] = None):
+        self._now = start
+        self.epoch = time.time() if epoch is None else epoch  # 虚拟时刻0对应的Unix时间
+
+    def monotonic(self) -> float:
+        return self._now
+
+    def time(self) -> float:
+        """与monotonic同步前进的Unix时间"""
+        return self.epoch + self._now
+
+    def advance(self, seconds: float):
+        if seconds > 0:
+            self._now += seconds
+
+
+class _VirtualSelector(selectors.BaseSelector):
+    """没有就绪的I/O时，把等待时长直接计入虚拟时钟而不阻塞"""
+
+    def __init__(self, clock: VirtualClock):
+        self._selector = selectors.DefaultSelector()
+        self._clock = clock
+
+    def register(self, fileobj, events, data=None):
+        return self._selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self._selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self._selector.modify(fileobj, events, data)
+
+    def select(self, timeout=None):
+        ready = self._selector.select(0)
+        if ready or timeout == 0:
+            return ready
+        if timeout is None:
+            # 没有任何定时器，只能等待真实的I/O（例如其他线程的call_soon_threadsafe）
+            return self._selector.select(None)
+        self._clock.advance(timeout)
+        return []
+
+    def get_map(self):
+        return self._selector.get_map()
+
+    def close(self):
+        self._selector.close()
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """以VirtualClock为时间源的事件循环
+
+    其他线程中的工作不计入虚拟时间，仿真中的采集、播放和网络都应由事件循环驱动。
+    """
+
+    def __init__(self, clock: Optional[VirtualClock] = None):
+        self.clock = clock or VirtualClock()
+        super().__init__(_VirtualSelector(self.clock))
+
+    def time(self) -> float:
+        return self.clock.monotonic()
+
+
+# ---- 内存websocket ----
+
+class MemoryWebSocket:
+    """内存中的websocket端点，提供客户端和服务端处理函数用到的接口
+
+    每条消息按单向延迟latency投递，投递顺序与发送顺序一致。
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.closed = False
+        self.peer: Optional["MemoryWebSocket"] = None
+        self._inbox: asyncio.Queue = asyncio.Queue()
+        self._last_delivery = 0.0
+
+    async def send(self, data):
+        if self.closed:
+            raise websockets.exceptions.ConnectionClosedOK(None, None)
+        if isinstance(data, (bytearray, memoryview)):
+            data = bytes(data)
+        self.peer._deliver(data)
+
+    def _deliver(self, data):
+        loop = asyncio.get_running_loop()
+        deliver_at = max(loop.time() + self.latency, self._last_delivery)
+        self._last_delivery = deliver_at
+        self._inbox.put_nowait((deliver_at, data))
+
+    async def recv(self):
+        deliver_at, data = await self._inbox.get()
+        if data is None:
+            self.closed = True
+            raise websockets.exceptions.ConnectionClosedOK(None, None)
+        delay = deliver_at - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return data
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.recv()
+        except websockets.exceptions.ConnectionClosed:
+            raise StopAsyncIteration
+
+    async def ping(self) -> asyncio.Future:
+        """返回在一个往返时延后完成的future"""
+        loop = asyncio.get_running_loop()
+        pong = loop.create_future()
+        loop.call_later(self.latency * 2, lambda: pong.done() or pong.set_result(None))
+        return pong
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        if self.closed:
+            return
+        self.closed = True
+        self._inbox.put_nowait((0.0, None))
+        if self.peer is not None and not self.peer.closed:
+            self.peer._inbox.put_nowait((0.0, None))
+
+    async def wait_closed(self):
+        while not self.closed:
+            await asyncio.sleep(0.1)
+
+
+def memory_pair(latency: float = 0.0):
+    """创建一对互联的内存websocket端点 (客户端, 服务端)"""
+    client, server = MemoryWebSocket(latency), MemoryWebSocket(latency)
+    client.peer, server.peer = server, client
+    return client, server
+
+
+# ---- 无头音频设备 ----
+
+class _SimulatedStream:
+    """sounddevice流的仿真基类"""
+
+    def __init__(self, backend: "SimulatedAudioBackend", samplerate=16000, channels=1, dtype=np.float32,
+                 blocksize=0, callback=None, **kwargs):
+        self.backend = backend
+        self.samplerate = int(samplerate)
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.blocksize = blocksize or self.samplerate // 100
+        self.callback = callback
+        self.active = False
+        self.closed = False
+
+    def start(self):
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+    def abort(self):
+        self.stop()
+
+    def close(self):
+        self.stop()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SimulatedInputStream(_SimulatedStream):
+    """按虚拟时钟每块时长调用一次回调，数据取自后端的输入脚本"""
+
+    latency = 0.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._next = 0.0
+
+    def start(self):
+        super().start()
+        if self.callback is None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._next = self._loop.time()
+        self._timer = self._loop.call_at(self._next, self._tick)
+
+    def _tick(self):
+        if not self.active:
+            return
+        block = self.backend._read_input(self.blocksize, self.channels)
+        if self.dtype != np.float32:
+            block = (block * 32767).astype(self.dtype)
+        self.callback(block, self.blocksize, None, None)
+        # 按固定时间表调度下一块，避免累积漂移
+        self._next += self.blocksize / self.samplerate
+        self._timer = self._loop.call_at(self._next, self._tick)
+
+    def stop(self):
+        super().stop()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+class SimulatedOutputStream(_SimulatedStream):
+    """立即返回的播放流，按虚拟时钟模拟设备缓冲的消耗
+
+    loop_driven为True，客户端据此在事件循环中直接写入而不启动播放线程。
+    """
+
+    loop_driven = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._played_until = 0.0
+
+    @property
+    def latency(self) -> float:
+        """设备缓冲中尚未播放的时长（秒）"""
+        return max(0.0, self._played_until - self.backend.clock.monotonic())
+
+    def write(self, data):
+        data = np.asarray(data)
+        frames = len(data) // self.channels if data.ndim == 1 else len(data)
+        now = self.backend.clock.monotonic()
+        # 上一段写入播完后短时间内又有数据到来，视为播放中途断流；间隔更长则是新的一段播放
+        if self._played_until and 0 < now - self._played_until < self.backend.underrun_gap:
+            self.backend.underruns += 1
+        start = max(now, self._played_until)
+        self._played_until = start + frames / self.samplerate
+        self.backend.frames_played += frames
+        self.backend.seconds_played += frames / self.samplerate
+        if self.backend.keep_output:
+            self.backend.output.append((start, data.copy()))
+
+
+class SimulatedAudioBackend:
+    """由事件循环驱动的无头音频设备，接口与AudioWorker相同（input_stream/output_stream）
+
+    输入按say/feed排入的脚本播放，脚本为空时输出静音（可叠加噪声）。
+    """
+
+    def __init__(self, clock: VirtualClock, noise_level: float = 0.0, keep_output: bool = False,
+                 seed: int = 0, underrun_gap: float = 0.5):
+        self.clock = clock
+        self.underrun_gap = underrun_gap  # 短于该时长的播放间断计为断流（秒）
+        self.noise_level = noise_level
+        self.keep_output = keep_output
+        self._script: Deque[np.ndarray] = deque()
+        self._rng = np.random.default_rng(seed)
+        self.speech_ends: List[float] = []  # 每段say语音在虚拟时钟上的结束时刻
+        self._pending_ends: Deque[int] = deque()  # 对应段结束时已读取的样点数
+        self._samples_read = 0
+        self._samples_queued = 0
+        self.frames_played = 0
+        self.seconds_played = 0.0
+        self.underruns = 0
+        self.output: List[tuple] = []  # keep_output时保存(开始时刻, 数据)
+
+    def input_stream(self, callback=None, **kwargs) -> SimulatedInputStream:
+        return SimulatedInputStream(self, callback=callback, **kwargs)
+
+    def output_stream(self, **kwargs) -> SimulatedOutputStream:
+        return SimulatedOutputStream(self, **kwargs)
+
+    def feed(self, samples: np.ndarray):
+        """排入一段float32麦克风输入（单声道一维，或(frames, channels)）"""
+        samples = np.asarray(samples, dtype=np.float32)
+        self._script.append(samples)
+        self._samples_queued += len(samples)
+
+    def say(self, seconds: float, level: float = 0.2, sample_rate: int = 16000,
+            frequency: float = 220.0, pause: float = 0.0):
+        """排入一段近似语音的调幅音调，之后可跟一段静音；结束时刻记入speech_ends"""
+        n = int(seconds * sample_rate)
+        t = np.arange(n) / sample_rate
+        envelope = 0.6 + 0.4 * np.sin(2 * math.pi * 4.0 * t)
+        self.feed((level * math.sqrt(2) * envelope * np.sin(2 * math.pi * frequency * t)).astype(np.float32))
+        self._pending_ends.append(self._samples_queued)
+        self._sample_rate = sample_rate
+        if pause > 0:
+            self.feed(np.zeros(int(pause * sample_rate), dtype=np.float32))
+
+    def silence(self, seconds: float, sample_rate: int = 16000):
+        self.feed(np.zeros(int(seconds * sample_rate), dtype=np.float32))
+
+    @property
+    def script_seconds(self) -> float:
+        """脚本中尚未读取的输入时长（按最近一次say的采样率）"""
+        return (self._samples_queued - self._samples_read) / getattr(self, '_sample_rate', 16000)
+
+    def _read_input(self, frames: int, channels: int) -> np.ndarray:
+        block = np.zeros((frames, channels), dtype=np.float32)
+        filled = 0
+        while filled < frames and self._script:
+            head = self._script[0]
+            take = min(frames - filled, len(head))
+            block[filled:filled + take] = head[:take].reshape(take, -1)
+            if take == len(head):
+                self._script.popleft()
+            else:
+                self._script[0] = head[take:]
+            filled += take
+        self._samples_read += filled
+        while self._pending_ends and self._samples_read >= self._pending_ends[0]:
+            self._pending_ends.popleft()
+            self.speech_ends.append(self.clock.monotonic())
+        if self.noise_level > 0:
+            block += self._rng.standard_normal(block.shape).astype(np.float32) * self.noise_level
+        return block
+
+
+# ---- 替身服务器 ----
+
+@dataclass
+class ServerTurn:
+    """替身服务器完成的一轮，时刻均为虚拟时钟"""
+    stt: str
+    requested: float  # 收到listen stop（语音）或detect（文本）
+    first_audio: Optional[float] = None  # 发出第一个TTS音频包
+    finished: Optional[float] = None  # 发出tts stop
+    aborted: bool = False
+    audio_frames: int = 0  # 本轮收到的上行音频帧数
+
+    @property
+    def response_latency(self) -> Optional[float]:
+        return None if self.first_audio is None else self.first_audio - self.requested
+
+
+def _default_replies(text: str) -> List[str]:
+    return [f"你说的是：{text}。", "还有什么可以帮你的吗？"]
+
+
+class SimulatedServer:
+    """本地替身服务器：按协议回复hello，对每次listen stop或文本请求回复一轮stt/llm/tts
+
+    TTS音频按帧时长实时下发（可预发lead_frames帧），时长由回复文字数决定。
+    """
+
+    def __init__(self, replies: Callable[[str], List[str]] = _default_replies,
+                 transcripts: Optional[List[str]] = None, think_time: float = 0.3,
+                 seconds_per_char: float = 0.2, lead_frames: int = 3,
+                 audio_params: Optional[dict] = None):
+        """
+        Args:
+            replies: 由识别文本生成回复句子列表
+            transcripts: 依次作为语音轮次的识别结果，用完后循环；None时生成"语音N"
+            think_time: 收到请求到开始回复的时间（秒）
+            seconds_per_char: 每个回复字符对应的TTS时长（秒）
+            lead_frames: TTS音频领先实时下发的帧数
+            audio_params: hello中下发的下行音频参数，None表示沿用客户端的上行参数
+        """
+        self.replies = replies
+        self.transcripts = transcripts
+        self.think_time = think_time
+        self.seconds_per_char = seconds_per_char
+        self.lead_frames = lead_frames
+        self.audio_params = audio_params
+        self.turns: List[ServerTurn] = []
+        self.received_audio = 0
+        self.received_text: List[dict] = []
+        self._turn_done: Optional[asyncio.Condition] = None
+        self._voice_turns = 0
+
+    async def handle(self, websocket):
+        """处理一条连接，接口与websockets.serve的处理函数相同"""
+        hello = json.loads(await websocket.recv())
+        params = dict(self.audio_params or hello.get('audio_params') or {})
+        params.setdefault('format', 'opus')
+        params.setdefault('sample_rate', 16000)
+        params.setdefault('channels', 1)
+        params.setdefault('frame_duration', 60)
+        await websocket.send(json.dumps({
+            "type": "hello", "transport": "websocket",
+            "session_id": uuid.uuid4().hex, "audio_params": params
+        }))
+        packet = self._tts_packet(params)
+        frame_seconds = params['frame_duration'] / 1000.0
+        reply: Optional[asyncio.Task] = None
+        listening = False
+        heard = 0
+        try:
+            async for message in websocket:
+                if not isinstance(message, str):
+                    self.received_audio += 1
+                    if listening:
+                        heard += 1
+                    continue
+                msg = json.loads(message)
+                self.received_text.append(msg)
+                kind, state = msg.get('type'), msg.get('state')
+                now = asyncio.get_running_loop().time()
+                if kind == 'listen' and state == 'start':
+                    listening, heard = True, 0
+                elif kind == 'listen' and state == 'stop':
+                    listening = False
+                    if heard:
+                        turn = ServerTurn(self._next_transcript(), now, audio_frames=heard)
+                        reply = self._start_reply(websocket, turn, packet, frame_seconds, reply)
+                elif kind == 'listen' and state == 'detect':
+                    turn = ServerTurn(msg.get('text', ''), now)
+                    reply = self._start_reply(websocket, turn, packet, frame_seconds, reply)
+                elif kind == 'abort' and reply is not None and not reply.done():
+                    reply.cancel()
+        finally:
+            if reply is not None:
+                reply.cancel()
+
+    def _next_transcript(self) -> str:
+        self._voice_turns += 1
+        if self.transcripts:
+            return self.transcripts[(self._voice_turns - 1) % len(self.transcripts)]
+        return f"语音{self._voice_turns}"
+
+    def _start_reply(self, websocket, turn: ServerTurn, packet: bytes, frame_seconds: float,
+                     previous: Optional[asyncio.Task]) -> asyncio.Task:
+        # 新请求打断尚未结束的回复
+        if previous is not None and not previous.done():
+            previous.cancel()
+        return asyncio.create_task(self._reply(websocket, turn, packet, frame_seconds))
+
+    async def _reply(self, websocket, turn: ServerTurn, packet: bytes, frame_seconds: float):
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.sleep(self.think_time)
+            await websocket.send(json.dumps({"type": "stt", "text": turn.stt}, ensure_ascii=False))
+            await websocket.send(json.dumps({"type": "llm", "text": "😊", "emotion": "happy"}, ensure_ascii=False))
+            await websocket.send(json.dumps({"type": "tts", "state": "start"}))
+            started = loop.time()
+            sent = 0
+            for sentence in self.replies(turn.stt):
+                await websocket.send(json.dumps({"type": "tts", "state": "sentence_start", "text": sentence},
+                                                ensure_ascii=False))
+                frames = max(1, round(len(sentence) * self.seconds_per_char / frame_seconds))
+                for _ in range(frames):
+                    # 领先实时不超过lead_frames帧
+                    delay = started + (sent - self.lead_frames) * frame_seconds - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    await websocket.send(packet)
+                    if turn.first_audio is None:
+                        turn.first_audio = loop.time()
+                    sent += 1
+                await websocket.send(json.dumps({"type": "tts", "state": "sentence_end", "text": sentence},
+                                                ensure_ascii=False))
+        except asyncio.CancelledError:
+            turn.aborted = True
+        finally:
+            turn.finished = loop.time()
+            if not websocket.closed:
+                try:
+                    await websocket.send(json.dumps({"type": "tts", "state": "stop"}))
+                except websockets.exceptions.ConnectionClosed:
+                    pass
+            self.turns.append(turn)
+            await self._notify()
+
+    async def _notify(self):
+        if self._turn_done is None:
+            self._turn_done = asyncio.Condition()
+        async with self._turn_done:
+            self._turn_done.notify_all()
+
+    async def wait_turns(self, count: int, timeout: Optional[float] = None):
+        """等待累计完成count轮（虚拟时钟的timeout秒内）"""
+        if self._turn_done is None:
+            self._turn_done = asyncio.Condition()
+        async with self._turn_done:
+            await asyncio.wait_for(self._turn_done.wait_for(lambda: len(self.turns) >= count), timeout)
+
+    @staticmethod
+    def _tts_packet(params: dict) -> bytes:
+        """按下行参数编码一帧音调作为所有TTS音频包"""
+        rate, channels = params['sample_rate'], params['channels']
+        frame_size = rate * params['frame_duration'] // 1000
+        t = np.arange(frame_size) / rate
+        tone = (0.2 * np.sin(2 * math.pi * 330.0 * t) * 32767).astype(np.int16)
+        pcm = np.repeat(tone[:, None], channels, axis=1).tobytes()
+        return opuslib.Encoder(rate, channels, 'voip').encode(pcm, frame_size)
+
+
+class Simulation:
+    """把虚拟时钟、无头音频设备和替身服务器组装在一起
+
+    在sim.run中运行的协程里创建客户端，并在connect之前调用 ``client.enable_simulation(sim)``。
+    """
+
+    def __init__(self, server: Optional[Any] = None, latency: float = 0.02,
+                 clock: Optional[VirtualClock] = None, noise_level: float = 0.0):
+        """
+        Args:
+            server: 替身服务器，需提供async handle(websocket)；默认SimulatedServer()，
+                也可使用SessionReplayServer回放录制的会话
+            latency: 网络单向延迟（虚拟秒）
+            clock: 虚拟时钟
+            noise_level: 麦克风底噪的标准差
+        """
+        self.clock = clock or VirtualClock()
+        self.server = server if server is not None else SimulatedServer()
+        self.latency = latency
+        self.audio = SimulatedAudioBackend(self.clock, noise_level)
+        self.connections: List[MemoryWebSocket] = []
+
+    async def connect(self, url: str = "", **kwargs) -> MemoryWebSocket:
+        """代替websockets.connect：创建内存连接并在后台运行服务端处理函数"""
+        client, server = memory_pair(self.latency)
+        self.connections.append(client)
+        asyncio.create_task(self._serve(server))
+        return client
+
+    async def _serve(self, websocket: MemoryWebSocket):
+        try:
+            await self.server.handle(websocket)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.error(f"替身服务器错误: {e}")
+        finally:
+            await websocket.close()
+
+    def run(self, main: Awaitable[Any]) -> Any:
+        """在虚拟时钟事件循环中运行协程并返回其结果，结束后取消遗留的任务"""
+        loop = VirtualEventLoop(self.clock)
+        try:
+            previous = asyncio.get_event_loop_policy().get_event_loop()
+        except RuntimeError:
+            previous = None
+        asyncio.set_event_loop(loop)
+        try:
+            return loop.run_until_complete(main)
+        finally:
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+            asyncio.set_event_loop(previous)
@@ -0,0 +1,110 @@
+import time
+import itertools
+from enum import IntEnum
+from typing import Any, List, NamedTuple
+
+from loguru import logger
+
+
+class TraceEvent(IntEnum):
+    """追踪事件类型"""
+    HELLO = 1
+    STT = 2
+    LLM = 3
+    TTS_START = 4
+    TTS_SENTENCE = 5
+    TTS_STOP = 6
+    AUDIO_IN = 7  # value: 音频包字节数
+    AUDIO_OUT = 8  # value: 帧数, metric: 强度
+    LISTEN = 9
+    ABORT = 10  # value: 丢弃的本地音频条目数
+    BARGE_IN = 11
+    IOT = 12
+    ERROR = 13  # obj: 异常对象
+    OTHER = 14
+    ADAPT = 15  # value: 比特率, metric: 预期丢包率（%）
+
+
+class TraceRecord(NamedTuple):
+    timestamp_ns: int
+    event: TraceEvent
+    value: int
+    metric: float
+    obj: Any
+
+    def format(self, base_ns: int = 0) -> str:
+        text = f"{(self.timestamp_ns - base_ns) / 1e6:12.3f}ms {self.event.name:<12} value={self.value} metric={self.metric:.5f}"
+        if self.obj is not None:
+            text += f" {self.obj!r}"
+        return text
+
+
+class TraceBuffer:
+    """预分配的结构化事件环形缓冲区
+
+    记录时只写入固定大小的数值字段和一个对象引用，不做任何字符串格式化；
+    格式化只在dump时进行。缓冲区写满后覆盖最旧的事件。
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        # 定长列表逐列存放字段，写入只是替换槽位引用
+        self._timestamps: List[int] = [0] * capacity
+        self._events: List[int] = [0] * capacity
+        self._values: List[int] = [0] * capacity
+        self._metrics: List[float] = [0.0] * capacity
+        self._objects: List[Any] = [None] * capacity
+        self._counter = itertools.count()
+        self._written = 0
+
+    def record(self, event: TraceEvent, value: int = 0, metric: float = 0.0, obj: Any = None):
+        """记录一个事件，可以在任意线程调用"""
+        seq = next(self._counter)
+        index = seq % self.capacity
+        self._timestamps[index] = time.monotonic_ns()
+        self._events[index] = event
+        self._values[index] = value
+        self._metrics[index] = metric
+        self._objects[index] = obj
+        self._written = seq + 1
+
+    def __len__(self) -> int:
+        return min(self._written, self.capacity)
+
+    def snapshot(self) -> List[TraceRecord]:
+        """按时间顺序返回当前缓冲区中的全部事件"""
+        written = self._written
+        count = min(written, self.capacity)
+        start = written - count
+        records = []
+        for seq in range(start, written):
+            index = seq % self.capacity
+            records.append(TraceRecord(
+                self._timestamps[index],
+                TraceEvent(self._events[index]),
+                self._values[index],
+                self._metrics[index],
+                self._objects[index],
+            ))
+        return records
+
+    def dump(self, reason: str = "", sink=None) -> List[str]:
+        """格式化全部事件并输出
+
+        Args:
+            reason: 触发dump的原因
+            sink: 接收每一行文本的函数，默认写入logger
+        """
+        records = self.snapshot()
+        base = records[0].timestamp_ns if records else 0
+        lines = [record.format(base) for record in records]
+        sink = sink or logger.warning
+        sink(f"追踪记录 ({len(lines)} 条){': ' + reason if reason else ''}")
+        for line in lines:
+            sink(line)
+        return lines
+
+    def clear(self):
+        self._counter = itertools.count()
+        self._written = 0
+        self._objects = [None] * self.capacity
@@ -0,0 +1,167 @@
+import os
+import re
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+from xiaozhi_client.utils.wav import WavReader
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCT = re.compile(r"[\s。．.!！?？,，、;；:：~～…]+$")
+
+
+def normalize_text(text: str) -> str:
+    """归一化句子文本作为缓存键：全半角统一、去除多余空白和句末标点、英文小写"""
+    text = unicodedata.normalize("NFKC", text or "")
+    text = _WHITESPACE.sub(" ", text).strip().lower()
+    return _TRAILING_PUNCT.sub("", text)
+
+
+class TtsCache:
+    """按句子文本缓存解码后PCM的LRU缓存
+
+    内存部分按字节数限制容量，淘汰的条目可选写入磁盘目录（同样按字节数LRU淘汰），
+    命中磁盘的条目会重新提升到内存。
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, spill_dir: Optional[str] = None,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            max_bytes: 内存中缓存的最大字节数
+            spill_dir: 溢出到磁盘的目录，None表示不落盘
+            max_disk_bytes: 磁盘缓存的最大字节数
+        """
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._memory) + len(self._disk)
+
+    def __contains__(self, text: str) -> bool:
+        key = normalize_text(text)
+        return key in self._memory or key in self._disk
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        return {
+            "entries": len(self),
+            "memory_bytes": self._memory_bytes,
+            "disk_bytes": self._disk_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+    def get(self, text: str) -> Optional[bytes]:
+        """查询句子对应的PCM，未命中返回None"""
+        key = normalize_text(text)
+        if not key:
+            return None
+        pcm = self._memory.get(key)
+        if pcm is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return pcm
+        if key in self._disk:
+            pcm = self._load_spilled(key)
+            if pcm is not None:
+                self.hits += 1
+                self.disk_hits += 1
+                self._store(key, pcm)
+                return pcm
+        self.misses += 1
+        return None
+
+    def put(self, text: str, pcm: bytes):
+        """写入一句的PCM，超过内存容量的单条数据不缓存"""
+        key = normalize_text(text)
+        if not key or not pcm or len(pcm) > self.max_bytes:
+            return
+        self._store(key, bytes(pcm))
+
+    def prefill(self, text: str, pcm: bytes):
+        """预先写入已知提示语的PCM（与下行音频格式一致的int16数据）"""
+        self.put(text, pcm)
+
+    def prefill_wav(self, text: str, path: str):
+        """从WAV文件预先写入提示语"""
+        with WavReader(path) as reader:
+            self.put(text, bytes(reader.as_memoryview()))
+
+    def clear(self):
+        """清空内存与磁盘缓存"""
+        for key in list(self._disk):
+            self._remove_spilled(key)
+        self._memory.clear()
+        self._memory_bytes = 0
+
+    def _store(self, key: str, pcm: bytes):
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        if key in self._disk:
+            self._remove_spilled(key)
+        self._memory[key] = pcm
+        self._memory_bytes += len(pcm)
+        while self._memory_bytes > self.max_bytes and self._memory:
+            evicted_key, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions += 1
+            if self.spill_dir:
+                self._spill(evicted_key, evicted)
+
+    def _spill_path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir, f"{digest}.pcm")
+
+    def _spill(self, key: str, pcm: bytes):
+        if len(pcm) > self.max_disk_bytes:
+            return
+        try:
+            with open(self._spill_path(key), "wb") as f:
+                f.write(pcm)
+        except OSError:
+            return
+        self._disk[key] = len(pcm)
+        self._disk_bytes += len(pcm)
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            self._remove_spilled(next(iter(self._disk)))
+
+    def _load_spilled(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._spill_path(key), "rb") as f:
+                pcm = f.read()
+        except OSError:
+            pcm = None
+        self._remove_spilled(key)
+        return pcm
+
+    def _remove_spilled(self, key: str):
+        size = self._disk.pop(key, None)
+        if size is None:
+            return
+        self._disk_bytes -= size
+        try:
+            os.remove(self._spill_path(key))
+        except OSError:
+            pass
@@ -0,0 +1,297 @@
+"""静音检测参数离线扫描
+
+在录音语料上模拟客户端的两种静音检测，用进程池并行评估一组参数，
+统计每组参数的发送帧数、带宽、被截断的语音和端点延迟。
+
+- voice: start_voice_input + enable_silence_detection(threshold, max_frames)。
+  强度超过threshold的帧正常发送；之后的静音帧以极低增益继续发送，连续max_frames帧后发送stop。
+- record: start_recording(sound_threshold, silence_frames)。
+  只发送强度超过sound_threshold的帧，连续silence_frames个静音帧后结束整次录音。
+
+标注：与WAV同名的 .txt（Audacity标签格式，每行"开始秒 结束秒 [标签]"）或 .json
+（[[开始, 结束], ...]）给出语音区间；没有标注的文件默认跳过，--auto-label 时按能量自动标注（仅供粗略参考）。
+
+用法:
+    python -m xiaozhi_client.utils.vad_sweep received_audio/recorded_*.wav --auto-label
+    python -m xiaozhi_client.utils.vad_sweep corpus/*.wav --mode voice \\
+        --thresholds 0.005,0.01,0.02 --frames 50,100,150,200 --output sweep.json
+"""
+import os
+import sys
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from xiaozhi_client.utils.wav import WavReader, pcm_to_float32
+from xiaozhi_client.utils.conditioning import InputConditioner
+
+MODES = ("voice", "record")
+DEFAULT_GRIDS = {
+    "voice": ([0.005, 0.008, 0.01, 0.02, 0.04], [25, 50, 100, 150, 200]),
+    "record": ([0.02, 0.05, 0.1, 0.2], [3, 5, 10, 20]),
+}
+# 可用于--sort的报告指标
+SORT_KEYS = ("clipped_speech_ms", "clipped_speech_pct", "noise_frames", "frames_sent", "send_ratio",
+             "bandwidth_kbps", "endpoint_mean_ms", "endpoint_p95_ms", "merged_endpoints", "threshold", "frames")
+
+Segments = List[Tuple[float, float]]
+
+
+def load_labels(wav_path: str) -> Optional[Segments]:
+    """读取与WAV同名的标注文件，没有时返回None"""
+    stem = os.path.splitext(wav_path)[0]
+    if os.path.exists(stem + ".json"):
+        with open(stem + ".json", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get("segments", [])
+        return sorted((float(start), float(end)) for start, end in data)
+    if os.path.exists(stem + ".txt"):
+        segments = []
+        with open(stem + ".txt", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2:
+                    segments.append((float(parts[0]), float(parts[1])))
+        return sorted(segments)
+    return None
+
+
+def frame_rms(samples: np.ndarray, frame_size: int) -> np.ndarray:
+    """把单声道音频按帧切分，一次算出所有帧的均方根强度（不足一帧的尾部丢弃）"""
+    frames = len(samples) // frame_size
+    blocks = samples[:frames * frame_size].reshape(frames, frame_size)
+    return np.sqrt(np.einsum("ij,ij->i", blocks, blocks) / frame_size)
+
+
+def auto_labels(rms: np.ndarray, frame_duration: float, hangover: float = 0.3) -> Segments:
+    """按能量粗略标注语音：高于噪声底（20%分位）6倍且不低于0.01的帧为语音，间隔短于hangover的区间合并"""
+    if len(rms) == 0:
+        return []
+    threshold = max(np.percentile(rms, 20) * 6.0, 0.01)
+    active = np.flatnonzero(rms > threshold)
+    segments: Segments = []
+    for index in active:
+        start, end = index * frame_duration, (index + 1) * frame_duration
+        if segments and start - segments[-1][1] <= hangover:
+            segments[-1] = (segments[-1][0], end)
+        else:
+            segments.append((start, end))
+    return segments
+
+
+def label_frames(segments: Segments, frames: int, frame_duration: float) -> np.ndarray:
+    """帧中心落在语音区间内的帧标记为语音"""
+    centers = (np.arange(frames) + 0.5) * frame_duration
+    speech = np.zeros(frames, dtype=bool)
+    for start, end in segments:
+        speech |= (centers >= start) & (centers < end)
+    return speech
+
+
+def _frames_since_loud(loud: np.ndarray) -> np.ndarray:
+    """每帧距最近一个有声帧的帧数，之前没有有声帧时为该帧序号加一"""
+    index = np.arange(len(loud))
+    last = np.maximum.accumulate(np.where(loud, index, -1))
+    return index - last
+
+
+def simulate_voice(rms: np.ndarray, threshold: float, max_frames: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """模拟语音输入模式，返回(正常发送的帧, 以低增益发送的帧, 发送stop的帧序号)"""
+    loud = rms > threshold
+    since = _frames_since_loud(loud)
+    started = np.maximum.accumulate(loud)
+    quiet = started & ~loud & (since <= max_frames)
+    stops = np.flatnonzero(started & (since == max_frames))
+    return loud, quiet, stops
+
+
+def simulate_record(rms: np.ndarray, sound_threshold: float, silence_frames: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """模拟start_recording，返回值含义同simulate_voice；录音开始前的静音同样计入连续静音帧"""
+    loud = rms > sound_threshold
+    since = _frames_since_loud(loud)
+    ended = np.flatnonzero(~loud & (since >= silence_frames))
+    stop = ended[0] if len(ended) else len(rms)
+    sent = loud.copy()
+    sent[stop:] = False
+    return sent, np.zeros_like(loud), ended[:1]
+
+
+@dataclass
+class SweepStats:
+    """一组参数在整个语料上的统计"""
+    frames: int = 0
+    speech_frames: int = 0
+    sent_frames: int = 0  # 实际发送的帧（含低增益静音帧）
+    noise_frames: int = 0  # 以正常增益发送的非语音帧
+    clipped_frames: int = 0  # 没有以正常增益发送的语音帧
+    merged_endpoints: int = 0  # 语音结束后直到下一段语音开始都没有发送stop
+    latencies: List[float] = field(default_factory=list)  # 每段语音结束到发送stop的时间（秒）
+
+    def merge(self, other: "SweepStats"):
+        self.frames += other.frames
+        self.speech_frames += other.speech_frames
+        self.sent_frames += other.sent_frames
+        self.noise_frames += other.noise_frames
+        self.clipped_frames += other.clipped_frames
+        self.merged_endpoints += other.merged_endpoints
+        self.latencies.extend(other.latencies)
+
+
+def _endpoint_latencies(segments: Segments, stops: np.ndarray, frame_duration: float,
+                        stats: SweepStats):
+    stop_times = (stops + 1) * frame_duration
+    for i, (_, end) in enumerate(segments):
+        next_start = segments[i + 1][0] if i + 1 < len(segments) else float("inf")
+        position = np.searchsorted(stop_times, end)
+        if position < len(stop_times) and stop_times[position] <= next_start:
+            stats.latencies.append(float(stop_times[position] - end))
+        else:
+            stats.merged_endpoints += 1
+
+
+def evaluate_file(path: str, mode: str, thresholds: Sequence[float], frame_counts: Sequence[int],
+                  frame_duration_ms: int = 60, condition: bool = False,
+                  auto_label: bool = False) -> Optional[Dict[Tuple[float, int], SweepStats]]:
+    """在一个文件上评估全部参数组合，没有标注且未启用自动标注时返回None"""
+    with WavReader(path) as reader:
+        info = reader.info
+        samples = pcm_to_float32(np.asarray(reader.as_array()))
+        if samples.ndim > 1:
+            samples = samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+        # float32文件的samples是只读memmap上的视图，预处理会原地修改，且文件关闭后视图失效
+        samples = np.array(samples, dtype=np.float32)
+    frame_size = info.sample_rate * frame_duration_ms // 1000
+    frame_duration = frame_duration_ms / 1000.0
+
+    segments = load_labels(path)
+    if segments is None:
+        if not auto_label:
+            return None
+        # 自动标注基于原始音频，不受预处理增益影响
+        segments = auto_labels(frame_rms(samples, frame_size), frame_duration)
+
+    if condition:
+        conditioner = InputConditioner(info.sample_rate, block_size=frame_size)
+        for start in range(0, len(samples) - frame_size + 1, frame_size):
+            conditioner.process(samples[start:start + frame_size])
+    rms = frame_rms(samples, frame_size)
+    speech = label_frames(segments, len(rms), frame_duration)
+
+    simulate = simulate_voice if mode == "voice" else simulate_record
+    results = {}
+    for threshold in thresholds:
+        for count in frame_counts:
+            normal, quiet, stops = simulate(rms, threshold, count)
+            stats = SweepStats(
+                frames=len(rms),
+                speech_frames=int(speech.sum()),
+                sent_frames=int(normal.sum() + quiet.sum()),
+                noise_frames=int((normal & ~speech).sum()),
+                clipped_frames=int((speech & ~normal).sum()),
+            )
+            _endpoint_latencies(segments, stops, frame_duration, stats)
+            results[(threshold, count)] = stats
+    return results
+
+
+def summarize(stats: SweepStats, frame_duration_ms: int, bitrate: int) -> Dict[str, float]:
+    """把统计换算为报告指标"""
+    seconds = stats.frames * frame_duration_ms / 1000.0
+    latencies = sorted(stats.latencies)
+    return {
+        "frames_sent": stats.sent_frames,
+        "send_ratio": stats.sent_frames / stats.frames if stats.frames else 0.0,
+        "bandwidth_kbps": stats.sent_frames * frame_duration_ms / 1000.0 * bitrate / 1000.0 / seconds if seconds else 0.0,
+        "noise_frames": stats.noise_frames,
+        "clipped_speech_ms": stats.clipped_frames * frame_duration_ms,
+        "clipped_speech_pct": stats.clipped_frames / stats.speech_frames * 100 if stats.speech_frames else 0.0,
+        "endpoint_mean_ms": float(np.mean(latencies)) * 1000 if latencies else float("nan"),
+        "endpoint_p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000 if latencies else float("nan"),
+        "merged_endpoints": stats.merged_endpoints,
+    }
+
+
+def sweep(paths: Sequence[str], mode: str, thresholds: Sequence[float], frame_counts: Sequence[int],
+          frame_duration_ms: int = 60, condition: bool = False, auto_label: bool = False,
+          jobs: Optional[int] = None) -> Tuple[Dict[Tuple[float, int], SweepStats], List[str]]:
+    """用进程池逐文件评估，返回按参数合并的统计和被跳过（无标注）的文件"""
+    totals = {(threshold, count): SweepStats() for threshold in thresholds for count in frame_counts}
+    skipped = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(evaluate_file, path, mode, thresholds, frame_counts, frame_duration_ms, condition, auto_label)
+            for path in paths
+        ]
+        for path, future in zip(paths, futures):
+            results = future.result()
+            if results is None:
+                skipped.append(path)
+                continue
+            for key, stats in results.items():
+                totals[key].merge(stats)
+    return totals, skipped
+
+
+def _parse_list(text: str, kind=float) -> List:
+    return [kind(item) for item in text.split(",") if item.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="静音检测参数离线扫描")
+    parser.add_argument("wavs", nargs="+", help="录音文件（可带同名.txt/.json标注）")
+    parser.add_argument("--mode", choices=MODES, default="voice",
+                        help="voice: enable_silence_detection；record: start_recording")
+    parser.add_argument("--thresholds", help="强度阈值列表，逗号分隔（record模式为sound_threshold）")
+    parser.add_argument("--frames", help="静音帧数列表，逗号分隔（voice为max_frames，record为silence_frames）")
+    parser.add_argument("--frame-duration", type=int, default=60, help="帧时长（毫秒），默认60")
+    parser.add_argument("--bitrate", type=int, default=24000, help="估算带宽用的Opus比特率，默认24000")
+    parser.add_argument("--condition", action="store_true", help="先经过输入预处理链（高通、降噪、自动增益）")
+    parser.add_argument("--auto-label", action="store_true", help="没有标注的文件按能量自动标注")
+    parser.add_argument("--jobs", type=int, help="并行进程数，默认CPU核数")
+    parser.add_argument("--sort", choices=SORT_KEYS, default="clipped_speech_ms",
+                        help="排序指标，默认clipped_speech_ms（相同时按bandwidth_kbps，没有数值的排在最后）")
+    parser.add_argument("--output", help="把结果写入JSON文件")
+    args = parser.parse_args(argv)
+
+    default_thresholds, default_frames = DEFAULT_GRIDS[args.mode]
+    thresholds = _parse_list(args.thresholds) if args.thresholds else default_thresholds
+    frame_counts = _parse_list(args.frames, int) if args.frames else default_frames
+
+    totals, skipped = sweep(args.wavs, args.mode, thresholds, frame_counts, args.frame_duration,
+                            args.condition, args.auto_label, args.jobs)
+    for path in skipped:
+        print(f"跳过（无标注）: {path}", file=sys.stderr)
+    rows = [
+        dict(threshold=threshold, frames=count, **summarize(stats, args.frame_duration, args.bitrate))
+        for (threshold, count), stats in totals.items()
+    ]
+    if len(skipped) == len(args.wavs):
+        print("没有可评估的文件", file=sys.stderr)
+        return 1
+    # 没有结束的端点时端点延迟为NaN，NaN参与比较会打乱顺序，单独排到最后
+    rows.sort(key=lambda row: (np.isnan(row[args.sort]), 0.0 if np.isnan(row[args.sort]) else row[args.sort],
+                               row["bandwidth_kbps"]))
+
+    print(f"{'阈值':>8} {'帧数':>6} {'发送帧':>8} {'带宽kbps':>9} {'噪声帧':>7} "
+          f"{'截断ms':>8} {'截断%':>7} {'端点ms':>8} {'端点p95':>8} {'未结束':>6}")
+    for row in rows:
+        print(f"{row['threshold']:>8.4f} {row['frames']:>6d} {row['frames_sent']:>8d} "
+              f"{row['bandwidth_kbps']:>9.2f} {row['noise_frames']:>7d} {row['clipped_speech_ms']:>8d} "
+              f"{row['clipped_speech_pct']:>7.2f} {row['endpoint_mean_ms']:>8.0f} {row['endpoint_p95_ms']:>8.0f} "
+              f"{row['merged_endpoints']:>6d}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"mode": args.mode, "files": len(args.wavs) - len(skipped), "results": rows},
+                      f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
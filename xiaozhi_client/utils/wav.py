@@ -1,43 +1,274 @@
 import os
+import mmap
+import struct
 import datetime
+from dataclasses import dataclass
+from typing import Iterator, Optional, Union
 
-def save_wav(audio_dir, pcm_buffer):
-        """异步保存完整的WAV文件"""
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+@dataclass
+class WavInfo:
+    """WAV文件头信息"""
+    sample_rate: int
+    channels: int
+    sample_width: int  # 每个采样点的字节数
+    format_tag: int
+    data_offset: int  # data块在文件中的起始偏移
+    data_size: int  # data块字节数
+
+    @property
+    def frame_width(self) -> int:
+        """每帧（所有声道的一个采样点）的字节数"""
+        return self.sample_width * self.channels
+
+    @property
+    def num_frames(self) -> int:
+        return self.data_size // self.frame_width
+
+    @property
+    def duration(self) -> float:
+        return self.num_frames / self.sample_rate
+
+    @property
+    def dtype(self) -> np.dtype:
+        """对应的numpy数据类型，24位PCM没有对应类型"""
+        if self.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+            if self.sample_width == 4:
+                return np.dtype('<f4')
+            if self.sample_width == 8:
+                return np.dtype('<f8')
+        elif self.format_tag == WAVE_FORMAT_PCM:
+            if self.sample_width == 1:
+                return np.dtype('u1')  # 8位PCM为无符号数
+            if self.sample_width == 2:
+                return np.dtype('<i2')
+            if self.sample_width == 4:
+                return np.dtype('<i4')
+        raise ValueError(f"不支持的采样格式: format={self.format_tag}, width={self.sample_width}")
+
+
+def read_wav_info(path: str) -> WavInfo:
+    """解析WAV文件头，支持任意采样率/声道数的PCM和浮点格式"""
+    file_size = os.path.getsize(path)
+    fmt = None
+    with open(path, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[0:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            raise ValueError(f"不是有效的WAV文件: {path}")
+
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError(f"WAV文件缺少data块: {path}")
+            chunk_id = chunk_header[0:4]
+            chunk_size = int.from_bytes(chunk_header[4:8], 'little')
+
+            if chunk_id == b'fmt ':
+                body = f.read(chunk_size)
+                if len(body) < 16:
+                    raise ValueError(f"WAV fmt块长度错误: {path}")
+                format_tag, channels, sample_rate, _, block_align, bits = struct.unpack('<HHIIHH', body[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    # 扩展格式的真实格式在SubFormat GUID的前两个字节
+                    format_tag = int.from_bytes(body[24:26], 'little')
+                # 后面按声道数和块对齐计算采样宽度、帧数和时长，为0的文件头视为损坏
+                if channels == 0 or block_align < channels or sample_rate == 0:
+                    raise ValueError(
+                        f"WAV fmt块参数无效: channels={channels}, block_align={block_align}, "
+                        f"sample_rate={sample_rate}: {path}"
+                    )
+                fmt = (format_tag, channels, sample_rate, block_align, bits)
+                if chunk_size % 2:
+                    f.seek(1, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError(f"WAV文件data块出现在fmt块之前: {path}")
+                data_offset = f.tell()
+                # 流式写入的文件data长度可能未回填，以实际文件大小为准
+                data_size = min(chunk_size, file_size - data_offset)
+                format_tag, channels, sample_rate, block_align, bits = fmt
+                sample_width = block_align // channels
+                info = WavInfo(
+                    sample_rate=sample_rate,
+                    channels=channels,
+                    sample_width=sample_width,
+                    format_tag=format_tag,
+                    data_offset=data_offset,
+                    data_size=data_size,
+                )
+                # 去掉末尾不完整的帧
+                info.data_size -= info.data_size % info.frame_width
+                return info
+            else:
+                f.seek(chunk_size + (chunk_size % 2), os.SEEK_CUR)
+
+
+class WavReader:
+    """基于内存映射的WAV读取器，数据按需从磁盘分页读入，不整体载入内存
+
+    Example:
+        with WavReader("recorded.wav") as reader:
+            for chunk in reader.iter_chunks(960):
+                ...
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.info = read_wav_info(path)
+        self._array: Optional[np.memmap] = None
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+
+    def as_array(self) -> np.ndarray:
+        """以np.memmap形式返回音频数据，形状为(帧数, 声道数)"""
+        if self._array is None:
+            if self.info.num_frames == 0:
+                return np.empty((0, self.info.channels), dtype=self.info.dtype)
+            self._array = np.memmap(
+                self.path,
+                dtype=self.info.dtype,
+                mode='r',
+                offset=self.info.data_offset,
+                shape=(self.info.num_frames, self.info.channels),
+            )
+        return self._array
+
+    def as_memoryview(self) -> memoryview:
+        """返回data块的零拷贝只读memoryview，适用于任意采样格式（包括24位）"""
+        if self._mmap is None:
+            if self.info.data_size == 0:
+                return memoryview(b'')
+            self._file = open(self.path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        start = self.info.data_offset
+        return memoryview(self._mmap)[start:start + self.info.data_size]
+
+    def iter_chunks(self, frames_per_chunk: int, pad: bool = False) -> Iterator[np.ndarray]:
+        """按帧对齐迭代音频块，每块是memmap上的视图
+
+        Args:
+            frames_per_chunk: 每块包含的帧数
+            pad: 最后一块不足时是否补零（补零的块是拷贝）
+        """
+        if frames_per_chunk <= 0:
+            raise ValueError("frames_per_chunk必须大于0")
+        data = self.as_array()
+        total = len(data)
+        for start in range(0, total, frames_per_chunk):
+            chunk = data[start:start + frames_per_chunk]
+            if pad and len(chunk) < frames_per_chunk:
+                padded = np.zeros((frames_per_chunk, self.info.channels), dtype=data.dtype)
+                padded[:len(chunk)] = chunk
+                chunk = padded
+            yield chunk
+
+    def close(self):
+        """释放映射；若仍有外部持有as_memoryview()返回的视图，关闭会抛出BufferError"""
+        self._array = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def iter_wav_chunks(path: str, frames_per_chunk: int, pad: bool = False) -> Iterator[np.ndarray]:
+    """按帧对齐流式读取WAV文件"""
+    with WavReader(path) as reader:
+        yield from reader.iter_chunks(frames_per_chunk, pad=pad)
+
+
+def pcm_to_float32(samples: np.ndarray) -> np.ndarray:
+    """将整型PCM采样转换为[-1.0, 1.0]范围的float32数组"""
+    if samples.dtype == np.float32:
+        return samples
+    if samples.dtype == np.uint8:
+        return (samples.astype(np.float32) - 128.0) / 128.0
+    if np.issubdtype(samples.dtype, np.integer):
+        scale = float(2 ** (8 * samples.dtype.itemsize - 1))
+        return samples.astype(np.float32) / scale
+    return samples.astype(np.float32)
+
+
+def write_wav(file_name: str, pcm_data: Union[bytes, bytearray, memoryview],
+              sample_rate: int = 16000, channels: int = 1, sample_width: int = 2) -> str:
+    """将PCM数据写入指定路径的WAV文件"""
+    pcm_data = memoryview(pcm_data).cast('B')
+    header = _create_wav_header(len(pcm_data) // sample_width, sample_rate, channels, sample_width)
+    with open(file_name, 'wb') as f:
+        f.write(header)
+        f.write(pcm_data)
+    return file_name
+
+
+def unique_wav_path(audio_dir: str, prefix: str = "") -> str:
+    """按微秒时间戳生成新的WAV文件路径并原子地占用该文件名
+
+    同一微秒内（或多个进程）重复保存时追加序号，不会覆盖已有文件。
+    """
+    stamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')
+    name = f"{prefix}{stamp}"
+    index = 0
+    while True:
+        path = os.path.join(audio_dir, f"{name}.wav" if index == 0 else f"{name}_{index}.wav")
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return path
+        except FileExistsError:
+            index += 1
+
+
+def save_wav(audio_dir, pcm_buffer, sample_rate: int = 16000, channels: int = 1,
+             sample_width: int = 2) -> Optional[str]:
+        """异步保存完整的WAV文件，返回文件路径"""
         if len(pcm_buffer) > 0:
             try:
-                # Create WAV header
-                wav_data = _create_wav_header(len(pcm_buffer) // 2)
-                
-                # Write WAV file
-                file_name = os.path.join(audio_dir, f"{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.wav")
-                with open(file_name, 'wb') as f:
-                    f.write(wav_data)
-                    f.write(pcm_buffer)
+                file_name = unique_wav_path(audio_dir)
+                return write_wav(file_name, pcm_buffer, sample_rate, channels, sample_width)
 
             except Exception as e:
                 print(f"保存WAV文件错误: {e}")
+        return None
+
+def _create_wav_header(total_samples, sample_rate=16000, channels=1, sample_width=2):
+    """创建WAV文件头
 
-def _create_wav_header(total_samples):
-    """创建WAV文件头"""
+    Args:
+        total_samples: 采样点总数（所有声道合计）
+    """
     header = bytearray(44)
-    
+    data_size = total_samples * sample_width
+
     # RIFF header
     header[0:4] = b'RIFF'
-    header[4:8] = (total_samples * 2 + 36).to_bytes(4, 'little')  # File size
+    header[4:8] = (data_size + 36).to_bytes(4, 'little')  # File size
     header[8:12] = b'WAVE'
-    
+
     # fmt chunk
     header[12:16] = b'fmt '
     header[16:20] = (16).to_bytes(4, 'little')  # Chunk size
-    header[20:22] = (1).to_bytes(2, 'little')  # Audio format (PCM)
-    header[22:24] = (1).to_bytes(2, 'little')  # Num channels
-    header[24:28] = (16000).to_bytes(4, 'little')  # Sample rate
-    header[28:32] = (32000).to_bytes(4, 'little')  # Byte rate
-    header[32:34] = (2).to_bytes(2, 'little')  # Block align
-    header[34:36] = (16).to_bytes(2, 'little')  # Bits per sample
-    
+    header[20:22] = (WAVE_FORMAT_PCM).to_bytes(2, 'little')  # Audio format (PCM)
+    header[22:24] = (channels).to_bytes(2, 'little')  # Num channels
+    header[24:28] = (sample_rate).to_bytes(4, 'little')  # Sample rate
+    header[28:32] = (sample_rate * channels * sample_width).to_bytes(4, 'little')  # Byte rate
+    header[32:34] = (channels * sample_width).to_bytes(2, 'little')  # Block align
+    header[34:36] = (sample_width * 8).to_bytes(2, 'little')  # Bits per sample
+
     # data chunk
     header[36:40] = b'data'
-    header[40:44] = (total_samples * 2).to_bytes(4, 'little')  # Data size
-    
-    return header
\ No newline at end of file
+    header[40:44] = (data_size).to_bytes(4, 'little')  # Data size
+
+    return header